@@ -1,8 +1,22 @@
 import streamlit as st
-import requests
-import html
-import random
+import os
+import math
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import metrics
+import replay_log
+from assets import ROUND_LENGTHS, STYLE
+from catalog import CategoryCatalog
+from question_pool import QuestionPool, question_key
+from question_stream import PAGE_SIZE
+from questions import question_rows
+from state_store import create_store
+from leaderboard import Leaderboard
+from rooms import RoomError, RoomRegistry
+from engine import TriviaEngine
+
 # Set page configuration
 st.set_page_config(
     page_title="Trivia Game",
@@ -11,175 +25,226 @@ st.set_page_config(
     initial_sidebar_state="collapsed",
 )
 
-# Custom CSS for styling
-st.markdown("""
-<style>
-    .big-button {
-        font-size: 30px !important;
-        height: 100px !important;
-        margin: 50px 0px !important;
-        background-color: #4CAF50 !important;
-        color: white !important;
-    }
-    .correct {
-        background-color: #4CAF50;
-        color: white;
-        padding: 10px;
-        border-radius: 5px;
-        /* Animation applied via class below */
-    }
-    .incorrect {
-        background-color: #f44336;
-        color: white;
-        padding: 10px;
-        border-radius: 5px;
-    }
-    .score-counter {
-        position: fixed;
-        top: 20px;  /* Increased from 10px */
-        right: 20px; /* Increased from 10px */
-        padding: 10px;
-        background-color: #2196F3;
-        color: white;
-        border-radius: 5px;
-        font-weight: bold;
-        z-index: 99; /* Ensure it stays on top */
-        text-align: right; /* Align text to the right within the box */
-    }
-
-    @keyframes fadeIn {
-        from { opacity: 0; transform: translateY(10px); } /* Start invisible and slightly down */
-        to { opacity: 1; transform: translateY(0); }   /* Fade to visible and original position */
-    }
-    .fade-in {
-        animation: fadeIn 0.5s ease-out forwards; /* Apply the animation */
-    }
-    @keyframes fadeOut {
-        from {opacity: 1;}
-        to {opacity: 0.5;}
-    }
-    .question-text {
-        font-size: 20px;
-        font-weight: bold;
-        margin-bottom: 20px;
-    }
-    
-    /* New CSS for green START button */
-    .stButton > button[data-baseweb="button"][kind="primary"] {
-        background-color: #4CAF50 !important;
-        border-color: #4CAF50 !important;
-    }
-    
-    .stButton > button[data-baseweb="button"][kind="primary"]:hover,
-    .stButton > button[data-baseweb="button"][kind="primary"]:focus {
-        background-color: #3d9140 !important;
-        border-color: #3d9140 !important;
-    }
-</style>
-""", unsafe_allow_html=True)
+# Custom CSS for styling (built once per process in assets.py)
+st.markdown(STYLE, unsafe_allow_html=True)
 
 # Initialize session state variables if they don't exist
+# (the game itself lives in a TriviaEngine, see get_engine)
 if 'game_started' not in st.session_state:
     st.session_state.game_started = False
-if 'current_question' not in st.session_state:
-    st.session_state.current_question = 0
-if 'correct_answers' not in st.session_state:
-    st.session_state.correct_answers = 0
-if 'questions' not in st.session_state:
-    st.session_state.questions = []
-if 'answered' not in st.session_state:
-    st.session_state.answered = False
-if 'selected_option' not in st.session_state:
-    st.session_state.selected_option = None
-if 'correct_option' not in st.session_state:
-    st.session_state.correct_option = None
-if 'score' not in st.session_state:
-    st.session_state.score = 0
-if 'current_streak' not in st.session_state:
-    st.session_state.current_streak = 0
-
-# Function to get a session token
-def get_session_token():
-    if 'token' not in st.session_state:
-        token_url = "https://opentdb.com/api_token.php?command=request"
-        try:
-            response = requests.get(token_url)
-            data = response.json()
-            if data["response_code"] == 0:
-                st.session_state.token = data["token"]
-            else:
-                st.error(f"Error getting token: {data['response_code']}")
-                return None
-        except Exception as e:
-            st.error(f"Error connecting to API: {e}")
-            return None
-    return st.session_state.token
-
-# Function to reset session token if needed
-def reset_token():
-    if 'token' in st.session_state:
-        reset_url = f"https://opentdb.com/api_token.php?command=reset&token={st.session_state.token}"
-        try:
-            response = requests.get(reset_url)
-            data = response.json()
-            if data["response_code"] == 0:
-                st.session_state.token = data["token"]
-                return True
-            else:
-                st.error(f"Error resetting token: {data['response_code']}")
-                return False
-        except Exception as e:
-            st.error(f"Error connecting to API: {e}")
-            return False
-    return False
-
-# Function to fetch trivia questions from API
+
+# Where questions come from: "remote" (opentdb.com) or "local" (offline bank built with question_bank.py)
+QUESTION_BACKEND = os.environ.get("TRIVIA_BACKEND", "remote")
+QUESTION_BANK_PATH = os.environ.get("TRIVIA_BANK_PATH", "questions.db")
+
+# How long a prefetched round stays usable, and how long Play Again waits for one still in flight
+PREFETCH_TTL = 10 * 60
+PREFETCH_WAIT = 10
+# How long START waits for a round before giving the script thread back
+FETCH_WAIT = 10
+
+# Where game state is kept between transitions: "memory", "sqlite" or "redis"
+STATE_BACKEND = os.environ.get("TRIVIA_STATE_BACKEND", "memory")
+STATE_PATH = os.environ.get("TRIVIA_STATE_PATH", "game_state.db")
+STATE_REDIS_URL = os.environ.get("TRIVIA_REDIS_URL", "redis://localhost:6379/0")
+
+# Where the category catalog and question counts from opentdb are cached between processes
+CATALOG_PATH = os.environ.get("TRIVIA_CATALOG_PATH", "catalog.json")
+
+# Where finished rounds are kept for the leaderboard
+LEADERBOARD_PATH = os.environ.get("TRIVIA_LEADERBOARD_PATH", "leaderboard.db")
+
+# Seconds room members get per question
+ROOM_QUESTION_TIME = int(os.environ.get("TRIVIA_ROOM_QUESTION_TIME", 20))
+
+# Seconds per question in timed mode, and how late an answer may arrive (network) before it counts as timed out
+QUESTION_TIME = int(os.environ.get("TRIVIA_QUESTION_TIME", 20))
+ANSWER_GRACE = 1.0
+# The countdown turns red for the last few seconds
+COUNTDOWN_URGENT = 5
+
+# UI session state saved alongside the engine state after every game transition
+PERSISTED_STATE = ("game_started", "category", "difficulty", "question_type", "round_length", "timed", "player_name")
+
+# Metrics exporter (see metrics.py), started once per process when TRIVIA_METRICS is set
+@st.cache_resource
+def start_metrics_exporter():
+    metrics.start_exporter()
+
+# Shared game state store, created once per process
+@st.cache_resource
+def get_state_store():
+    return create_store(STATE_BACKEND, path=STATE_PATH, url=STATE_REDIS_URL)
+
+# Shared leaderboard, created once per process
+@st.cache_resource
+def get_leaderboard():
+    return Leaderboard(LEADERBOARD_PATH)
+
+# Multiplayer rooms of this process (see rooms.py)
+@st.cache_resource
+def get_room_registry():
+    return RoomRegistry()
+
+# Function to get the player's id, kept in the URL so it survives reconnects to any replica
+def get_player_id():
+    if 'player_id' not in st.session_state:
+        player_id = st.query_params.get("player")
+        if not player_id:
+            player_id = uuid.uuid4().hex
+            st.query_params["player"] = player_id
+        st.session_state.player_id = player_id
+    return st.session_state.player_id
+
+# Function to append an event to this session's replay log (see replay_log.py)
+def log_event(name, **values):
+    replay_log.event(get_player_id(), name, **values)
+
+# Function to log the round that just started, with everything a replay needs
+def log_round(start):
+    engine = get_engine()
+    log_event(
+        "round", key=[engine.category, engine.difficulty, engine.question_type], round_size=engine.round_size,
+        question_time=engine.question_time, seed=engine.round_seed, questions=question_rows(engine.questions),
+        code=0 if engine.loaded else 1, ms=replay_log.elapsed_ms(start),
+    )
+
+# Function to write the game state to the store, one snapshot per transition
+def save_game_state():
+    state = get_engine().to_state()
+    state["session"] = {name: st.session_state[name] for name in PERSISTED_STATE if name in st.session_state}
+    get_state_store().save(get_player_id(), state)
+
+# Function to load a saved game into a new session (reconnect, restart or another replica)
+def restore_game_state():
+    if 'state_restored' in st.session_state:
+        return
+    st.session_state.state_restored = True
+    state = get_state_store().load(get_player_id())
+    if state:
+        st.session_state.engine = TriviaEngine.from_state(state, get_question_pool())
+        for name, value in state.get("session", {}).items():
+            st.session_state[name] = value
+
+# Shared question pool, created once per process and reused by every session.
+# The fetchers (and requests under them) are imported here, on first use, not on every script run.
+@st.cache_resource
+def get_question_pool():
+    if QUESTION_BACKEND == "local":
+        from question_bank import LocalBankFetcher
+        return QuestionPool(LocalBankFetcher(QUESTION_BANK_PATH))
+    import opentdb
+    # Rotate tokens before they run dry, once the catalog knows how many questions a bucket has
+    opentdb.tokens.capacity = get_catalog().capacity
+    return QuestionPool(opentdb.OpenTDBFetcher())
+
+# Category catalog with question counts, created once per process; it refreshes itself in the background.
+# The offline bank is its own catalog, so the local backend never calls opentdb.com
+@st.cache_resource
+def get_catalog():
+    if QUESTION_BACKEND == "local":
+        return CategoryCatalog(None, source=get_question_pool().fetcher)
+    return CategoryCatalog(CATALOG_PATH)
+
+# Function to get this session's game engine (it is handed the pool when a game starts)
+def get_engine():
+    if 'engine' not in st.session_state:
+        st.session_state.engine = TriviaEngine()
+    return st.session_state.engine
+
+# Shared worker threads for prefetching the next round
+@st.cache_resource
+def get_prefetch_executor():
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+
+# Worker threads for rounds a player is waiting for (START, Play Again) that need a fill from upstream.
+# Kept apart from the prefetch workers, so a START never queues behind background prefetches.
+@st.cache_resource
+def get_fetch_executor():
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="fetch")
+
+# Function to build the question pool key for a set of game settings
+def get_pool_key(categories, difficulties, question_type):
+    # Convert category names to IDs; sorted so the key doesn't depend on the order they were picked in
+    category_ids = tuple(sorted(get_catalog().category_id(name) for name in categories))
+    difficulties = tuple(sorted(d.lower() for d in difficulties))
+    if len(difficulties) == 3:
+        # All of them: one "any difficulty" bucket costs a third of the upstream calls
+        difficulties = ("",)
+    # A single pick is a plain one-bucket key, several make a mixed round (see question_pool.bucket_keys)
+    return (
+        category_ids[0] if len(category_ids) == 1 else category_ids,
+        difficulties[0] if len(difficulties) == 1 else difficulties,
+        question_type.lower(),
+    )
+
+# Function to take a round from the pool: from memory if its buckets are warm, otherwise on a worker thread, waiting at most FETCH_WAIT seconds
+def take_round(key, seen):
+    start = time.perf_counter()
+    # Warm buckets are served right here, without queuing for a worker.
+    # Both paths work on a copy of the seen set, the caller merges the round in.
+    questions = get_question_pool().take_ready(key, PAGE_SIZE, set(seen))
+    if questions is not None:
+        log_event("fetch", key=key, source="memory", code=0, n=len(questions), ms=replay_log.elapsed_ms(start))
+        return 0, questions
+    future = get_fetch_executor().submit(get_question_pool().take, key, PAGE_SIZE, set(seen))
+    try:
+        response_code, questions = future.result(timeout=FETCH_WAIT)
+    except TimeoutError:
+        # Let it finish in the background, the next START picks it up like a prefetched round
+        st.session_state.prefetch = {"key": key, "future": future, "created_at": time.monotonic()}
+        log_event("fetch", key=key, source="pool", error="timeout", ms=replay_log.elapsed_ms(start))
+        raise
+    except Exception as e:
+        log_event("fetch", key=key, source="pool", error=repr(e), ms=replay_log.elapsed_ms(start))
+        raise
+    log_event("fetch", key=key, source="pool", code=response_code, n=len(questions), ms=replay_log.elapsed_ms(start))
+    return response_code, questions
+
+# Function to fetch trivia questions from the shared pool
+@metrics.timed("fetch_questions")
 def fetch_questions(category, difficulty, question_type):
-    # Get a session token
-    token = get_session_token()
-    if not token:
-        return []
-    
-    # Convert category name to ID
-    category_id = category_mapping.get(category, "")
-    
-    # Construct the API URL with the specified parameters
-    url = f"https://opentdb.com/api.php?amount=10&category={category_id}&difficulty={difficulty.lower()}&type={question_type.lower()}&token={token}"
-    
+    # Only screens that fetch pay for importing requests
+    from requests.exceptions import RequestException
+
+    key = get_pool_key(category, difficulty, question_type)
+
+    # Questions this session has already played, so rounds never repeat
+    seen = get_engine().seen_questions
+
     try:
-        response = requests.get(url)
-        data = response.json()
-        
+        response_code, questions = take_round(key, seen)
+
         # Handle response codes
-        if data["response_code"] == 0:
-            # Success
-            return data["results"]
-        elif data["response_code"] == 1:
+        if response_code == 4:
+            # This session has seen every question for these settings, start over
+            st.warning("You've seen all questions for these settings. Starting over...")
+            seen.clear()
+            response_code, questions = take_round(key, seen)
+
+        if response_code == 0:
+            # Success (the engine adds the round to the seen set when it starts)
+            return questions
+        elif response_code == 1:
             st.error("No Results: Not enough questions available for your criteria. Try different settings.")
             return []
-        elif data["response_code"] == 2:
+        elif response_code == 2:
             st.error("Invalid Parameter: Check your settings and try again.")
             return []
-        elif data["response_code"] == 3:
-            # Token not found, try to get a new one
-            st.session_state.pop('token', None)
-            st.warning("Session token not found. Getting a new token...")
-            return fetch_questions(category, difficulty, question_type)  # Recursive call with new token
-        elif data["response_code"] == 4:
-            # Token empty, reset it
-            st.warning("All questions for this token have been used. Resetting token...")
-            if reset_token():
-                return fetch_questions(category, difficulty, question_type)  # Recursive call with reset token
-            else:
-                return []
-        elif data["response_code"] == 5:
+        elif response_code == 4:
+            st.error("No new questions available for your criteria. Try different settings.")
+            return []
+        elif response_code == 5:
+            # The scheduler already retried with backoff, don't hold the script thread any longer
             st.error("Rate Limit: Please wait a few seconds and try again.")
-            time.sleep(5)  # Wait 5 seconds
-            return fetch_questions(category, difficulty, question_type)  # Try again
+            return []
         else:
-            st.error(f"Unknown error: Response code {data['response_code']}")
+            st.error(f"Unknown error: Response code {response_code}")
             return []
-    except requests.exceptions.RequestException as e:
+    except TimeoutError:
+        st.warning("The trivia server is busy, your questions are still loading. Try again in a few seconds.")
+        return []
+    except RequestException as e:
         st.error(f"Network error: {e}")
         return []
     except ValueError as e:
@@ -189,116 +254,213 @@ def fetch_questions(category, difficulty, question_type):
         st.error(f"Unexpected error: {e}")
         return []
 
-# Function to start a new game
+# Function to fetch the next round in the background while this one is played
+def start_prefetch():
+    key = get_pool_key(st.session_state.category, st.session_state.difficulty, st.session_state.question_type)
+    # Work on a copy of the seen set, it is only merged in if the round gets played
+    seen = set(get_engine().seen_questions)
+    future = get_prefetch_executor().submit(get_question_pool().take, key, PAGE_SIZE, seen)
+    st.session_state.prefetch = {"key": key, "future": future, "created_at": time.monotonic()}
+
+# Function to discard the prefetched round (settings changed or it expired)
+def drop_prefetch():
+    prefetch = st.session_state.pop('prefetch', None)
+    if prefetch is not None:
+        prefetch["future"].cancel()
+
+# Function to take the prefetched round, returns None if there is no usable one
+def take_prefetched():
+    prefetch = st.session_state.pop('prefetch', None)
+    if prefetch is None:
+        return None
+    key = get_pool_key(st.session_state.category, st.session_state.difficulty, st.session_state.question_type)
+    if prefetch["key"] != key or time.monotonic() - prefetch["created_at"] > PREFETCH_TTL:
+        prefetch["future"].cancel()
+        return None
+    start = time.perf_counter()
+    try:
+        response_code, questions = prefetch["future"].result(timeout=PREFETCH_WAIT)
+    except Exception as e:
+        log_event("fetch", key=key, source="prefetch", error=repr(e), ms=replay_log.elapsed_ms(start))
+        return None
+    log_event("fetch", key=key, source="prefetch", code=response_code, n=len(questions), ms=replay_log.elapsed_ms(start))
+    seen = get_engine().seen_questions
+    if response_code != 0 or any(question_key(q) in seen for q in questions):
+        return None
+    return questions
+
 # Function to start a new game
 def start_game():
-    # ... (fetch questions logic remains the same) ...
-    st.session_state.questions = fetch_questions(st.session_state.category, st.session_state.difficulty, st.session_state.question_type)
+    start = time.perf_counter()
+    st.session_state.transition_at = time.monotonic()
+    # Use the prefetched round if the settings haven't changed, otherwise hit the pool.
+    # This is only the first page, longer rounds stream the rest in the background.
+    questions = take_prefetched() or fetch_questions(st.session_state.category, st.session_state.difficulty, st.session_state.question_type)
+    get_engine().pool = get_question_pool()
+    get_engine().round_size = ROUND_LENGTHS[st.session_state.round_length]
+    get_engine().question_time = QUESTION_TIME if st.session_state.get('timed') else None
+    get_engine().start(*get_pool_key(st.session_state.category, st.session_state.difficulty, st.session_state.question_type), questions)
+    log_round(start)
+    if questions:
+        start_prefetch()
+        metrics.inc("trivia_games_started_total")
     st.session_state.game_started = True
-    st.session_state.current_question = 0
-    # RESET score and streak
-    st.session_state.score = 0
-    st.session_state.current_streak = 0
-    # RESET other relevant states
-    st.session_state.correct_answers = 0 # Keep this if you still want the simple count/rate
-    st.session_state.answered = False
-    st.session_state.selected_option = None
-    st.session_state.correct_option = None
-    st.session_state.current_options_order = [] # Reset options order
+    save_game_state()
 
 # Function to restart the game with the same settings
 def restart_game():
+    start = time.perf_counter()
+    st.session_state.transition_at = time.monotonic()
+    # Play a fresh round, normally the one prefetched while the last round was played
+    questions = take_prefetched() or fetch_questions(st.session_state.category, st.session_state.difficulty, st.session_state.question_type)
+    get_engine().restart(questions)
+    log_round(start)
+    if questions:
+        start_prefetch()
+        metrics.inc("trivia_games_started_total")
     st.session_state.game_started = True
-    st.session_state.current_question = 0
-    # RESET score and streak
-    st.session_state.score = 0
-    st.session_state.current_streak = 0
-    # RESET other relevant states
-    st.session_state.correct_answers = 0
-    st.session_state.answered = False
-    st.session_state.selected_option = None
-    st.session_state.correct_option = None
-    st.session_state.current_options_order = []
+    save_game_state()
 
 # Function to return to the settings page
 def return_to_settings():
     st.session_state.game_started = False
-    st.session_state.current_question = 0
-    # RESET score and streak
-    st.session_state.score = 0
-    st.session_state.current_streak = 0
-    # RESET other relevant states
-    st.session_state.correct_answers = 0 # Resetting just in case
-    st.session_state.questions = []
-    st.session_state.answered = False
-    st.session_state.selected_option = None
-    st.session_state.correct_option = None
-    st.session_state.current_options_order = []
-    # Optionally reset token too if desired:
-    # st.session_state.pop('token', None)
-
-# Function to check the answer
-# Function to check the answer
-def check_answer(selected_option, correct_answer):
-    st.session_state.answered = True
-    st.session_state.selected_option = selected_option
-    st.session_state.correct_option = correct_answer
-
-    points = 0 # Points for this question
-    difficulty = st.session_state.get('difficulty', 'Easy') # Get current difficulty
-
-    if selected_option == correct_answer:
-        # --- Dynamic Scoring ---
-        if difficulty == "Easy":
-            points = 10
-        elif difficulty == "Medium":
-            points = 20
-        elif difficulty == "Hard":
-            points = 30
-        else:
-            points = 10 # Default points
-
-        st.session_state.score += points
-        st.session_state.correct_answers += 1 # Keep track of raw count too
-
-        st.session_state.current_streak += 1
-
-    else:
-        st.session_state.current_streak = 0 
+    get_engine().reset()
+    save_game_state()
+    log_event("reset")
+
+# Function to check the answer (scoring rules live in TriviaEngine.answer)
+@metrics.timed("check_answer")
+def check_answer(selected_option):
+    start = time.perf_counter()
+    engine = get_engine()
+    if engine.finished or engine.answered:
+        return  # The question timed out before the click arrived
+    # Measured here, on the server: from the question being rendered to the answer arriving
+    think_time = question_elapsed()
+    if think_time is not None:
+        metrics.observe_answer("think", engine.current_question_record().difficulty, think_time * 1000)
+        if engine.question_time is not None and think_time > engine.question_time + ANSWER_GRACE:
+            time_out()
+            return
+    # Where the option was on screen, so a replay can check the shuffle too
+    position = engine.options().index(selected_option)
+    outcome = engine.answer(selected_option, elapsed=think_time)
+    save_game_state()
+    log_event("answer", i=engine.current_question, option=selected_option, pos=position, correct=outcome["correct"],
+              points=outcome["points"], bonus=outcome["bonus"], score=outcome["score"],
+              think_ms=None if think_time is None else round(think_time * 1000, 1), ms=replay_log.elapsed_ms(start))
+
+# Function for seconds since the current question was first rendered (see display_question_area),
+# None if this session didn't render it (restored from another replica in between)
+def question_elapsed():
+    engine = get_engine()
+    shown = st.session_state.get('question_shown')
+    if shown is None or shown[0] != (engine.round_seed, engine.current_question):
+        return None
+    return time.monotonic() - shown[1]
+
+# Function for a timed question whose time ran out: it counts as wrong
+def time_out():
+    engine = get_engine()
+    if engine.finished or engine.answered:
+        return
+    engine.expire()
+    metrics.inc("trivia_questions_timed_out_total")
+    save_game_state()
+    log_event("expire", i=engine.current_question)
+
+# Function to put a finished round on the leaderboard (queued, written in the background)
+def record_result():
+    metrics.inc("trivia_games_completed_total")
+    player_name = st.session_state.get('player_name') or "Anonymous"
+    results = get_engine().results()
+    get_leaderboard().record(get_player_id(), player_name, results)
+    log_event("result", score=results["score"], correct_answers=results["correct_answers"],
+              total_questions=results["total_questions"], duration=results["duration"])
 
 # Function to proceed to next question
 def next_question():
-    st.session_state.current_question += 1
-    st.session_state.answered = False
-    st.session_state.selected_option = None
-    st.session_state.correct_option = None
-
-# Category mapping (name to ID)
-category_mapping = {
-    "🧠 General Knowledge": 9,
-    "📚 Books": 10,
-    "🎬 Film": 11,
-    "🎵 Music": 12,
-    "📺 Television": 14,
-    "🎮 Video Games": 15,
-    "🔬 Science & Nature": 17,
-    "💻 Computers": 18,
-    "🔢 Mathematics": 19,
-    "⚽ Sports": 21,
-    "🗺️ Geography": 22,
-    "📜 History": 23,
-    "🏛️ Politics": 24,
-    "🎨 Art": 25,
-    "🐾 Animals": 27,
-    "🚗 Vehicles": 28,
-    "📕 Comics": 29,
-    "🔌 Gadgets": 30,
-    "🇯🇵 Anime & Manga": 31,
-    "🎭 Cartoon & Animations": 32,
-}
+    start = time.perf_counter()
+    st.session_state.transition_at = time.monotonic()
+    engine = get_engine()
+    offset = engine.offset
+    more = engine.next()
+    if not more:
+        record_result()
+    save_game_state()
+    values = {"i": engine.current_question, "finished": not more, "ms": replay_log.elapsed_ms(start)}
+    if engine.offset != offset and engine.questions:
+        # The engine streamed in a new page, a replay needs it
+        values["page"] = question_rows(engine.questions)
+    log_event("next", **values)
+
+# Function to stop a marathon and go to the results
+def end_marathon():
+    start = time.perf_counter()
+    get_engine().finish()
+    log_event("finish", i=get_engine().current_question, ms=replay_log.elapsed_ms(start))
+    record_result()
+    save_game_state()
+
+# --- Multiplayer rooms ---
+
+# Function to get the room this session is in, None if it isn't in one (or the room is gone)
+def get_room():
+    code = st.session_state.get('room_code')
+    if not code:
+        return None
+    try:
+        return get_room_registry().get(code)
+    except RoomError:
+        st.session_state.room_code = None
+        return None
+
+# Function to create a room with the selected settings, its questions are fetched once for everybody
+def create_room():
+    questions = fetch_questions(st.session_state.category, st.session_state.difficulty, st.session_state.question_type)
+    if not questions:
+        return
+    key = get_pool_key(st.session_state.category, st.session_state.difficulty, st.session_state.question_type)
+    player_name = st.session_state.get('player_name') or "Host"
+    room = get_room_registry().create(get_player_id(), player_name, *key, questions, question_time=ROOM_QUESTION_TIME)
+    st.session_state.room_code = room.code
+
+# Function to join the room whose code was typed in on the settings screen
+def join_room():
+    try:
+        room = get_room_registry().get(st.session_state.get('settings_room_code', ''))
+        room.join(get_player_id(), st.session_state.get('player_name') or "Anonymous")
+    except RoomError as e:
+        st.session_state.room_error = str(e)
+        return
+    st.session_state.room_code = room.code
+
+# Function for the host to start the room's game
+def start_room():
+    room = get_room()
+    if room is None:
+        return
+    try:
+        room.start(get_player_id())
+    except RoomError:
+        pass  # Already started (a second click), or the host changed
+
+# Function to answer the room's open question (same scoring rules as check_answer)
+def answer_room(selected_option):
+    room = get_room()
+    if room is None:
+        return
+    try:
+        room.answer(get_player_id(), selected_option)
+    except RoomError:
+        pass  # The question closed before the click arrived, or it was a second click
 
-# Main application logic
-# Make sure you have also updated the check_answer function as previously discussed!
+# Function to leave the room and go back to the settings screen
+def leave_room():
+    room = get_room()
+    if room is not None:
+        room.leave(get_player_id())
+    st.session_state.room_code = None
 
 # Main application logic
 def display_settings():
@@ -308,27 +470,71 @@ def display_settings():
     # --- Instructions Expander ---
     with st.expander("How to Play", expanded=False): # Set expanded=True to show by default
         st.markdown("""
-        1.  **Choose your challenge:** Select a Category, Difficulty, and Question Type (Multiple Choice or True/False).
+        1.  **Choose your challenge:** Select one or more Categories and Difficulties, and a Question Type (Multiple Choice or True/False). Picking several mixes them in one round.
         2.  **Start the game:** Hit the "START" button.
-        3.  **Answer questions:** Select your answer for each of the 10 questions presented.
-        4.  **Check feedback:** See if you were correct or incorrect. Correct answers earn points based on difficulty and build your 🔥 Streak!
+        3.  **Answer questions:** Select your answer for each question in the round (10 by default, or play an endless Marathon).
+        4.  **Check feedback:** See if you were correct or incorrect. Correct answers earn points based on the question's difficulty and build your 🔥 Streak! In ⏱️ Timed mode, fast answers earn up to half their points again as a bonus, and running out of time counts as wrong.
         5.  **Continue:** Click "Next Question" to move on.
-        6.  **Finish:** See your final score after 10 questions! Good luck!
+        6.  **Finish:** See your final score at the end of the round! Good luck!
         """)
         st.markdown("---") # Optional separator inside expander
+    # Categories come from the cached catalog (never waits on the network) and are
+    # annotated with how many questions they have for the selected difficulties
+    catalog = get_catalog()
+    category_names = list(catalog.categories())
+    difficulties = [d.lower() for d in st.session_state.get('settings_difficulty', ["Easy"])]
+    if len(difficulties) == 3:
+        difficulties = [""]
+
+    def with_question_count(name):
+        counts = [catalog.count(catalog.category_id(name), d) for d in difficulties]
+        if not counts or None in counts:
+            return name
+        return f"{name} ({sum(counts)})"
+
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.session_state.category = st.selectbox(
-            "Select Category", options=list(category_mapping.keys()), index=0, key="settings_category"
+        st.session_state.category = st.multiselect(
+            "Select Categories", options=category_names, default=category_names[:1],
+            format_func=with_question_count, key="settings_category"
         )
     with col2:
-        st.session_state.difficulty = st.selectbox(
-            "Select Difficulty", options=["Easy", "Medium", "Hard"], index=0, key="settings_difficulty"
+        st.session_state.difficulty = st.multiselect(
+            "Select Difficulties", options=["Easy", "Medium", "Hard"], default=["Easy"], key="settings_difficulty"
         )
     with col3:
         st.session_state.question_type = st.selectbox(
             "Select Type", options=["multiple", "boolean"], index=0, key="settings_type"
         )
+    col1, col2 = st.columns(2)
+    with col1:
+        st.session_state.round_length = st.selectbox(
+            "Round Length", options=list(ROUND_LENGTHS.keys()), index=0, key="settings_round_length"
+        )
+    with col2:
+        st.session_state.player_name = st.text_input(
+            "Your Name (for the leaderboard)", max_chars=24, key="settings_player_name"
+        ).strip()
+    st.session_state.timed = st.toggle(
+        f"⏱️ Timed mode: {QUESTION_TIME}s per question, faster correct answers score more", key="settings_timed"
+    )
+
+    if not st.session_state.category or not st.session_state.difficulty:
+        st.info("Pick at least one category and one difficulty to start.")
+        return
+
+    # Drop a prefetched round as soon as it no longer matches the selected settings
+    key = get_pool_key(st.session_state.category, st.session_state.difficulty, st.session_state.question_type)
+    prefetch = st.session_state.get('prefetch')
+    if prefetch is not None and prefetch["key"] != key:
+        drop_prefetch()
+
+    # Don't send requests the catalog already knows can't be filled (they would come back with code 1)
+    needed = min(ROUND_LENGTHS[st.session_state.round_length] or PAGE_SIZE, PAGE_SIZE)
+    available = catalog.available(key)
+    can_fill = available is None or available >= needed
+    if not can_fill:
+        st.warning(f"Only {available} questions exist for this selection, a round needs {needed}. Add more categories or difficulties.")
 
     st.markdown(
         """
@@ -338,22 +544,72 @@ def display_settings():
         """,
         unsafe_allow_html=True
     )
-    if st.button("START", key="start_button", use_container_width=True, type="primary"):
+    if st.button("START", key="start_button", use_container_width=True, type="primary", disabled=not can_fill):
         start_game() # Assumes start_game() is defined elsewhere
         st.rerun()
 
+    display_room_settings(can_fill)
+    display_leaderboard()
+
+# --- Helper Function: Display Room Settings ---
+def display_room_settings(can_create=True):
+    """Displays the controls to create or join a multiplayer room."""
+    with st.expander("👥 Play with Friends", expanded=False):
+        st.markdown("Create a room with the settings above and share its code, or join a friend's room.")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.button("Create Room", key="create_room_button", on_click=create_room, use_container_width=True, disabled=not can_create)
+        with col2:
+            st.text_input("Room Code", max_chars=5, key="settings_room_code")
+            st.button("Join Room", key="join_room_button", on_click=join_room, use_container_width=True)
+        if 'room_error' in st.session_state:
+            st.error(st.session_state.pop('room_error'))
+
+# --- Helper Function: Display Leaderboard ---
+def display_leaderboard():
+    """Displays the top scores for the selected settings, and the player's best."""
+    category, difficulty, question_type = get_pool_key(st.session_state.category, st.session_state.difficulty, st.session_state.question_type)
+    # One board per round length (and timed or not), served from the leaderboard's cache;
+    # new results are merged into it as they come in
+    timed = bool(st.session_state.get('timed'))
+    round_size = ROUND_LENGTHS[st.session_state.round_length]
+    entries = get_leaderboard().top(category, difficulty, question_type, round_size, timed=timed)
+
+    board_name = st.session_state.round_length + (", Timed" if timed else "")
+    st.markdown(f"### 🏆 Leaderboard ({board_name})")
+    if not entries:
+        st.markdown("No scores for these settings yet. Be the first!")
+    else:
+        rows = ["| # | Player | Score | Correct | Best Streak |", "|---|---|---|---|---|"]
+        for rank, entry in enumerate(entries, start=1):
+            rows.append(
+                f"| {rank} | {entry['player_name'].replace('|', '/')} | {entry['score']} "
+                f"| {entry['correct_answers']}/{entry['total_questions']} | {entry['max_streak']} |"
+            )
+        st.markdown("\n".join(rows))
+
+    best = get_leaderboard().player_best(get_player_id())
+    if best is not None:
+        st.caption(f"Your best: {best['score']} points ({best['correct_answers']}/{best['total_questions']} correct)")
+
 # --- Helper Function: Display Game Header (Score, Streak, Progress) ---
+@metrics.timed("display_game_header")
 def display_game_header():
     """Displays the score, streak, question progress, and progress bar."""
-    if not st.session_state.game_started or not st.session_state.questions:
+    engine = get_engine()
+    if not st.session_state.game_started or not engine.loaded:
         return # Don't display if game hasn't started or no questions
 
-    total_questions_in_round = len(st.session_state.questions)
-    current_q_display_num = min(st.session_state.current_question + 1, total_questions_in_round)
+    # None while a marathon runs, the round has no known end
+    total_questions_in_round = engine.total_questions
 
-    score_text = f"Score: {st.session_state.score}"
-    streak_text = f"Streak: {st.session_state.current_streak} 🔥" if st.session_state.current_streak > 0 else "Streak: 0"
-    question_progress_text = f"Question: {current_q_display_num}/{total_questions_in_round}"
+    score_text = f"Score: {engine.score}"
+    streak_text = f"Streak: {engine.current_streak} 🔥" if engine.current_streak > 0 else "Streak: 0"
+    if total_questions_in_round is None:
+        question_progress_text = f"Question: {engine.current_question + 1} (Marathon)"
+    else:
+        current_q_display_num = min(engine.current_question + 1, total_questions_in_round)
+        question_progress_text = f"Question: {current_q_display_num}/{total_questions_in_round}"
 
     st.markdown(
         f"""
@@ -364,62 +620,71 @@ def display_game_header():
         unsafe_allow_html=True,
     )
 
-    # Visual Progress Bar
-    progress_value = (st.session_state.current_question) / total_questions_in_round
-    st.progress(progress_value)
+    # Visual Progress Bar (a marathon has nothing to measure against)
+    if total_questions_in_round:
+        st.progress(engine.current_question / total_questions_in_round)
     st.markdown("---") # Separator
 
 # --- Helper Function: Display Question Area ---
 def display_question_area(current_q):
     """Displays the current question text, difficulty, and category."""
-    st.markdown(f'<div class="question-text fade-in">Question {st.session_state.current_question + 1}: {html.unescape(current_q["question"])}</div>', unsafe_allow_html=True)
-    st.markdown(f'<div class="fade-in">*(Difficulty: {current_q["difficulty"].capitalize()}, Category: {html.unescape(current_q["category"])})*</div>', unsafe_allow_html=True)
+    engine = get_engine()
+    # The question's clock starts the first time it is rendered, later reruns don't restart it
+    question_id = (engine.round_seed, engine.current_question)
+    shown = st.session_state.get('question_shown')
+    if shown is None or shown[0] != question_id:
+        now = time.monotonic()
+        st.session_state.question_shown = (question_id, now)
+        # Server side of the wait: from the START/Next click to the question being rendered
+        transition_at = st.session_state.pop('transition_at', None)
+        if transition_at is not None:
+            metrics.observe_answer("render", current_q.difficulty, (now - transition_at) * 1000)
+    st.markdown(f'<div class="question-text fade-in">Question {engine.current_question + 1}: {current_q.question}</div>', unsafe_allow_html=True)
+    st.markdown(f'<div class="fade-in">*(Difficulty: {current_q.difficulty.capitalize()}, Category: {current_q.category})*</div>', unsafe_allow_html=True)
     st.markdown("---")
 
 # --- Helper Function: Display Answer Buttons ---
+@metrics.timed("display_answer_buttons")
 def display_answer_buttons(current_q):
     """Displays the True/False or Multiple Choice answer buttons."""
-    if current_q["type"] == "boolean":
+    engine = get_engine()
+    if current_q.type == "boolean":
         col1, col2 = st.columns(2)
         with col1:
-            if st.button("True", key="true_btn", type="primary", use_container_width=True):
-                check_answer("True", current_q["correct_answer"]) # Assumes check_answer is defined
-                st.rerun()
+            # Answer in the click callback, so the fragment rerun it triggers already shows feedback
+            st.button("True", key="true_btn", type="primary", use_container_width=True,
+                      on_click=check_answer, args=("True",))
         with col2:
-            if st.button("False", key="false_btn", type="primary", use_container_width=True):
-                check_answer("False", current_q["correct_answer"])
-                st.rerun()
+            st.button("False", key="false_btn", type="primary", use_container_width=True,
+                      on_click=check_answer, args=("False",))
     else: # Multiple Choice Buttons
-        correct_answer_unescaped = html.unescape(current_q["correct_answer"])
-        options = [correct_answer_unescaped] + [html.unescape(ans) for ans in current_q["incorrect_answers"]]
-        random.shuffle(options) # Assumes random is imported
-        st.session_state.current_options_order = options # Store order for feedback
-
-        for option in options:
-            # Ensure unique keys if options can be numerically similar (e.g., '1' vs 1)
-            button_key = f"option_{option}_{st.session_state.current_question}"
-            if st.button(option, key=button_key, use_container_width=True):
-                check_answer(option, correct_answer_unescaped)
-                st.rerun()
+        # Order comes from the round seed, so reruns show the same order without touching session state
+        options = engine.options()
+
+        for i, option in enumerate(options):
+            # Index-based keys keep the same buttons alive across reruns and questions
+            st.button(option, key=f"option_{i}", use_container_width=True,
+                      on_click=check_answer, args=(option,))
 
 # --- Helper Function: Display Feedback Area ---
+@metrics.timed("display_feedback_area")
 def display_feedback_area(current_q):
     """Displays feedback (correct/incorrect styles), points message, streak message,
        and Next button with fade-in animations.
     """
-    correct_answer_unescaped = html.unescape(current_q["correct_answer"])
-    # Retrieve the order options were displayed in, needed for consistent feedback.
-    # Assumes 'current_options_order' was set in session_state when buttons were created.
-    options_in_order_displayed = st.session_state.get('current_options_order', [])
+    engine = get_engine()
+    correct_answer = current_q.correct_answer
+    # Same order the buttons were displayed in, derived from the round seed
+    options_in_order_displayed = engine.options()
 
     st.markdown("---") # Separator before feedback
 
     # --- Display styled feedback for the options ---
-    if current_q["type"] == "boolean":
+    if current_q.type == "boolean":
         col1, col2 = st.columns(2)
         # Determine styles based on correctness and user selection
-        true_style = "correct" if "True" == correct_answer_unescaped else "incorrect" if st.session_state.selected_option == "True" else ""
-        false_style = "correct" if "False" == correct_answer_unescaped else "incorrect" if st.session_state.selected_option == "False" else ""
+        true_style = "correct" if "True" == correct_answer else "incorrect" if engine.selected_option == "True" else ""
+        false_style = "correct" if "False" == correct_answer else "incorrect" if engine.selected_option == "False" else ""
 
         with col1:
             # Apply fade-in class to the markdown div
@@ -429,14 +694,9 @@ def display_feedback_area(current_q):
             st.markdown(f'<div class="{false_style} fade-in" style="padding: 10px; border-radius: 5px; text-align: center; margin-bottom: 10px;">False</div>', unsafe_allow_html=True)
 
     else: # Multiple Choice Feedback
-        # Fallback if options order wasn't stored (feedback order might not match button order)
-        if not options_in_order_displayed:
-             options_in_order_displayed = [correct_answer_unescaped] + [html.unescape(ans) for ans in current_q["incorrect_answers"]]
-             st.warning("Option order for feedback might be inconsistent.", icon="⚠️") # Warn user if fallback is used
-
         for i, option in enumerate(options_in_order_displayed):
             # Determine style based on correctness and user selection
-            option_style = "correct" if option == correct_answer_unescaped else "incorrect" if option == st.session_state.selected_option else ""
+            option_style = "correct" if option == correct_answer else "incorrect" if option == engine.selected_option else ""
             # Apply fade-in class to the markdown div
             # You could add a staggered delay using CSS style='animation-delay: {i * 0.05}s' but keeping it simple here.
             st.markdown(f'<div class="{option_style} fade-in" style="padding: 10px; border-radius: 5px; text-align: center; margin-bottom: 10px;">{option}</div>', unsafe_allow_html=True)
@@ -444,42 +704,46 @@ def display_feedback_area(current_q):
     st.markdown("---") # Separator after option feedback
 
     # --- Display points/streak message ---
-    if st.session_state.selected_option == correct_answer_unescaped:
-        # Calculate points earned (ensure difficulty is in session stacounter te)
-        difficulty = st.session_state.get('difficulty', 'Easy')
-        points_earned = 10 if difficulty == "Easy" else 20 if difficulty == "Medium" else 30
+    if engine.selected_option == correct_answer:
         # Use st.success for positive feedback (includes icon and subtle animation)
-        st.success(f"Correct! +{points_earned} points", icon="✅")
+        if engine.answer_bonus:
+            st.success(f"Correct! +{current_q.points} points, +{engine.answer_bonus} speed bonus ({engine.answer_time:.1f}s)", icon="✅")
+        else:
+            st.success(f"Correct! +{current_q.points} points", icon="✅")
         # Display streak info if streak is greater than 1
-        if st.session_state.current_streak > 1:
+        if engine.current_streak > 1:
              # Use st.info for neutral supplementary info
-             st.info(f"Streak: {st.session_state.current_streak} 🔥")
+             st.info(f"Streak: {engine.current_streak} 🔥")
+    elif engine.selected_option is None:
+        # Timed mode, the clock ran out
+        st.error(f"Time's up! The answer was: {correct_answer}", icon="⏱️")
     else:
         # Use st.error for negative feedback (includes icon and subtle animation)
-        st.error(f"Incorrect! The answer was: {correct_answer_unescaped}", icon="❌")
+        st.error(f"Incorrect! The answer was: {correct_answer}", icon="❌")
         # Optionally mention if a streak was broken
 
 
     # --- Next Question Button ---
     # This button appears after feedback is shown.
-    # Assumes 'next_question' function is defined elsewhere and handles state update.
-    if st.button("Next Question", on_click=next_question, type="primary", use_container_width=True):
-        # Streamlit handles the rerun automatically after the on_click callback finishes.
-        pass
+    # The click only reruns the game fragment, which moves on to the results screen when the round is over.
+    st.button("Next Question", on_click=next_question, type="primary", use_container_width=True)
+    if engine.total_questions is None:
+        st.button("End Marathon", on_click=end_marathon, type="secondary", use_container_width=True)
 
 
 # --- Helper Function: Display Results Screen ---
 def display_results():
     """Displays the final score and options to play again or change settings."""
-    total_questions_in_round = len(st.session_state.questions)
+    engine = get_engine()
+    total_questions_in_round = engine.total_questions
     st.progress(1.0) # Show full progress bar
 
     st.markdown(
         f"""
         <div style="text-align: center; margin: 50px 0;">
             <h2>Game Completed!</h2>
-            <h3>Final Score: {st.session_state.score} points</h3>
-            <p>({st.session_state.correct_answers} / {total_questions_in_round} correct answers)</p>
+            <h3>Final Score: {engine.score} points</h3>
+            <p>({engine.correct_answers} / {total_questions_in_round} correct answers)</p>
         </div>
         """,
         unsafe_allow_html=True,
@@ -502,39 +766,153 @@ def display_loading_error():
      if st.button("Back to Settings", type="primary"):
          return_to_settings()
          st.rerun()
+# --- Fragment: Timed Mode Countdown ---
+@st.fragment(run_every=1)
+def display_countdown():
+    """Displays the seconds left for a timed question and times it out when they run out.
+
+    Only this small fragment reruns every second; the question and the answer
+    buttons are not re-sent while the clock ticks.
+    """
+    engine = get_engine()
+    think_time = question_elapsed()
+    if engine.finished or engine.answered or think_time is None:
+        return
+    seconds_left = engine.question_time - think_time
+    if seconds_left <= 0:
+        time_out()
+        # Once per question: show the feedback, which lives outside this fragment
+        st.rerun()
+    urgent = " urgent" if seconds_left <= COUNTDOWN_URGENT else ""
+    st.markdown(f'<div class="countdown{urgent}">⏱️ {math.ceil(seconds_left)}s</div>', unsafe_allow_html=True)
+
+# --- Fragment: Game In Progress ---
+@st.fragment
+def display_game_screen():
+    """Displays the header, current question and answer buttons or feedback.
+
+    Runs as a fragment: answering and "Next Question" only re-execute and re-send
+    this part of the page, not the CSS block, title or anything else in main().
+    """
+    engine = get_engine()
+    # The round just finished, the results screen is outside this fragment
+    if engine.finished:
+        st.rerun()
+
+    display_game_header()
+    current_q = engine.current_question_record()
+    display_question_area(current_q)
+
+    if engine.answered:
+        display_feedback_area(current_q)
+    else:
+        if engine.question_time is not None:
+            display_countdown()
+        display_answer_buttons(current_q)
+
+# --- Fragment: Multiplayer Room ---
+@st.fragment(run_every=1)
+def display_room_screen():
+    """Displays the room: lobby, the shared question and its countdown, the reveal and the scoreboard.
+
+    Reruns every second to follow the room's clock. Every member reads the same
+    snapshot of the room, it is only rebuilt when the room changes.
+    """
+    room = get_room()
+    try:
+        snapshot = room.snapshot() if room is not None else None
+        me = room.player_view(get_player_id()) if room is not None else None
+    except RoomError:
+        snapshot = None
+    if snapshot is None:
+        # The room is gone (or dropped us), back to the settings screen
+        st.session_state.room_code = None
+        st.rerun()
+
+    st.markdown(
+        f'<div class="score-counter">Room {snapshot["code"]} | {snapshot["members"]} players | Score: {me["score"]}</div>',
+        unsafe_allow_html=True,
+    )
+
+    if snapshot["phase"] == "lobby":
+        st.markdown(f"Share the code **{snapshot['code']}** with your friends. Waiting for players...")
+        if snapshot["host_id"] == get_player_id():
+            st.button("Start Game", key="room_start_button", on_click=start_room, type="primary", use_container_width=True)
+        else:
+            st.info("The host will start the game soon.")
+
+    elif snapshot["phase"] in ("question", "reveal"):
+        question = snapshot["question"]
+        seconds_left = max(0, int(snapshot["deadline"] - time.monotonic()))
+        st.markdown(f"Question {snapshot['index'] + 1}/{snapshot['total']} | ⏱️ {seconds_left}s | {snapshot['answered']}/{snapshot['members']} answered")
+        st.markdown(f'<div class="question-text fade-in">{question["question"]}</div>', unsafe_allow_html=True)
+        st.markdown(f'*(Difficulty: {question["difficulty"].capitalize()}, Category: {question["category"]})*')
+
+        if snapshot["phase"] == "question" and not me["answered"]:
+            for i, option in enumerate(question["options"]):
+                st.button(option, key=f"room_option_{i}", on_click=answer_room, args=(option,), use_container_width=True)
+        elif snapshot["phase"] == "question":
+            st.info(f"Locked in: {me['selected_option']}. Waiting for the others...")
+        else:
+            for option in question["options"]:
+                option_style = "correct" if option == question["correct_answer"] else "incorrect" if option == me["selected_option"] else ""
+                st.markdown(f'<div class="{option_style} fade-in" style="padding: 10px; border-radius: 5px; text-align: center; margin-bottom: 10px;">{option}</div>', unsafe_allow_html=True)
+            if me["selected_option"] == question["correct_answer"]:
+                st.success(f"Correct! +{question['points']} points", icon="✅")
+            else:
+                st.error(f"The answer was: {question['correct_answer']}", icon="❌")
+
+    else:
+        st.markdown("## Game Over!")
+
+    # --- Scoreboard (top 10) ---
+    rows = ["| # | Player | Score |", "|---|---|---|"]
+    for rank, entry in enumerate(snapshot["scoreboard"][:10], start=1):
+        name = entry["name"].replace("|", "/")
+        if entry["player_id"] == get_player_id():
+            name = f"**{name} (you)**"
+        rows.append(f"| {rank} | {name} | {entry['score']} |")
+    st.markdown("\n".join(rows))
+
+    st.button("Leave Room", key="leave_room_button", on_click=leave_room, type="secondary")
+
+@metrics.timed("main")
 def main():
+    if metrics.ENABLED:
+        start_metrics_exporter()
+        metrics.touch_session(get_player_id())
+    restore_game_state()
+    engine = get_engine()
+
     st.title("🎮 Trivia Game 🎮")
     st.markdown("Test your knowledge with fun trivia questions!")
 
     # --- Game State Controller ---
 
+    # Multiplayer: the room drives the screen until the player leaves it
+    if get_room() is not None:
+        display_room_screen()
+
     # State 1: Settings Screen
-    if not st.session_state.game_started:
+    elif not st.session_state.game_started:
         display_settings()
+        # The settings screen is already on its way to the browser: set up the question pool
+        # (imports, token warm-up) now, so the START click doesn't pay for it
+        get_question_pool()
 
     # State 2: Game In Progress
-    elif st.session_state.game_started and st.session_state.questions and st.session_state.current_question < len(st.session_state.questions):
-        display_game_header()
-        current_q = st.session_state.questions[st.session_state.current_question]
-        display_question_area(current_q)
-
-        if st.session_state.answered:
-            display_feedback_area(current_q)
-        else:
-            display_answer_buttons(current_q)
+    elif st.session_state.game_started and engine.loaded and not engine.finished:
+        display_game_screen()
 
     # State 3: Results Screen
-    elif st.session_state.game_started and st.session_state.questions and st.session_state.current_question >= len(st.session_state.questions):
+    elif st.session_state.game_started and engine.loaded and engine.finished:
         display_game_header() # Show final header state
         display_results()
 
     # State 4: Loading Error (No questions fetched)
-    elif st.session_state.game_started and not st.session_state.questions:
+    elif st.session_state.game_started and not engine.loaded:
         display_loading_error()
 
 # --- Entry Point ---
 if __name__ == "__main__":
-    # Make sure necessary imports (streamlit, html, random, requests, time) are at the top
-    # Make sure function definitions (fetch_questions, check_answer, next_question, etc.)
-    # and category_mapping are defined before main() is called.
     main()
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""Static UI tables and the app's CSS, built once per process.
+
+``app.py`` is re-executed on every rerun, so anything constant lives here
+instead: Python runs this module once, on first import, and every rerun
+and every session reuses the objects.
+"""
+import re
+
+# Custom CSS for styling
+CSS = """
+<style>
+    .big-button {
+        font-size: 30px !important;
+        height: 100px !important;
+        margin: 50px 0px !important;
+        background-color: #4CAF50 !important;
+        color: white !important;
+    }
+    .correct {
+        background-color: #4CAF50;
+        color: white;
+        padding: 10px;
+        border-radius: 5px;
+        /* Animation applied via class below */
+    }
+    .incorrect {
+        background-color: #f44336;
+        color: white;
+        padding: 10px;
+        border-radius: 5px;
+    }
+    .score-counter {
+        position: fixed;
+        top: 20px;  /* Increased from 10px */
+        right: 20px; /* Increased from 10px */
+        padding: 10px;
+        background-color: #2196F3;
+        color: white;
+        border-radius: 5px;
+        font-weight: bold;
+        z-index: 99; /* Ensure it stays on top */
+        text-align: right; /* Align text to the right within the box */
+    }
+
+    @keyframes fadeIn {
+        from { opacity: 0; transform: translateY(10px); } /* Start invisible and slightly down */
+        to { opacity: 1; transform: translateY(0); }   /* Fade to visible and original position */
+    }
+    .fade-in {
+        animation: fadeIn 0.5s ease-out forwards; /* Apply the animation */
+    }
+    @keyframes fadeOut {
+        from {opacity: 1;}
+        to {opacity: 0.5;}
+    }
+    .question-text {
+        font-size: 20px;
+        font-weight: bold;
+        margin-bottom: 20px;
+    }
+    .countdown {
+        text-align: center;
+        font-size: 18px;
+        font-weight: bold;
+    }
+    .countdown.urgent {
+        color: #f44336; /* Last few seconds of a timed question */
+    }
+    
+    /* New CSS for green START button */
+    .stButton > button[data-baseweb="button"][kind="primary"] {
+        background-color: #4CAF50 !important;
+        border-color: #4CAF50 !important;
+    }
+    
+    .stButton > button[data-baseweb="button"][kind="primary"]:hover,
+    .stButton > button[data-baseweb="button"][kind="primary"]:focus {
+        background-color: #3d9140 !important;
+        border-color: #3d9140 !important;
+    }
+</style>
+"""
+
+# What actually gets sent to the browser: comments and indentation stripped
+STYLE = re.sub(r"\s*\n\s*", "", re.sub(r"/\*.*?\*/", "", CSS, flags=re.S))
+
+# Category mapping (name to ID)
+category_mapping = {
+    "🧠 General Knowledge": 9,
+    "📚 Books": 10,
+    "🎬 Film": 11,
+    "🎵 Music": 12,
+    "📺 Television": 14,
+    "🎮 Video Games": 15,
+    "🔬 Science & Nature": 17,
+    "💻 Computers": 18,
+    "🔢 Mathematics": 19,
+    "⚽ Sports": 21,
+    "🗺️ Geography": 22,
+    "📜 History": 23,
+    "🏛️ Politics": 24,
+    "🎨 Art": 25,
+    "🐾 Animals": 27,
+    "🚗 Vehicles": 28,
+    "📕 Comics": 29,
+    "🔌 Gadgets": 30,
+    "🇯🇵 Anime & Manga": 31,
+    "🎭 Cartoon & Animations": 32,
+}
+
+# Round lengths offered on the settings screen, None plays until the player stops
+ROUND_LENGTHS = {
+    "10 questions": 10,
+    "25 questions": 25,
+    "50 questions": 50,
+    "100 questions": 100,
+    "250 questions": 250,
+    "500 questions": 500,
+    "♾️ Marathon": None,
+}
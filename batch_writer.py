@@ -0,0 +1,61 @@
+"""Queue drained in batches by a background thread, for writes off the script thread.
+
+The leaderboard and the replay log both hand their writes to a
+``BatchWriter``: ``put`` never waits on disk, and the writer thread passes
+whatever has queued up to ``write(batch)`` at most ``batch_size`` items at a
+time, waiting up to ``flush_interval`` seconds for a batch to fill.
+"""
+import atexit
+import queue
+import threading
+import time
+
+
+class BatchWriter:
+    """Calls ``write(batch)`` on a daemon thread with the items ``put`` queued.
+
+    With ``queue_size`` set, ``put`` drops items (and counts them in
+    ``dropped``) while the queue is full instead of holding them. A batch
+    whose ``write`` raises one of ``errors`` is dropped too.
+    """
+
+    def __init__(self, write, name, batch_size, flush_interval, queue_size=0, errors=(Exception,)):
+        self.write = write
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.errors = errors
+        self.dropped = 0
+        self._queue = queue.Queue(queue_size)
+        self._thread = threading.Thread(target=self._run, daemon=True, name=name)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def put(self, item):
+        """Queues ``item``. Never blocks; returns False if it was dropped."""
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self.write(batch)
+            except self.errors:
+                pass  # Losing a batch beats taking the app down
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def flush(self):
+        """Blocks until every queued item is written."""
+        self._queue.join()
@@ -0,0 +1,183 @@
+"""Local stand-in for the Open Trivia DB API, for benchmarks.
+
+Serves ``/api.php`` and ``/api_token.php`` with the real response codes (and
+``/api_category.php`` / ``/api_count.php`` for the category catalog) and
+lets you inject the failure modes that matter under load:
+
+* ``latency`` / ``jitter``: added delay per request, in milliseconds
+* ``rate_limit``: reject question calls arriving faster than this many per
+  second with code 5 (0 turns it off)
+* ``rate_limit_prob``: reject this fraction of question calls with code 5
+* ``questions_per_query``: how many questions exist per
+  (category, difficulty, type); a token that has seen them all gets code 4
+
+Run it on its own with ``python bench/fake_opentdb.py --port 8765`` and
+start the app with ``OPENTDB_BASE_URL=http://127.0.0.1:8765``.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class FakeOpenTDB:
+    def __init__(self, latency=0.0, jitter=0.0, rate_limit=0.0, rate_limit_prob=0.0,
+                 questions_per_query=500, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.rate_limit_prob = rate_limit_prob
+        self.questions_per_query = questions_per_query
+        self.calls = Counter()  # (endpoint, response_code) -> count
+        self._tokens = {}  # token -> {query: questions served}
+        self._last_question_call = 0.0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def total_calls(self, endpoint=None):
+        with self._lock:
+            return sum(n for (name, _), n in self.calls.items() if endpoint in (None, name))
+
+    # --- Endpoints ---
+
+    def token(self, params):
+        with self._lock:
+            if params.get("command") == "request":
+                token = uuid.uuid4().hex
+                self._tokens[token] = Counter()
+                return {"response_code": 0, "response_message": "Token Generated Successfully!", "token": token}
+            token = params.get("token", "")
+            if params.get("command") == "reset" and token in self._tokens:
+                self._tokens[token] = Counter()
+                return {"response_code": 0, "token": token}
+            return {"response_code": 3, "token": token}
+
+    def categories(self, params):
+        return {"trivia_categories": [{"id": i, "name": f"Fake Category {i}"} for i in range(9, 33)]}
+
+    def count(self, params):
+        per_difficulty = self.questions_per_query * 2  # both question types
+        return {"category_id": int(params.get("category", 0)), "category_question_count": {
+            "total_question_count": per_difficulty * 3,
+            "total_easy_question_count": per_difficulty,
+            "total_medium_question_count": per_difficulty,
+            "total_hard_question_count": per_difficulty,
+        }}
+
+    def questions(self, params):
+        amount = int(params.get("amount", 10))
+        query = (params.get("category", ""), params.get("difficulty", ""), params.get("type", ""))
+        with self._lock:
+            now = time.monotonic()
+            throttled = (self.rate_limit and now - self._last_question_call < 1 / self.rate_limit) \
+                or random.random() < self.rate_limit_prob
+            if throttled:
+                return {"response_code": 5, "results": []}
+            self._last_question_call = now
+            if not 1 <= amount <= 50:
+                return {"response_code": 2, "results": []}
+            if amount > self.questions_per_query:
+                return {"response_code": 1, "results": []}
+            token = params.get("token")
+            start = 0
+            if token:
+                if token not in self._tokens:
+                    return {"response_code": 3, "results": []}
+                start = self._tokens[token][query]
+                if start + amount > self.questions_per_query:
+                    return {"response_code": 4, "results": []}
+                self._tokens[token][query] += amount
+            else:
+                start = random.randrange(self.questions_per_query - amount + 1)
+        return {"response_code": 0, "results": [self._question(query, i) for i in range(start, start + amount)]}
+
+    def _question(self, query, i):
+        category, difficulty, question_type = query
+        difficulty = difficulty or "easy"
+        if question_type == "boolean":
+            return {"type": "boolean", "difficulty": difficulty, "category": f"Fake &amp; {category}",
+                    "question": f"Fake question {category}/{difficulty}/boolean #{i} is &quot;true&quot;?",
+                    "correct_answer": "True", "incorrect_answers": ["False"]}
+        return {"type": "multiple", "difficulty": difficulty, "category": f"Fake &amp; {category}",
+                "question": f"Fake question {category}/{difficulty}/multiple #{i}?",
+                "correct_answer": f"Right {i}", "incorrect_answers": [f"Wrong {i}a", f"Wrong {i}b", f"Wrong {i}c"]}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                params = {k: v[0] for k, v in parse_qs(parts.query, keep_blank_values=True).items()}
+                if fake.latency or fake.jitter:
+                    time.sleep((fake.latency + random.uniform(0, fake.jitter)) / 1000)
+                if parts.path == "/api_token.php":
+                    endpoint, data = "token", fake.token(params)
+                elif parts.path == "/api.php":
+                    endpoint, data = "questions", fake.questions(params)
+                elif parts.path == "/api_category.php":
+                    endpoint, data = "category", fake.categories(params)
+                elif parts.path == "/api_count.php":
+                    endpoint, data = "count", fake.count(params)
+                else:
+                    self.send_error(404)
+                    return
+                code = data.get("response_code", 0)
+                with fake._lock:
+                    fake.calls[endpoint, code] += 1
+                body = json.dumps(data).encode()
+                self.send_response(429 if code == 5 else 200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Open Trivia DB server.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="ms added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra ms, up to this much")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="question calls per second (0 = off)")
+    parser.add_argument("--rate-limit-prob", type=float, default=0.0, help="fraction of calls answered with code 5")
+    parser.add_argument("--questions-per-query", type=int, default=500)
+    args = parser.parse_args()
+    fake = FakeOpenTDB(args.latency, args.jitter, args.rate_limit, args.rate_limit_prob,
+                       args.questions_per_query, port=args.port)
+    print(f"Fake Open Trivia DB listening on {fake.base_url}")
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
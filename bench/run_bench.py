@@ -0,0 +1,229 @@
+"""Load test for the trivia app against a local fake Open Trivia DB.
+
+Drives N concurrent simulated players through settings -> START -> 10
+answers -> Play Again and reports:
+
+* time to first question (START, and again for Play Again), p50/p95/p99
+* per-answer rerun latency (answer click and Next Question click)
+* outbound calls seen by the fake server, by endpoint and response code
+* traced memory per session
+
+Two harnesses: ``apptest`` runs the real Streamlit script with
+``streamlit.testing.v1.AppTest``; ``engine`` drives ``TriviaEngine`` directly
+and shows the cost of the game logic and question pool alone. AppTest keeps
+global state, so its script runs are serialized: sessions interleave and the
+shared pool/scheduler threads run concurrently, but only one rerun executes
+at a time. Latencies are measured per rerun, excluding that wait.
+
+    python bench/run_bench.py --sessions 20 --latency 80 --rate-limit-prob 0.05
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_opentdb import FakeOpenTDB  # noqa: E402
+
+APP_PATH = os.path.join(ROOT, "app.py")
+
+
+def percentile(values, p):
+    """Nearest-rank percentile, None for no samples."""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(1, -(-len(values) * p // 100))
+    return values[int(rank) - 1]
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "p50_ms": percentile(values, 50),
+        "p95_ms": percentile(values, 95),
+        "p99_ms": percentile(values, 99),
+    }
+
+
+class Timings:
+    def __init__(self):
+        self.samples = {"first_question": [], "play_again": [], "answer": [], "next": []}
+        self.errors = []
+        self._lock = threading.Lock()
+
+    def add(self, name, start):
+        with self._lock:
+            self.samples[name].append((time.perf_counter() - start) * 1000)
+
+    def error(self, message):
+        with self._lock:
+            self.errors.append(message)
+
+
+# --- AppTest harness ---
+
+_apptest_lock = threading.Lock()
+
+
+def click(timings, name, button):
+    """Clicks ``button`` and records how long the resulting rerun took."""
+    with _apptest_lock:
+        start = time.perf_counter()
+        button.click().run()
+        if name:
+            timings.add(name, start)
+
+
+def answer_button(at):
+    for button in at.button:
+        if button.key in ("true_btn", "option_0"):
+            return button
+    return None
+
+
+def play_apptest(timings, stop_after=None):
+    from streamlit.testing.v1 import AppTest
+
+    with _apptest_lock:
+        at = AppTest.from_file(APP_PATH, default_timeout=120).run()
+    click(timings, "first_question", at.button(key="start_button"))
+    for round_name in ("first", "again"):
+        for i in range(10):
+            button = answer_button(at)
+            if button is None:
+                timings.error(f"{round_name} round: no answer buttons at question {i + 1}")
+                return at
+            click(timings, "answer", button)
+            if stop_after == "answer":
+                return at
+            click(timings, "next", [b for b in at.button if b.label == "Next Question"][0])
+        if round_name == "first":
+            click(timings, "play_again", [b for b in at.button if b.label == "Play Again"][0])
+    return at
+
+
+# --- Engine harness ---
+
+def play_engine(timings, stop_after=None):
+    from engine import TriviaEngine
+    from opentdb import OpenTDBFetcher
+    from question_pool import QuestionPool
+
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = QuestionPool(OpenTDBFetcher())
+    engine = TriviaEngine(_pool)
+    for round_name in ("first_question", "play_again"):
+        start = time.perf_counter()
+        response_code = engine.start(9, "easy", "multiple") if round_name == "first_question" else engine.restart()
+        timings.add(round_name, start)
+        if response_code != 0:
+            timings.error(f"{round_name}: response code {response_code}")
+            return engine
+        while not engine.finished:
+            start = time.perf_counter()
+            engine.answer(engine.current()["options"][0])
+            timings.add("answer", start)
+            if stop_after == "answer":
+                return engine
+            start = time.perf_counter()
+            engine.next()
+            timings.add("next", start)
+    return engine
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+HARNESSES = {"apptest": play_apptest, "engine": play_engine}
+
+
+def measure_memory(play, sessions):
+    """Traced bytes per session for sessions held mid-round."""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = [play(Timings(), stop_after="answer") for _ in range(sessions)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    grown = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del kept
+    return grown / sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the trivia app against a fake Open Trivia DB.")
+    parser.add_argument("--harness", choices=sorted(HARNESSES), default="apptest")
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent simulated players")
+    parser.add_argument("--latency", type=float, default=50.0, help="fake server latency per request, ms")
+    parser.add_argument("--jitter", type=float, default=20.0, help="random extra latency, up to this many ms")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="fake server question calls per second (0 = off)")
+    parser.add_argument("--rate-limit-prob", type=float, default=0.0, help="fraction of question calls rejected with code 5")
+    parser.add_argument("--questions-per-query", type=int, default=500, help="questions per query before tokens run dry (code 4)")
+    parser.add_argument("--client-rate", type=float, default=1000.0, help="app-side question calls per second (OPENTDB_RATE_LIMIT)")
+    parser.add_argument("--memory-sessions", type=int, default=5, help="sessions used for the memory measurement")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    fake = FakeOpenTDB(args.latency, args.jitter, args.rate_limit, args.rate_limit_prob, args.questions_per_query)
+    # Must be set before the app modules are imported
+    os.environ["OPENTDB_BASE_URL"] = fake.start()
+    os.environ["OPENTDB_RATE_LIMIT"] = str(args.client_rate)
+    play = HARNESSES[args.harness]
+
+    timings = Timings()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+        for future in [executor.submit(play, timings) for _ in range(args.sessions)]:
+            try:
+                future.result()
+            except Exception as e:
+                timings.error(repr(e))
+    wall = time.perf_counter() - started
+    calls = dict(fake.calls)
+    memory = measure_memory(play, args.memory_sessions) if args.memory_sessions else None
+    fake.stop()
+
+    import opentdb
+
+    report = {
+        "harness": args.harness,
+        "sessions": args.sessions,
+        "wall_s": round(wall, 3),
+        "first_question": summarize(timings.samples["first_question"]),
+        "play_again": summarize(timings.samples["play_again"]),
+        "answer_rerun": summarize(timings.samples["answer"]),
+        "next_rerun": summarize(timings.samples["next"]),
+        "outbound_calls": {f"{endpoint}:{code}": n for (endpoint, code), n in sorted(calls.items())},
+        "outbound_total": sum(calls.values()),
+        "scheduler": opentdb.scheduler.stats(),
+        "client_latency": opentdb.client.latency_stats(),
+        "memory_per_session_kb": round(memory / 1024, 1) if memory is not None else None,
+        "errors": timings.errors,
+    }
+
+    print(f"{args.harness}: {args.sessions} sessions in {report['wall_s']}s")
+    for name in ("first_question", "play_again", "answer_rerun", "next_rerun"):
+        s = report[name]
+        fmt = lambda v: "-" if v is None else f"{v:.1f}"  # noqa: E731
+        print(f"  {name:<15} n={s['count']:<5} p50={fmt(s['p50_ms'])}ms p95={fmt(s['p95_ms'])}ms p99={fmt(s['p99_ms'])}ms")
+    print(f"  outbound calls  {report['outbound_total']} {report['outbound_calls']}")
+    print(f"  scheduler       {report['scheduler']}")
+    print(f"  memory/session  {report['memory_per_session_kb']} KB")
+    if timings.errors:
+        print(f"  errors          {len(timings.errors)}, first: {timings.errors[0]}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
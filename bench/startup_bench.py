@@ -0,0 +1,133 @@
+"""Cold-start and per-rerun time budget for the settings screen.
+
+Measures, in fresh processes so nothing is warm:
+
+* app imports: importing the modules ``app.py`` imports at the top, on top of
+  an already imported Streamlit (the server has that before any session),
+  and whether ``requests`` got pulled in (it should only load on first fetch)
+* cold start: the first script run of a new process, through AppTest
+* rerun: later runs of the settings screen, p50/p95, and the ``main`` span
+  from metrics.py, which excludes AppTest's own overhead
+
+and exits non-zero if a budget is exceeded, so it can gate a change:
+
+    python bench/startup_bench.py --reruns 50 --budget-main-ms 15
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "app.py")
+
+IMPORT_PROBE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+import streamlit
+start = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+print(json.dumps({{"ms": (time.perf_counter() - start) * 1000, "requests": "requests" in sys.modules}}))
+"""
+
+RUN_PROBE = """
+import json, os, sys, time
+sys.path.insert(0, {root!r})
+from streamlit.testing.v1 import AppTest
+import metrics
+at = AppTest.from_file({app!r}, default_timeout=60)
+start = time.perf_counter()
+at.run()
+cold = (time.perf_counter() - start) * 1000
+reruns = []
+for _ in range({reruns}):
+    start = time.perf_counter()
+    at.run()
+    reruns.append((time.perf_counter() - start) * 1000)
+main = metrics.snapshot()["histograms"].get("trivia_span_duration_ms", {{}}).get("main")
+print(json.dumps({{"cold_ms": cold, "rerun_ms": reruns, "main": main, "exception": bool(at.exception)}}))
+"""
+
+
+def app_imports():
+    """Top-level modules ``app.py`` imports, other than Streamlit."""
+    with open(APP_PATH) as f:
+        tree = ast.parse(f.read())
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            names.append(node.module)
+    return [name for name in names if name.split(".")[0] != "streamlit"]
+
+
+def probe(code, env):
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[max(0, -(-len(values) * p // 100) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start and rerun budget for the settings screen.")
+    parser.add_argument("--reruns", type=int, default=30)
+    parser.add_argument("--samples", type=int, default=3, help="fresh processes per measurement, the median is kept")
+    parser.add_argument("--budget-imports-ms", type=float, default=100.0)
+    parser.add_argument("--budget-cold-ms", type=float, default=1000.0)
+    parser.add_argument("--budget-rerun-ms", type=float, default=150.0, help="p95 of a whole settings rerun, AppTest included")
+    parser.add_argument("--budget-main-ms", type=float, default=20.0, help="mean of the main() span, the app's own share")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    # No network: the fetchers are never reached on the settings screen, and the
+    # pool warm-up at its end must not slow the measurement down either.
+    # The catalog cache is replaced atomically on save, so it gets a real file of its own.
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, TRIVIA_METRICS="json", TRIVIA_METRICS_LOG=os.devnull,
+                   OPENTDB_BASE_URL="http://127.0.0.1:9", TRIVIA_LEADERBOARD_PATH=":memory:",
+                   TRIVIA_CATALOG_PATH=os.path.join(tmp, "catalog.json"), TRIVIA_REPLAY_LOG="")
+        modules = app_imports()
+        imports = sorted((probe(IMPORT_PROBE.format(root=ROOT, modules=modules), env) for _ in range(args.samples)),
+                         key=lambda r: r["ms"])[args.samples // 2]
+        runs = sorted((probe(RUN_PROBE.format(root=ROOT, app=APP_PATH, reruns=args.reruns), env) for _ in range(args.samples)),
+                      key=lambda r: r["cold_ms"])
+    run = runs[args.samples // 2]
+
+    report = {
+        "imports_ms": round(imports["ms"], 1),
+        "requests_imported_at_startup": imports["requests"],
+        "cold_start_ms": round(run["cold_ms"], 1),
+        "rerun_p50_ms": round(percentile(run["rerun_ms"], 50), 1),
+        "rerun_p95_ms": round(percentile(run["rerun_ms"], 95), 1),
+        "main_span": run["main"],
+        "script_exception": run["exception"],
+    }
+    checks = [
+        ("app imports", report["imports_ms"], args.budget_imports_ms),
+        ("cold start", report["cold_start_ms"], args.budget_cold_ms),
+        ("rerun p95", report["rerun_p95_ms"], args.budget_rerun_ms),
+    ]
+    if run["main"] and run["main"]["mean_ms"] is not None:
+        checks.append(("main() mean", round(run["main"]["mean_ms"], 1), args.budget_main_ms))
+    failed = report["script_exception"] or report["requests_imported_at_startup"]
+    for name, value, budget in checks:
+        ok = value <= budget
+        failed = failed or not ok
+        print(f"  {name:<12} {value:>8.1f}ms  budget {budget:.0f}ms  {'ok' if ok else 'OVER'}")
+    print(f"  requests imported at startup: {report['requests_imported_at_startup']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Category catalog and question counts from Open Trivia DB, cached.
+
+The category list comes from ``api_category.php`` and the number of
+questions per category and difficulty from ``api_count.php``. Both are kept
+in memory and in a small JSON file, and refreshed once they are older than
+the TTL. With the offline bank, the bank's ``LocalBankFetcher`` is the
+source instead and nothing is cached on disk.
+
+Reads never wait on the network. Stale or missing data is refreshed on a
+background thread, and until the first refresh lands the built-in table
+(``assets.category_mapping``) stands in with unknown counts. Known
+categories keep their built-in labels, so labels saved in a player's
+settings stay valid when the catalog changes.
+"""
+import json
+import os
+import threading
+import time
+
+from assets import category_mapping
+from question_pool import bucket_keys
+
+CATALOG_TTL = 24 * 60 * 60
+# After a failed refresh, wait this long before trying again
+RETRY_DELAY = 60
+
+
+class CategoryCatalog:
+    """Category labels and question counts, served from memory and refreshed in the background.
+
+    ``source`` has ``fetch_categories()`` and ``fetch_category_count(id)``
+    like the ``opentdb`` module, which is the default. ``path`` may be None
+    to keep the catalog in memory only.
+    """
+
+    def __init__(self, path, ttl=CATALOG_TTL, fallback=category_mapping, source=None):
+        self.path = path
+        self.ttl = ttl
+        self.source = source
+        self._fallback = dict(fallback)  # label -> id
+        self._labels = {category_id: label for label, category_id in fallback.items()}
+        self._categories = None  # {"fetched_at": t, "items": [[id, name], ...]}
+        self._counts = {}  # id -> {"fetched_at": t, "counts": {difficulty: n}}
+        self._mapping = dict(fallback)
+        self._refreshing = False
+        self._retry_at = 0.0
+        self._fresh_until = 0.0  # nothing to refresh before this (wall clock)
+        self._lock = threading.Lock()
+        self._load()
+
+    # --- Disk cache ---
+
+    def _load(self):
+        if self.path is None:
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._categories = data.get("categories")
+        self._counts = {int(k): v for k, v in data.get("counts", {}).items()}
+        self._mapping = self._build_mapping()
+        self._fresh_until = self._oldest() + self.ttl
+
+    def _save(self):
+        if self.path is None:
+            return
+        with self._lock:
+            data = {"categories": self._categories, "counts": self._counts}
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass  # The in-memory copy still works, the next process just refetches
+
+    # --- Refresh ---
+
+    def _stale(self, entry):
+        return entry is None or time.time() - entry["fetched_at"] > self.ttl
+
+    def _oldest(self):
+        """When the oldest cached entry was fetched, 0 if anything is missing."""
+        if self._categories is None:
+            return 0.0
+        entries = [self._counts.get(category_id) for category_id, _ in self._categories["items"]]
+        if any(entry is None for entry in entries):
+            return 0.0
+        return min([self._categories["fetched_at"]] + [entry["fetched_at"] for entry in entries])
+
+    def refresh(self):
+        """Starts a background refresh if anything is missing or stale. Never blocks."""
+        if time.time() < self._fresh_until:
+            return
+        with self._lock:
+            if self._refreshing or time.monotonic() < self._retry_at:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, daemon=True, name="catalog").start()
+
+    def _refresh(self):
+        try:
+            source = self.source
+            if source is None:
+                # Imported here so the network stack stays off the startup path
+                import opentdb as source
+
+            if self._stale(self._categories):
+                items = [[c["id"], c["name"]] for c in source.fetch_categories()]
+                with self._lock:
+                    self._categories = {"fetched_at": time.time(), "items": items}
+                    self._mapping = self._build_mapping()
+            for category_id, _ in self._categories["items"]:
+                if self._stale(self._counts.get(category_id)):
+                    counts = source.fetch_category_count(category_id)
+                    with self._lock:
+                        self._counts[category_id] = {"fetched_at": time.time(), "counts": counts}
+            self._fresh_until = self._oldest() + self.ttl
+            self._save()
+        except Exception:
+            # Keep serving what we have
+            self._retry_at = time.monotonic() + RETRY_DELAY
+        finally:
+            self._refreshing = False
+
+    # --- Reads ---
+
+    def _label(self, category_id, name):
+        if category_id in self._labels:
+            return self._labels[category_id]
+        # "Entertainment: Board Games" -> "Board Games"
+        return f"❔ {name.split(': ', 1)[-1]}"
+
+    def _build_mapping(self):
+        if not self._categories:
+            return dict(self._fallback)
+        return {self._label(category_id, name): category_id for category_id, name in self._categories["items"]}
+
+    def categories(self):
+        """Category label -> id, in display order."""
+        self.refresh()
+        return self._mapping
+
+    def category_id(self, label):
+        """The id for a label, also for labels no longer in the catalog."""
+        return self._mapping.get(label, self._fallback.get(label))
+
+    def count(self, category_id, difficulty=""):
+        """Questions for a category and difficulty ("" for all), None while unknown.
+
+        Counts cover both question types, so they are an upper bound for one type.
+        """
+        entry = self._counts.get(category_id)
+        if entry is None or category_id == "":
+            return None
+        return entry["counts"].get(difficulty)
+
+    def available(self, key):
+        """Upper bound on the questions behind a pool key (mixed keys too), None while unknown."""
+        total = 0
+        for category_id, difficulty, _ in bucket_keys(key):
+            count = self.count(category_id, difficulty)
+            if count is None:
+                return None
+            total += count
+        return total
+
+    def capacity(self, key):
+        """``TokenManager`` capacity hook: questions a token can get for a bucket key."""
+        category_id, difficulty, _ = key
+        return self.count(category_id, difficulty)
@@ -0,0 +1,341 @@
+"""Headless trivia game engine.
+
+``TriviaEngine`` holds the rules of one player's game: scoring by
+difficulty, streaks, moving through the round and the final results. It
+has no Streamlit dependency, so it can drive simulated games for load tests
+and bots, or sit behind a REST/websocket front end. The Streamlit app is a
+thin adapter over it.
+
+    engine = TriviaEngine(pool)
+    if engine.start(9, "easy", "multiple") == 0:
+        while not engine.finished:
+            engine.answer(engine.current()["options"][0])
+            engine.next()
+        print(engine.results())
+
+Rounds longer than a page, and endless marathon rounds (``round_size=None``),
+are streamed: the engine only holds the page being played and pulls the next
+one from a ``question_stream.QuestionStream`` that fetched it in the
+background.
+
+In timed mode (``question_time`` seconds per question) a correct answer also
+earns a speed bonus on top of its difficulty points; the caller measures how
+long the player took and passes it to ``answer``.
+"""
+import random
+import time
+
+from question_pool import question_key, setting_from_json
+from question_stream import PAGE_SIZE, QuestionStream
+from questions import ordered_options
+
+ROUND_SIZE = 10
+# Share of a question's points an instant correct answer earns on top in timed mode
+TIME_BONUS = 0.5
+
+
+def _lower(value):
+    """Lower-cases a setting that is either one value or a tuple of them (a mixed round)."""
+    if isinstance(value, (tuple, list)):
+        return tuple(v.lower() for v in value)
+    return value.lower()
+
+
+def time_bonus(points, elapsed, question_time):
+    """Speed bonus for a correct answer after ``elapsed`` seconds, down to 0 at ``question_time``."""
+    if question_time is None or elapsed is None or elapsed >= question_time:
+        return 0
+    return round(points * TIME_BONUS * (1 - max(0.0, elapsed) / question_time))
+
+
+class TriviaEngine:
+    """One player's game.
+
+    ``pool`` is anything with ``take(key, amount, seen)`` (see
+    ``question_pool.QuestionPool``); it is only needed when ``start`` is not
+    handed the questions or the round is longer than them. ``round_size``
+    None plays an endless marathon. ``seed`` makes the round seeds, and
+    therefore the option order, reproducible. ``question_time`` turns on
+    timed mode.
+    """
+
+    def __init__(self, pool=None, round_size=ROUND_SIZE, seed=None, question_time=None):
+        self.pool = pool
+        self.round_size = round_size
+        self.question_time = question_time  # seconds per question in timed mode, None for untimed
+        self._rng = random.Random(seed)
+        self.category = ""
+        self.difficulty = ""
+        self.question_type = ""
+        self.questions = []  # the page being played
+        self.offset = 0  # round index of questions[0]
+        self.round_end = round_size  # where this round stops, None while a marathon runs
+        self.loaded = False
+        self.seen_questions = set()
+        self.round_seed = 0
+        self.started_at = None  # wall clock, so it survives a snapshot
+        self.finished_at = None
+        self._stream = None
+        self._reset_round()
+
+    def _reset_round(self):
+        self.current_question = 0
+        self.score = 0
+        self.current_streak = 0
+        self.max_streak = 0
+        self.correct_answers = 0
+        self.answered = False
+        self.selected_option = None
+        self.correct_option = None
+        self.answer_time = None  # seconds the last answer took, if the caller measured it
+        self.answer_bonus = 0
+
+    # --- Transitions ---
+
+    def start(self, category, difficulty, question_type, questions=None):
+        """Starts a round and returns its Open Trivia DB response code (0 = ready).
+
+        ``category`` is an Open Trivia DB category id ("" for any).
+        ``category`` and ``difficulty`` may be tuples for a round mixed from
+        several buckets (see ``question_pool.bucket_keys``). Without
+        ``questions`` the first page is taken from the pool, starting over
+        with a cleared seen set if the player has seen everything (code 4).
+        """
+        self.category = category
+        self.difficulty = _lower(difficulty)
+        self.question_type = question_type.lower()
+        self._close_stream()
+        self.round_end = self.round_size
+        first_page = PAGE_SIZE if self.round_size is None else min(self.round_size, PAGE_SIZE)
+        if questions is None:
+            key = self._key()
+            response_code, questions = self.pool.take(key, first_page, self.seen_questions)
+            if response_code == 4:
+                self.seen_questions.clear()
+                response_code, questions = self.pool.take(key, first_page, self.seen_questions)
+            if response_code != 0:
+                self.reset()
+                return response_code
+        else:
+            # Hand-fed questions are all used (rooms hand in the whole round), never past the round's end
+            questions = list(questions) if self.round_end is None else questions[:self.round_end]
+            if not questions:
+                self.reset()
+                return 1
+            self.seen_questions.update(question_key(q) for q in questions)
+        self.questions = list(questions)
+        self.offset = 0
+        self.loaded = True
+        self.round_seed = self._rng.randrange(2**32)
+        self._reset_round()
+        self.started_at = time.time()
+        self.finished_at = None
+        self._open_stream()
+        return 0
+
+    def reset(self):
+        """Abandons the current round (back to the settings screen)."""
+        self._close_stream()
+        self.questions = []
+        self.offset = 0
+        self.loaded = False
+        self._reset_round()
+
+    def restart(self, questions=None):
+        """Starts a fresh round with the same settings."""
+        return self.start(self.category, self.difficulty, self.question_type, questions)
+
+    def finish(self):
+        """Ends the round early, e.g. when the player stops a marathon."""
+        self._close_stream()
+        if self.answered:
+            self.current_question += 1
+            self.answered = False
+            self.selected_option = None
+            self.correct_option = None
+            self.answer_time = None
+            self.answer_bonus = 0
+        self.round_end = self.current_question
+        self.finished_at = time.time()
+
+    def answer(self, option, elapsed=None):
+        """Answers the current question with the option text and returns the outcome.
+
+        ``elapsed`` is how many seconds the player took; in timed mode it earns
+        a correct answer its speed bonus.
+        """
+        if self.finished or self.answered:
+            raise RuntimeError("No question is waiting for an answer")
+        question = self.current_question_record()
+        if option not in question.options:
+            raise ValueError(f"Not an option for this question: {option!r}")
+        self.answered = True
+        self.selected_option = option
+        self.correct_option = question.correct_answer
+        correct = option == question.correct_answer
+        bonus = time_bonus(question.points, elapsed, self.question_time) if correct else 0
+        points = question.points + bonus if correct else 0
+        self.answer_time = elapsed
+        self.answer_bonus = bonus
+        if correct:
+            self.score += points
+            self.correct_answers += 1
+            self.current_streak += 1
+            self.max_streak = max(self.max_streak, self.current_streak)
+        else:
+            self.current_streak = 0
+        return {
+            "correct": correct,
+            "points": points,
+            "bonus": bonus,
+            "correct_answer": question.correct_answer,
+            "score": self.score,
+            "streak": self.current_streak,
+        }
+
+    def expire(self):
+        """The current question ran out of time unanswered: it counts as wrong."""
+        if self.finished or self.answered:
+            raise RuntimeError("No question is waiting for an answer")
+        question = self.current_question_record()
+        self.answered = True
+        self.selected_option = None
+        self.correct_option = question.correct_answer
+        self.current_streak = 0
+        self.answer_time = self.question_time
+        self.answer_bonus = 0
+        return {
+            "correct": False,
+            "points": 0,
+            "bonus": 0,
+            "correct_answer": question.correct_answer,
+            "score": self.score,
+            "streak": self.current_streak,
+        }
+
+    def next(self):
+        """Moves to the next question, returns False once the round is over."""
+        if not self.answered:
+            raise RuntimeError("Answer the current question first")
+        self.current_question += 1
+        self.answered = False
+        self.selected_option = None
+        self.correct_option = None
+        self.answer_time = None
+        self.answer_bonus = 0
+        in_round = self.round_end is None or self.current_question < self.round_end
+        if in_round and self.current_question - self.offset >= len(self.questions):
+            self._next_page()
+        if self.finished:
+            self.finished_at = time.time()
+        return not self.finished
+
+    # --- Streaming ---
+
+    def _key(self):
+        return (self.category, self.difficulty, self.question_type)
+
+    def _remaining(self):
+        """Questions of the round not yet in hand, None for a marathon."""
+        if self.round_end is None:
+            return None
+        return self.round_end - self.offset - len(self.questions)
+
+    def _open_stream(self):
+        if self.pool is not None and self._remaining() != 0:
+            self._stream = QuestionStream(self.pool, self._key(), self.seen_questions, self._remaining())
+
+    def _close_stream(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def _next_page(self):
+        self.offset += len(self.questions)
+        self.questions = []
+        if self._stream is None:
+            # Restored from a snapshot, the stream did not survive
+            self._open_stream()
+        page = self._stream.next_page() if self._stream is not None else []
+        if page:
+            self.questions = page
+        else:
+            # Nothing more to be had, end the round where it stands
+            self._close_stream()
+            self.round_end = self.current_question
+
+    # --- Views ---
+
+    @property
+    def finished(self):
+        if self.round_end is not None and self.current_question >= self.round_end:
+            return True
+        return self.current_question - self.offset >= len(self.questions)
+
+    @property
+    def total_questions(self):
+        """Questions in the round, None while a marathon runs."""
+        return self.round_end
+
+    def current_question_record(self):
+        """The ``Question`` being played, or None once the round is over."""
+        return None if self.finished else self.questions[self.current_question - self.offset]
+
+    def options(self):
+        """The current question's options in display order."""
+        return ordered_options(self.current_question_record(), self.round_seed, self.current_question)
+
+    def current(self):
+        """The current question as plain data, or None once the round is over."""
+        question = self.current_question_record()
+        if question is None:
+            return None
+        return {
+            "index": self.current_question,
+            "total": self.total_questions,
+            "question": question.question,
+            "category": question.category,
+            "difficulty": question.difficulty,
+            "type": question.type,
+            "options": list(self.options()),
+            "answered": self.answered,
+            "selected_option": self.selected_option,
+        }
+
+    def results(self):
+        """Round results as plain data."""
+        return {
+            "score": self.score,
+            "correct_answers": self.correct_answers,
+            "total_questions": self.total_questions,
+            "round_size": self.round_size,
+            "max_streak": self.max_streak,
+            "category": self.category,
+            "difficulty": self.difficulty,
+            "type": self.question_type,
+            "question_time": self.question_time,
+            "finished": self.finished,
+            "duration": self.finished_at - self.started_at if self.finished_at and self.started_at else None,
+        }
+
+    # --- Persistence (see state_store.py) ---
+
+    STATE_FIELDS = (
+        "category", "difficulty", "question_type", "round_size", "round_end", "questions", "offset", "loaded",
+        "seen_questions", "round_seed", "current_question", "score", "current_streak", "max_streak", "correct_answers",
+        "answered", "selected_option", "correct_option", "answer_time", "answer_bonus", "question_time",
+        "started_at", "finished_at",
+    )
+
+    def to_state(self):
+        return {name: getattr(self, name) for name in self.STATE_FIELDS}
+
+    @classmethod
+    def from_state(cls, state, pool=None, round_size=ROUND_SIZE):
+        engine = cls(pool, round_size)
+        for name in cls.STATE_FIELDS:
+            if name in state:
+                setattr(engine, name, state[name])
+        engine.category = setting_from_json(engine.category)
+        engine.difficulty = setting_from_json(engine.difficulty)
+        return engine
@@ -0,0 +1,98 @@
+"""Shared, thread-safe HTTP client used for every Open Trivia DB call.
+
+Connections are pooled and kept alive across calls, every request has a
+connect and read timeout, and the latency of each endpoint is recorded in a
+histogram so p50/p99 can be read off instead of guessed.
+
+By default this uses ``requests``. If ``httpx`` (with ``h2``) is installed,
+``HTTPClient(http2=True)`` or ``OPENTDB_HTTP2=1`` switches to an HTTP/2
+client instead.
+"""
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import LatencyHistogram
+
+try:
+    import httpx
+except ImportError:  # optional, only needed for HTTP/2
+    httpx = None
+
+CONNECT_TIMEOUT = float(os.environ.get("OPENTDB_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT = float(os.environ.get("OPENTDB_READ_TIMEOUT", 10))
+HTTP2 = os.environ.get("OPENTDB_HTTP2", "") == "1"
+
+
+class HTTPClient:
+    """Pooled keep-alive HTTP client that records per-endpoint latency.
+
+    With ``requests``, every thread gets its own ``Session`` but they all
+    mount the same adapter, so the underlying connection pool is shared.
+    """
+
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 pool_maxsize=16, http2=HTTP2, endpoints=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.endpoints = endpoints or {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+        if http2 and httpx is not None:
+            self._httpx = httpx.Client(
+                http2=True,
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                limits=httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize),
+            )
+        else:
+            self._httpx = None
+            self._adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+            self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", self._adapter)
+            session.mount("http://", self._adapter)
+            self._local.session = session
+        return session
+
+    def _endpoint(self, url):
+        parts = urlsplit(url)
+        base = f"{parts.scheme}://{parts.netloc}{parts.path}"
+        return self.endpoints.get(base, parts.path)
+
+    def _histogram(self, endpoint):
+        with self._lock:
+            if endpoint not in self.histograms:
+                self.histograms[endpoint] = LatencyHistogram()
+            return self.histograms[endpoint]
+
+    def get_json(self, url):
+        """GETs ``url`` and decodes the JSON body.
+
+        Raises ``requests.exceptions.RequestException`` on network errors
+        (also for the httpx backend) and ``ValueError`` on a bad body.
+        """
+        start = time.perf_counter()
+        try:
+            if self._httpx is not None:
+                try:
+                    response = self._httpx.get(url)
+                except httpx.HTTPError as e:
+                    raise requests.exceptions.ConnectionError(str(e)) from e
+            else:
+                response = self._session().get(url, timeout=self.timeout)
+            return response.json()
+        finally:
+            self._histogram(self._endpoint(url)).observe((time.perf_counter() - start) * 1000)
+
+    def latency_stats(self):
+        """Returns ``{endpoint: {count, mean_ms, p50_ms, p99_ms}}``."""
+        with self._lock:
+            histograms = dict(self.histograms)
+        return {name: h.summary() for name, h in histograms.items()}
@@ -0,0 +1,227 @@
+"""Persistent high-score leaderboard.
+
+Finished rounds are appended to a SQLite file (WAL mode). ``record`` only
+puts the result on a queue; a writer thread commits the queue in batches, so
+the results screen never waits on disk. Two indexes keep the reads cheap
+however many rows pile up: top-N per board walks ``idx_scores_board`` and a
+player's best walks ``idx_scores_player``, each reading only the rows it
+returns.
+
+A board is one set of settings: category, difficulty, question type, round
+length and timed or not. Scores only compare within a board, a 500 question
+round or a marathon would otherwise always beat a 10 question one.
+
+The settings screen reads through a small in-memory cache of top-N lists.
+A new result is merged into the cached list for its board instead of
+throwing the cache away, and a list loaded from the file gets the results
+that are still queued merged in; the TTL only matters for results written
+by other processes sharing the file. Players' bests are cached for the most
+recent ``max_players`` players only.
+"""
+import bisect
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from batch_writer import BatchWriter
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    id INTEGER PRIMARY KEY,
+    player_id TEXT NOT NULL,
+    player_name TEXT NOT NULL,
+    board TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    correct_answers INTEGER NOT NULL,
+    total_questions INTEGER NOT NULL,
+    max_streak INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    question_type TEXT NOT NULL,
+    duration REAL NOT NULL,
+    finished_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_scores_board ON scores (board, score DESC, finished_at);
+CREATE INDEX IF NOT EXISTS idx_scores_player ON scores (player_id, score DESC, finished_at);
+"""
+
+COLUMNS = (
+    "player_id", "player_name", "board", "score", "correct_answers", "total_questions", "max_streak",
+    "category", "difficulty", "question_type", "duration", "finished_at",
+)
+
+TOP_N = 10
+BATCH_SIZE = 100
+FLUSH_INTERVAL = 1.0  # seconds the writer waits for more results before committing
+CACHE_TTL = 60
+MAX_PLAYERS = 10000  # players whose best result is cached
+
+
+def _setting_text(value):
+    """One category/difficulty setting as text, mixed rounds joined with commas."""
+    if isinstance(value, (tuple, list)):
+        return ",".join(str(v) for v in value)
+    return str(value)
+
+
+def board_key(category, difficulty, question_type, round_size, timed=False):
+    """The leaderboard a round counts towards. ``round_size`` None is a marathon."""
+    length = "marathon" if round_size is None else round_size
+    key = f"{_setting_text(category)}|{_setting_text(difficulty)}|{question_type}|{length}"
+    # Timed rounds earn speed bonuses, so they get their own boards
+    return f"{key}|timed" if timed else key
+
+
+def _rank(entry):
+    # Higher score first, the earlier of two equal scores first
+    return (-entry["score"], entry["finished_at"])
+
+
+def _identity(entry):
+    return entry["player_id"], entry["finished_at"]
+
+
+class Leaderboard:
+    """Durable score table with batched background writes and cached top-N reads."""
+
+    def __init__(self, path, top_n=TOP_N, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, cache_ttl=CACHE_TTL,
+                 max_players=MAX_PLAYERS):
+        self.top_n = top_n
+        self.cache_ttl = cache_ttl
+        self.max_players = max_players
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()  # guards the connection
+        self._cache_lock = threading.Lock()
+        self._top = {}  # board -> (loaded_at, [entry, ...] best first)
+        self._best = OrderedDict()  # player_id -> (loaded_at, entry or None), least recently read first
+        self._unwritten = {}  # board -> results queued but not committed yet
+        self._loading = {}  # board -> lists collecting the results recorded while a top-N query runs
+        self._writer = BatchWriter(self._insert, "leaderboard", batch_size, flush_interval, errors=(sqlite3.Error,))
+
+    # --- Writes ---
+
+    def record(self, player_id, player_name, results):
+        """Queues a finished round (``TriviaEngine.results()``) and updates the cached views."""
+        entry = {
+            "player_id": player_id,
+            "player_name": player_name,
+            "board": board_key(results["category"], results["difficulty"], results["type"], results["round_size"],
+                               results["question_time"] is not None),
+            "score": results["score"],
+            "correct_answers": results["correct_answers"],
+            "total_questions": results["total_questions"] or 0,
+            "max_streak": results["max_streak"],
+            "category": _setting_text(results["category"]),
+            "difficulty": _setting_text(results["difficulty"]),
+            "question_type": results["type"],
+            "duration": results["duration"] or 0.0,
+            "finished_at": time.time(),
+        }
+        with self._cache_lock:
+            self._unwritten.setdefault(entry["board"], []).append(entry)
+            for recorded in self._loading.get(entry["board"], ()):
+                recorded.append(entry)
+            cached = self._top.get(entry["board"])
+            if cached is not None:
+                entries = cached[1]
+                bisect.insort(entries, entry, key=_rank)
+                del entries[self.top_n:]
+            best = self._best.get(player_id)
+            if best is not None and (best[1] is None or _rank(entry) < _rank(best[1])):
+                self._best[player_id] = (best[0], entry)
+        self._writer.put(entry)
+        return entry
+
+    def _insert(self, batch):
+        rows = [tuple(entry[name] for name in COLUMNS) for entry in batch]
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN")
+                try:
+                    self._conn.executemany(
+                        f"INSERT INTO scores ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", rows
+                    )
+                except sqlite3.Error:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                self._conn.execute("COMMIT")
+            finally:
+                # Still under the connection lock, so a top-N query sees each result in the file or here
+                with self._cache_lock:
+                    for entry in batch:
+                        unwritten = self._unwritten[entry["board"]]
+                        unwritten.remove(entry)
+                        if not unwritten:
+                            del self._unwritten[entry["board"]]
+
+    def flush(self):
+        """Blocks until every queued result is on disk."""
+        self._writer.flush()
+
+    # --- Reads ---
+
+    def _query(self, sql, params):
+        """Rows as dicts. Caller must hold ``self._lock``."""
+        cursor = self._conn.execute(sql, params)
+        names = [d[0] for d in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def top(self, category, difficulty, question_type, round_size, n=None, timed=False):
+        """The best ``n`` results (default ``top_n``) for a board, best first."""
+        n = n or self.top_n
+        board = board_key(category, difficulty, question_type, round_size, timed)
+        if n <= self.top_n:
+            with self._cache_lock:
+                cached = self._top.get(board)
+                if cached is not None and time.monotonic() - cached[0] < self.cache_ttl:
+                    return cached[1][:n]
+        # Results recorded while the query runs are collected here, they may miss both the query and the cache
+        recorded = []
+        with self._cache_lock:
+            self._loading.setdefault(board, []).append(recorded)
+        try:
+            with self._lock:
+                entries = self._query(
+                    f"SELECT {', '.join(COLUMNS)} FROM scores WHERE board = ? ORDER BY score DESC, finished_at LIMIT ?",
+                    (board, max(n, self.top_n)),
+                )
+                with self._cache_lock:
+                    unwritten = list(self._unwritten.get(board, ()))
+        finally:
+            with self._cache_lock:
+                loading = self._loading[board]
+                del loading[next(i for i, r in enumerate(loading) if r is recorded)]
+                if not loading:
+                    del self._loading[board]
+        with self._cache_lock:
+            known = {_identity(entry) for entry in entries}
+            for entry in unwritten + recorded:
+                if _identity(entry) not in known:
+                    known.add(_identity(entry))
+                    bisect.insort(entries, entry, key=_rank)
+            self._top[board] = (time.monotonic(), entries[:self.top_n])
+        return entries[:n]
+
+    def player_best(self, player_id):
+        """The player's best result on any board, or None."""
+        with self._cache_lock:
+            cached = self._best.get(player_id)
+            if cached is not None and time.monotonic() - cached[0] < self.cache_ttl:
+                self._best.move_to_end(player_id)
+                return cached[1]
+        with self._lock:
+            entries = self._query(
+                f"SELECT {', '.join(COLUMNS)} FROM scores WHERE player_id = ? ORDER BY score DESC, finished_at LIMIT 1",
+                (player_id,),
+            )
+        best = entries[0] if entries else None
+        with self._cache_lock:
+            self._best[player_id] = (time.monotonic(), best)
+            self._best.move_to_end(player_id)
+            while len(self._best) > self.max_players:
+                self._best.popitem(last=False)
+        return best
@@ -0,0 +1,273 @@
+"""Timing spans and counters for the game loop, exported for monitoring.
+
+Set ``TRIVIA_METRICS`` to turn this on:
+
+* ``prometheus``: serve Prometheus text format on ``TRIVIA_METRICS_PORT``
+  (default 9464) at ``/metrics``
+* ``json``: append a JSON snapshot to ``TRIVIA_METRICS_LOG`` (default
+  ``metrics.jsonl``) every ``TRIVIA_METRICS_INTERVAL`` seconds
+
+When it is off, ``timed`` hands back the undecorated function and ``inc``,
+``observe``, ``observe_answer`` and ``touch_session`` are no-ops, so
+instrumented code pays nothing.
+"""
+import json
+import os
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MODE = os.environ.get("TRIVIA_METRICS", "")
+ENABLED = MODE in ("prometheus", "json")
+PORT = int(os.environ.get("TRIVIA_METRICS_PORT", 9464))
+LOG_PATH = os.environ.get("TRIVIA_METRICS_LOG", "metrics.jsonl")
+LOG_INTERVAL = float(os.environ.get("TRIVIA_METRICS_INTERVAL", 60))
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf"))
+# Finer buckets for in-process spans, most of which take well under a millisecond
+SPAN_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5) + LATENCY_BUCKETS_MS
+# Coarser buckets for how long players take to answer
+THINK_BUCKETS_MS = (500, 1000, 2000, 3000, 5000, 7500, 10000, 15000, 20000, 30000, 60000, float("inf"))
+
+# A session counts as active if it ran a script in this window
+ACTIVE_SESSION_WINDOW = 5 * 60
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram, cheap enough to record every call."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms):
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if ms <= bound:
+                    self.counts[i] += 1
+                    break
+            self.count += 1
+            self.total_ms += ms
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile (0-100), None if empty."""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = p / 100 * self.count
+            seen = 0
+            for bound, n in zip(self.buckets, self.counts):
+                seen += n
+                if seen >= rank:
+                    return bound
+            return self.buckets[-1]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else None,
+            "p50_ms": self.percentile(50),
+            "p99_ms": self.percentile(99),
+        }
+
+
+_lock = threading.Lock()
+_spans = {}  # span name -> LatencyHistogram
+_counters = Counter()  # (name, sorted label items) -> value
+_sessions = {}  # session id -> last seen (monotonic)
+_gauges = {}  # name -> callable returning a number
+_counter_sources = {}  # name -> callable returning a running total kept elsewhere
+_histogram_sources = []  # (metric name, label name, callable returning {label value: LatencyHistogram})
+# Per-question latency by difficulty: "think" is the player's time from the question being
+# rendered to their answer arriving, "render" the server's from a click to the next question
+_answers = {"think": {}, "render": {}}
+
+
+def _span_histogram(name):
+    with _lock:
+        if name not in _spans:
+            _spans[name] = LatencyHistogram(SPAN_BUCKETS_MS)
+        return _spans[name]
+
+
+def _observe(name, ms):
+    """Records one ``ms`` long run of span ``name``."""
+    _span_histogram(name).observe(ms)
+
+
+def _inc(name, n=1, **labels):
+    """Adds ``n`` to counter ``name`` with the given labels."""
+    with _lock:
+        _counters[name, tuple(sorted(labels.items()))] += n
+
+
+def _observe_answer(kind, difficulty, ms):
+    """Records one question's ``think`` or ``render`` latency."""
+    histograms = _answers[kind]
+    if difficulty not in histograms:
+        with _lock:
+            histograms.setdefault(difficulty, LatencyHistogram(THINK_BUCKETS_MS if kind == "think" else SPAN_BUCKETS_MS))
+    histograms[difficulty].observe(ms)
+
+
+def _touch_session(session_id):
+    """Marks a session as active now."""
+    with _lock:
+        _sessions[session_id] = time.monotonic()
+
+
+def _noop(*args, **kwargs):
+    pass
+
+
+observe = _observe if ENABLED else _noop
+inc = _inc if ENABLED else _noop
+observe_answer = _observe_answer if ENABLED else _noop
+touch_session = _touch_session if ENABLED else _noop
+
+
+def timed(name):
+    """Decorator recording every call of the function as span ``name``."""
+    def decorate(func):
+        if not ENABLED:
+            return func
+        histogram = _span_histogram(name)
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe((time.perf_counter() - start) * 1000)
+
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        wrapper.__wrapped__ = func
+        return wrapper
+    return decorate
+
+
+def gauge(name, func):
+    """Registers a gauge whose value is read from ``func()`` at export time."""
+    _gauges[name] = func
+
+
+def counter(name, func):
+    """Registers a counter kept elsewhere, read from ``func()`` at export time. It must only go up."""
+    _counter_sources[name] = func
+
+
+def add_histograms(name, label, func):
+    """Exports histograms kept elsewhere, ``func()`` returns ``{label value: LatencyHistogram}``."""
+    _histogram_sources.append((name, label, func))
+
+
+def active_sessions():
+    cutoff = time.monotonic() - ACTIVE_SESSION_WINDOW
+    with _lock:
+        for session_id in [s for s, seen in _sessions.items() if seen < cutoff]:
+            del _sessions[session_id]
+        return len(_sessions)
+
+
+gauge("trivia_active_sessions", active_sessions)
+add_histograms("trivia_answer_think_ms", "difficulty", lambda: dict(_answers["think"]))
+add_histograms("trivia_question_render_ms", "difficulty", lambda: dict(_answers["render"]))
+
+
+# --- Export ---
+
+def _histograms():
+    yield "trivia_span_duration_ms", "span", dict(_spans)
+    for name, label, func in _histogram_sources:
+        yield name, label, func()
+
+
+def snapshot():
+    """All metrics as plain data, for the JSON log sink."""
+    with _lock:
+        counters = [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in _counters.items()]
+    counters += [{"name": name, "labels": {}, "value": func()} for name, func in _counter_sources.items()]
+    return {
+        "time": time.time(),
+        "counters": counters,
+        "gauges": {name: func() for name, func in _gauges.items()},
+        "histograms": {
+            name: {value: histogram.summary() for value, histogram in histograms.items()}
+            for name, label, histograms in _histograms()
+        },
+    }
+
+
+def _labels(items):
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}" if items else ""
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+    typed = set()
+    for (name, labels), value in counters:
+        if name not in typed:
+            lines.append(f"# TYPE {name} counter")
+            typed.add(name)
+        lines.append(f"{name}{_labels(labels)} {value}")
+    for name, func in _counter_sources.items():
+        lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name} {func()}")
+    for name, func in _gauges.items():
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {func()}")
+    for name, label, histograms in _histograms():
+        lines.append(f"# TYPE {name} histogram")
+        for value, histogram in sorted(histograms.items()):
+            with histogram._lock:
+                counts, count, total = list(histogram.counts), histogram.count, histogram.total_ms
+            cumulative = 0
+            for bound, n in zip(histogram.buckets, counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else bound
+                lines.append(f"{name}_bucket{_labels([(label, value), ('le', le)])} {cumulative}")
+            lines.append(f"{name}_sum{_labels([(label, value)])} {total}")
+            lines.append(f"{name}_count{_labels([(label, value)])} {count}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _write_log():
+    while True:
+        time.sleep(LOG_INTERVAL)
+        with open(LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(snapshot()) + "\n")
+
+
+def start_exporter():
+    """Starts the configured exporter thread. Call once per process."""
+    if MODE == "prometheus":
+        server = ThreadingHTTPServer(("0.0.0.0", PORT), _MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    elif MODE == "json":
+        threading.Thread(target=_write_log, daemon=True, name="metrics").start()
@@ -0,0 +1,361 @@
+"""Open Trivia DB API helpers.
+
+Nothing in here touches Streamlit, so these functions are safe to call from
+background threads (e.g. the shared question pool refilling its buckets).
+Every outbound call goes through the process-wide ``scheduler``, which
+sends it with the pooled ``client``.
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+
+import metrics
+import replay_log
+from http_client import HTTPClient
+
+# Point these at a mirror or the benchmark's fake server (bench/fake_opentdb.py) if needed
+BASE_URL = os.environ.get("OPENTDB_BASE_URL", "https://opentdb.com").rstrip("/")
+RATE_LIMIT = float(os.environ.get("OPENTDB_RATE_LIMIT", 0.2))  # question calls per second
+
+TOKEN_URL = f"{BASE_URL}/api_token.php"
+QUESTIONS_URL = f"{BASE_URL}/api.php"
+CATEGORY_URL = f"{BASE_URL}/api_category.php"
+COUNT_URL = f"{BASE_URL}/api_count.php"
+
+# Shared HTTP client, latency is recorded under these endpoint names
+client = HTTPClient(endpoints={TOKEN_URL: "token", QUESTIONS_URL: "questions", CATEGORY_URL: "category", COUNT_URL: "count"})
+
+
+class TokenBucket:
+    """Thread-safe token bucket; ``acquire`` reserves a slot and sleeps until it is due."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Takes one token, returns how many seconds the caller had to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class RequestScheduler:
+    """Owns every outbound Open Trivia DB call.
+
+    Calls run on a small worker pool so script threads can wait with a
+    timeout instead of sleeping. Question requests share one token bucket
+    (opentdb allows roughly one call per 5 seconds per IP), identical
+    in-flight requests are coalesced into one, and rate-limited (code 5) or
+    failed calls are retried a bounded number of times with jittered
+    exponential backoff.
+    """
+
+    def __init__(self, client, rate=0.2, capacity=1, max_retries=3, backoff=1.0, max_backoff=10.0, max_workers=8):
+        self.client = client
+        self.limiter = TokenBucket(rate, capacity)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="opentdb")
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._counters = {"queued": 0, "coalesced": 0, "throttled": 0, "retried": 0, "failed": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        """Returns a snapshot of the call counters plus the number of calls in flight."""
+        with self._lock:
+            return dict(self._counters, in_flight=len(self._inflight))
+
+    def submit(self, url, limited=True, coalesce=True):
+        """Queues a GET of ``url`` and returns a Future of the decoded JSON body.
+
+        ``limited`` calls take a slot from the shared token bucket first.
+        ``coalesce`` lets callers asking for the same url share one request;
+        turn it off for calls that must not share a result (new tokens).
+        """
+        with self._lock:
+            if coalesce and url in self._inflight:
+                self._counters["coalesced"] += 1
+                return self._inflight[url]
+            future = Future()
+            if coalesce:
+                self._inflight[url] = future
+            self._counters["queued"] += 1
+        self._executor.submit(self._run, url, limited, coalesce, future)
+        return future
+
+    def get(self, url, limited=True, coalesce=True, timeout=None):
+        """Blocking version of ``submit``. Only call this off the script thread."""
+        return self.submit(url, limited, coalesce).result(timeout)
+
+    def _sleep_backoff(self, attempt):
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        time.sleep(random.uniform(delay / 2, delay))
+
+    def _run(self, url, limited, coalesce, future):
+        try:
+            for attempt in range(self.max_retries + 1):
+                wait = self.limiter.acquire() if limited else 0.0
+                if wait:
+                    self._count("throttled")
+                start = time.perf_counter()
+                try:
+                    data = self.client.get_json(url)
+                    if "response_code" in data:
+                        # The category list and counts have no response code
+                        metrics.inc("opentdb_responses_total", code=data["response_code"])
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    _log_call(url, attempt, wait, start, error=type(e).__name__)
+                    if attempt == self.max_retries:
+                        raise
+                else:
+                    _log_call(url, attempt, wait, start, code=data.get("response_code"))
+                    if data.get("response_code") != 5 or attempt == self.max_retries:
+                        future.set_result(data)
+                        return
+                self._count("retried")
+                self._sleep_backoff(attempt)
+        except Exception as e:
+            self._count("failed")
+            future.set_exception(e)
+        finally:
+            if coalesce:
+                with self._lock:
+                    self._inflight.pop(url, None)
+
+
+def _log_call(url, attempt, wait, start, **values):
+    """Puts an outbound call on the replay log, without the session token."""
+    parts = urlsplit(url)
+    query = "&".join(p for p in parts.query.split("&") if not p.startswith("token="))
+    replay_log.event("", "api", url=f"{parts.path}?{query}" if query else parts.path, attempt=attempt,
+                     wait_ms=round(wait * 1000, 1), ms=replay_log.elapsed_ms(start), **values)
+
+
+# Process-wide scheduler shared by every session
+scheduler = RequestScheduler(client, rate=RATE_LIMIT)
+
+metrics.add_histograms("opentdb_request_duration_ms", "endpoint", lambda: dict(client.histograms))
+for _name in ("queued", "coalesced", "throttled", "retried", "failed"):
+    metrics.counter(f"opentdb_scheduler_{_name}_total", lambda name=_name: scheduler.stats()[name])
+metrics.gauge("opentdb_scheduler_in_flight", lambda: scheduler.stats()["in_flight"])
+
+
+# Function to request a new session token
+@metrics.timed("request_token")
+def request_token():
+    data = scheduler.get(f"{TOKEN_URL}?command=request", limited=False, coalesce=False)
+    if data["response_code"] != 0:
+        raise RuntimeError(f"Error getting token: {data['response_code']}")
+    return data["token"]
+
+
+# Function to reset a session token once it has returned every question
+@metrics.timed("reset_token")
+def reset_token(token):
+    metrics.inc("opentdb_token_resets_total")
+    data = scheduler.get(f"{TOKEN_URL}?command=reset&token={token}", limited=False)
+    if data["response_code"] != 0:
+        raise RuntimeError(f"Error resetting token: {data['response_code']}")
+    return data["token"]
+
+
+# Function to fetch the category list, returns [{"id": ..., "name": ...}, ...]
+def fetch_categories():
+    return scheduler.get(CATEGORY_URL, limited=False)["trivia_categories"]
+
+
+# Function to fetch how many questions a category has, by difficulty ("" is all of them)
+def fetch_category_count(category_id):
+    counts = scheduler.get(f"{COUNT_URL}?category={category_id}", limited=False)["category_question_count"]
+    return {
+        "": counts["total_question_count"],
+        "easy": counts["total_easy_question_count"],
+        "medium": counts["total_medium_question_count"],
+        "hard": counts["total_hard_question_count"],
+    }
+
+
+# Function to fetch one batch of questions, returns the raw API payload
+def fetch_batch(category_id, difficulty, question_type, amount, token=None):
+    url = f"{QUESTIONS_URL}?amount={amount}&category={category_id}&difficulty={difficulty}&type={question_type}"
+    if token:
+        url += f"&token={token}"
+    return scheduler.get(url)
+
+
+class _Lease:
+    def __init__(self, token):
+        self.token = token
+        self.last_used = time.monotonic()
+        self.served = 0
+
+
+class TokenManager:
+    """Keeps a small pool of pre-warmed session tokens.
+
+    Tokens are leased per key (a question pool bucket), so usage is tracked
+    per query the way opentdb counts it. Leasing from the warm pool is
+    instant; the token round trip only happens in the background, or on a
+    cold start before the pool has warmed up.
+
+    * ``exhausted(key)`` swaps in a warm token right away and resets the
+      used one in the background, then returns it to the pool.
+    * With ``capacity(key)`` (questions available for a key, or None) a
+      token is rotated before it runs dry instead of after a code 4.
+    * Leases idle for ``lease_idle`` seconds are reclaimed into the pool,
+      and tokens idle close to opentdb's 6 hour limit are dropped.
+    """
+
+    # opentdb deletes tokens after 6 hours of inactivity, keep a margin
+    TOKEN_IDLE_LIMIT = 6 * 60 * 60 - 10 * 60
+
+    def __init__(self, size=3, lease_idle=30 * 60, capacity=None):
+        self.size = size
+        self.lease_idle = lease_idle
+        self.capacity = capacity
+        self._idle = []  # (token, last used), oldest first
+        self._leases = {}  # key -> _Lease
+        self._pending = 0  # token requests/resets in flight
+        self._lock = threading.Lock()
+        # Runs request_token/reset_token (and their spans) off the caller's thread
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tokens")
+
+    def stats(self):
+        with self._lock:
+            return {"idle": len(self._idle), "leased": len(self._leases), "pending": self._pending}
+
+    def _expire(self, now):
+        """Drops dead idle tokens and reclaims stale leases. Caller must hold the lock."""
+        self._idle = [(t, used) for t, used in self._idle if now - used < self.TOKEN_IDLE_LIMIT]
+        for key in [k for k, lease in self._leases.items() if now - lease.last_used > self.lease_idle]:
+            lease = self._leases.pop(key)
+            if now - lease.last_used < self.TOKEN_IDLE_LIMIT:
+                self._idle.append((lease.token, lease.last_used))
+                self._idle.sort(key=lambda item: item[1])
+
+    def warm(self):
+        """Requests tokens in the background until the pool holds ``size``."""
+        with self._lock:
+            self._expire(time.monotonic())
+            missing = self.size - len(self._idle) - self._pending
+            self._pending += max(missing, 0)
+        for _ in range(missing):
+            self._executor.submit(request_token).add_done_callback(self._warmed)
+
+    def _warmed(self, future):
+        with self._lock:
+            self._pending -= 1
+            try:
+                token = future.result()
+            except Exception:
+                return
+            self._idle.append((token, time.monotonic()))
+
+    def acquire(self, key):
+        """Returns the token leased to ``key``, leasing one from the pool if needed."""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            lease = self._leases.get(key)
+            if lease is None and self._idle:
+                # Oldest first, so no idle token drifts towards TOKEN_IDLE_LIMIT while newer ones are used
+                lease = self._leases[key] = _Lease(self._idle.pop(0)[0])
+            if lease is not None:
+                lease.last_used = now
+                token = lease.token
+            else:
+                token = None
+        if token is None:
+            # Cold start, nothing warm yet
+            token = request_token()
+            with self._lock:
+                self._leases.setdefault(key, _Lease(token))
+                token = self._leases[key].token
+        self.warm()
+        return token
+
+    def record(self, key, amount, next_amount=0):
+        """Counts ``amount`` questions served to the lease of ``key``.
+
+        Rotates the token early if the next batch would run past ``capacity``.
+        """
+        with self._lock:
+            lease = self._leases.get(key)
+            if lease is None:
+                return
+            lease.served += amount
+            limit = self.capacity(key) if self.capacity else None
+            rotate = limit is not None and lease.served + next_amount > limit
+        if rotate:
+            self.exhausted(key)
+
+    def exhausted(self, key):
+        """The lease of ``key`` has seen everything: reset it in the background, lease a fresh one."""
+        with self._lock:
+            lease = self._leases.pop(key, None)
+            if lease is None:
+                return
+            self._pending += 1
+        self._executor.submit(reset_token, lease.token).add_done_callback(self._warmed)
+
+    def discard(self, key):
+        """The lease of ``key`` is not a valid token anymore (code 3)."""
+        with self._lock:
+            self._leases.pop(key, None)
+
+
+# Process-wide token pool, used by OpenTDBFetcher
+tokens = TokenManager()
+for _name in ("idle", "leased", "pending"):
+    metrics.gauge(f"opentdb_tokens_{_name}", lambda name=_name: tokens.stats()[name])
+
+
+class OpenTDBFetcher:
+    """Fetches question batches for the shared pool.
+
+    Called as ``fetcher(key, amount)`` where key is
+    ``(category_id, difficulty, question_type)``; returns
+    ``(response_code, results)``. Each key gets its own token from the
+    token manager. Token not found (3) and token empty (4) are handled here
+    so the pool only ever sees them when a retry failed.
+    """
+
+    def __init__(self, token_manager=None):
+        self.tokens = token_manager or tokens
+        self.tokens.warm()
+
+    def __call__(self, key, amount):
+        category_id, difficulty, question_type = key
+        data = {"response_code": 3, "results": []}
+        for _ in range(2):
+            token = self.tokens.acquire(key)
+            data = fetch_batch(category_id, difficulty, question_type, amount, token)
+            if data["response_code"] == 3:
+                self.tokens.discard(key)
+            elif data["response_code"] == 4:
+                self.tokens.exhausted(key)
+            else:
+                if data["response_code"] == 0:
+                    self.tokens.record(key, len(data["results"]), amount)
+                break
+        return data["response_code"], data.get("results", [])
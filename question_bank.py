@@ -0,0 +1,243 @@
+"""Offline question bank stored in SQLite.
+
+The bank holds questions in the raw Open Trivia DB format, indexed by
+``(category_id, difficulty, type)``. ``LocalBankFetcher`` serves batches
+from it with the same response codes as the remote API, so it can stand in
+for ``opentdb.OpenTDBFetcher`` in the shared question pool. It also serves
+the category catalog, so the game runs with no network at all.
+
+Build a bank from a JSON dump or straight from opentdb.com::
+
+    python question_bank.py import dump.json --bank questions.db
+    python question_bank.py download --bank questions.db
+"""
+import argparse
+import html
+import json
+import random
+import sqlite3
+import threading
+
+# Open Trivia DB category names, used when a dump has no category ids
+OPENTDB_CATEGORIES = {
+    "General Knowledge": 9,
+    "Entertainment: Books": 10,
+    "Entertainment: Film": 11,
+    "Entertainment: Music": 12,
+    "Entertainment: Musicals & Theatres": 13,
+    "Entertainment: Television": 14,
+    "Entertainment: Video Games": 15,
+    "Entertainment: Board Games": 16,
+    "Science & Nature": 17,
+    "Science: Computers": 18,
+    "Science: Mathematics": 19,
+    "Mythology": 20,
+    "Sports": 21,
+    "Geography": 22,
+    "History": 23,
+    "Politics": 24,
+    "Art": 25,
+    "Celebrities": 26,
+    "Animals": 27,
+    "Vehicles": 28,
+    "Entertainment: Comics": 29,
+    "Science: Gadgets": 30,
+    "Entertainment: Japanese Anime & Manga": 31,
+    "Entertainment: Cartoon & Animations": 32,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY,
+    category_id INTEGER NOT NULL,
+    difficulty TEXT NOT NULL,
+    type TEXT NOT NULL,
+    category TEXT NOT NULL,
+    question TEXT NOT NULL,
+    correct_answer TEXT NOT NULL,
+    incorrect_answers TEXT NOT NULL,
+    UNIQUE (question, correct_answer)
+);
+CREATE INDEX IF NOT EXISTS idx_questions_bucket ON questions (category_id, difficulty, type);
+"""
+
+# Map up to 256 MB of the bank into memory for reads
+MMAP_SIZE = 256 * 1024 * 1024
+
+
+def open_bank(path, readonly=False):
+    if readonly:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.executescript(SCHEMA)
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    return conn
+
+
+def insert_questions(conn, questions):
+    """Adds raw API question dicts to the bank, skipping ones already there.
+
+    Returns the number of new rows.
+    """
+    rows = []
+    for q in questions:
+        category_id = q.get("category_id") or OPENTDB_CATEGORIES.get(html.unescape(q["category"]))
+        if category_id is None:
+            continue
+        rows.append((
+            category_id, q["difficulty"], q["type"], q["category"], q["question"],
+            q["correct_answer"], json.dumps(q["incorrect_answers"]),
+        ))
+    before = conn.total_changes
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO questions (category_id, difficulty, type, category, question,"
+            " correct_answer, incorrect_answers) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+    return conn.total_changes - before
+
+
+def import_dump(conn, path):
+    """Ingests a JSON dump: a list of questions, an API payload, or a list of payloads."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = [data]
+    questions = []
+    for item in data:
+        questions.extend(item["results"] if "results" in item else [item])
+    return insert_questions(conn, questions)
+
+
+def download(conn, category_ids, batch_size=50):
+    """Pulls every question for the given categories from opentdb.com.
+
+    Uses one token per category and keeps asking until the token is empty.
+    Goes through the rate-limited scheduler, so expect ~5s per batch.
+    """
+    # Imported here so building from a dump never needs the network stack
+    from opentdb import fetch_batch, request_token
+
+    added = 0
+    for category_id in category_ids:
+        token = request_token()
+        amount = batch_size
+        while amount:
+            data = fetch_batch(category_id, "", "", amount, token)
+            if data["response_code"] == 0:
+                added += insert_questions(conn, [dict(q, category_id=category_id) for q in data["results"]])
+            elif data["response_code"] in (1, 4):
+                # Fewer than `amount` left for this token, ask for less
+                amount //= 2
+            else:
+                break
+    return added
+
+
+class LocalBankFetcher:
+    """Question pool fetcher that samples from the offline bank.
+
+    Behaves like ``opentdb.OpenTDBFetcher``: returns code 1 when the bank
+    doesn't hold ``amount`` questions for the key, and keeps a per-key
+    "served" set the way a remote token does, resetting it once every
+    question has been handed out.
+    """
+
+    def __init__(self, path):
+        self.conn = open_bank(path, readonly=True)
+        self._ids = {}  # key -> tuple of row ids, loaded on first use
+        self._served = {}  # key -> row ids handed out since the last reset
+        self._lock = threading.Lock()
+
+    def _bucket_ids(self, key):
+        if key not in self._ids:
+            category_id, difficulty, question_type = key
+            where, params = [], []
+            for column, value in (("category_id", category_id), ("difficulty", difficulty), ("type", question_type)):
+                if value not in ("", None):
+                    where.append(f"{column} = ?")
+                    params.append(value)
+            sql = "SELECT id FROM questions" + (" WHERE " + " AND ".join(where) if where else "")
+            self._ids[key] = tuple(row[0] for row in self.conn.execute(sql, params))
+        return self._ids[key]
+
+    def __call__(self, key, amount):
+        with self._lock:
+            ids = self._bucket_ids(key)
+            if len(ids) < amount:
+                return 1, []
+            served = self._served.setdefault(key, set())
+            fresh = [i for i in ids if i not in served]
+            if len(fresh) < amount:
+                # Token empty, reset it like OpenTDBFetcher does
+                served.clear()
+                fresh = ids
+            picked = random.sample(fresh, amount)
+            served.update(picked)
+            rows = self.conn.execute(
+                "SELECT category, type, difficulty, question, correct_answer, incorrect_answers"
+                f" FROM questions WHERE id IN ({','.join('?' * len(picked))})",
+                picked,
+            ).fetchall()
+        return 0, [
+            {
+                "category": category,
+                "type": question_type,
+                "difficulty": difficulty,
+                "question": question,
+                "correct_answer": correct_answer,
+                "incorrect_answers": json.loads(incorrect_answers),
+            }
+            for category, question_type, difficulty, question, correct_answer, incorrect_answers in rows
+        ]
+
+    # --- Catalog source, see catalog.CategoryCatalog ---
+
+    def fetch_categories(self):
+        """The bank's categories, in the shape of ``opentdb.fetch_categories``."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT category_id, MIN(category) FROM questions GROUP BY category_id ORDER BY category_id"
+            ).fetchall()
+        return [{"id": category_id, "name": html.unescape(name)} for category_id, name in rows]
+
+    def fetch_category_count(self, category_id):
+        """The bank's questions per difficulty, in the shape of ``opentdb.fetch_category_count``."""
+        with self._lock:
+            counts = dict(self.conn.execute(
+                "SELECT difficulty, COUNT(*) FROM questions WHERE category_id = ? GROUP BY difficulty",
+                (category_id,),
+            ).fetchall())
+        return {
+            "": sum(counts.values()),
+            "easy": counts.get("easy", 0),
+            "medium": counts.get("medium", 0),
+            "hard": counts.get("hard", 0),
+        }
+
+
+def main():
+    bank = argparse.ArgumentParser(add_help=False)
+    bank.add_argument("--bank", default="questions.db", help="SQLite bank file (default: questions.db)")
+    parser = argparse.ArgumentParser(description="Build the offline trivia question bank.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_cmd = commands.add_parser("import", parents=[bank], help="ingest a local JSON dump")
+    import_cmd.add_argument("dump")
+    download_cmd = commands.add_parser("download", parents=[bank], help="download questions from opentdb.com")
+    download_cmd.add_argument("--category", type=int, action="append",
+                              help="category id to download (repeatable, default: all)")
+    args = parser.parse_args()
+
+    conn = open_bank(args.bank)
+    if args.command == "import":
+        added = import_dump(conn, args.dump)
+    else:
+        added = download(conn, args.category or sorted(OPENTDB_CATEGORIES.values()))
+    total = conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+    print(f"Added {added} questions, the bank now holds {total}.")
+
+
+if __name__ == "__main__":
+    main()
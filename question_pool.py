@@ -0,0 +1,209 @@
+"""Process-wide pool of trivia questions shared by every Streamlit session.
+
+Questions are grouped in buckets keyed by ``(category_id, difficulty, type)``.
+Each bucket is filled from upstream in large batches and rounds are served
+from memory. Sessions pass in their own "seen" set so a player never gets the
+same question twice, without depending on a per-session remote token.
+Raw API results are normalized into ``questions.Question`` records as they
+are added, so sessions only ever see records.
+
+A key whose category and/or difficulty is a tuple asks for a mixed round:
+it is served from every combination's bucket, fetched concurrently, and the
+results are interleaved.
+"""
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, zip_longest
+
+from questions import normalize_question
+
+
+def question_key(question):
+    """Stable identity for a question, used in the per-session seen sets."""
+    return question.question
+
+
+def setting_from_json(value):
+    """A category or difficulty setting read back from JSON: mixed settings come back as lists, keys need tuples."""
+    return tuple(value) if isinstance(value, list) else value
+
+
+def bucket_keys(key):
+    """The bucket keys behind a round key, more than one for a mixed round."""
+    category, difficulty, question_type = key
+    categories = category if isinstance(category, tuple) else (category,)
+    difficulties = difficulty if isinstance(difficulty, tuple) else (difficulty,)
+    return [(c, d, question_type) for c in categories for d in difficulties]
+
+
+class _Bucket:
+    def __init__(self):
+        self.questions = OrderedDict()  # question_key -> question, oldest first
+        self.loaded_at = time.monotonic()
+        self.lock = threading.Lock()  # held while filling so sessions share one fetch
+        self.refilling = False
+
+    def unseen(self, seen):
+        return [q for k, q in self.questions.items() if k not in seen]
+
+
+class QuestionPool:
+    """TTL + LRU cache of question buckets with background refill.
+
+    ``fetcher(key, amount)`` must return ``(response_code, results)`` using the
+    Open Trivia DB response codes. It is called on refill threads, so it must
+    not touch Streamlit.
+    """
+
+    def __init__(self, fetcher, batch_size=50, max_bucket_size=200, low_water=20,
+                 ttl=6 * 60 * 60, max_buckets=64):
+        self.fetcher = fetcher
+        self.batch_size = batch_size
+        self.max_bucket_size = max_bucket_size
+        self.low_water = low_water
+        self.ttl = ttl
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        # Fans a mixed round out over its buckets; the fetcher does its own rate limiting
+        self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="pool")
+
+    def _bucket(self, key):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None or time.monotonic() - bucket.loaded_at > self.ttl:
+                bucket = _Bucket()
+                self._buckets[key] = bucket
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+            return bucket
+
+    def _fill(self, bucket, key, amount):
+        """Fetches one batch into the bucket. Caller must hold ``bucket.lock``."""
+        response_code, results = self.fetcher(key, max(self.batch_size, amount))
+        if response_code == 1 and self.batch_size > amount:
+            # Not enough questions for a full batch, ask for just what's needed
+            response_code, results = self.fetcher(key, amount)
+        if response_code == 0:
+            for raw in results:
+                question = normalize_question(raw)
+                bucket.questions[question_key(question)] = question
+            while len(bucket.questions) > self.max_bucket_size:
+                bucket.questions.popitem(last=False)
+        return response_code
+
+    def _refill_in_background(self, bucket, key):
+        if bucket.refilling:
+            return
+        bucket.refilling = True
+
+        def refill():
+            try:
+                with bucket.lock:
+                    self._fill(bucket, key, self.batch_size)
+            except Exception:
+                pass  # The next take() will fetch synchronously if still short
+            finally:
+                bucket.refilling = False
+
+        threading.Thread(target=refill, daemon=True).start()
+
+    def take(self, key, amount, seen):
+        """Returns ``(response_code, questions)`` with ``amount`` unseen questions.
+
+        Keys of the returned questions are added to ``seen``. A response code
+        of 4 means this session has seen every question available for the key.
+        """
+        keys = bucket_keys(key)
+        if len(keys) == 1:
+            return self._take_bucket(keys[0], amount, seen)
+        return self._take_mixed(keys, amount, seen)
+
+    def _take_mixed(self, keys, amount, seen):
+        # Spread the round over the buckets, a random few get one extra
+        keys = random.sample(keys, len(keys))
+        shares = [amount // len(keys) + (i < amount % len(keys)) for i in range(len(keys))]
+        futures = [(k, self._executor.submit(self._take_bucket, k, n, seen)) for k, n in zip(keys, shares) if n]
+        picked, codes = {}, []
+        for k, future in futures:
+            response_code, questions = future.result()
+            if response_code == 0:
+                picked[k] = questions
+            else:
+                codes.append(response_code)
+        # Buckets that came up short are made up from the ones that delivered
+        short = amount - sum(len(questions) for questions in picked.values())
+        for k in list(picked):
+            if short <= 0:
+                break
+            response_code, questions = self._take_bucket(k, short, seen)
+            if response_code == 0:
+                picked[k] = picked[k] + questions
+                short = 0
+        if short > 0:
+            # Not a full round: hand nothing out, and forget we showed it
+            seen.difference_update(question_key(q) for q in chain.from_iterable(picked.values()))
+            return next((c for c in codes if c != 4), 4), []
+        mixed = [q for q in chain.from_iterable(zip_longest(*picked.values())) if q is not None]
+        return 0, mixed
+
+    def take_ready(self, key, amount, seen):
+        """Non-blocking ``take``: the questions if the pool has them in memory right now, else None.
+
+        Never fetches and never waits for a bucket that is being filled, so
+        it can run on a script thread; on None, fall back to ``take``.
+        """
+        keys = bucket_keys(key)
+        keys = random.sample(keys, len(keys))
+        shares = [amount // len(keys) + (i < amount % len(keys)) for i in range(len(keys))]
+        picked = []
+        for k, n in zip(keys, shares):
+            if not n:
+                continue
+            with self._lock:
+                bucket = self._buckets.get(k)
+                if bucket is not None:
+                    self._buckets.move_to_end(k)
+            if bucket is None or time.monotonic() - bucket.loaded_at > self.ttl:
+                return None
+            if not bucket.lock.acquire(blocking=False):
+                return None
+            try:
+                fresh = bucket.unseen(seen)
+                if len(fresh) < n:
+                    return None
+                picked.append((k, bucket, len(fresh) - n, random.sample(fresh, n)))
+            finally:
+                bucket.lock.release()
+        for k, bucket, left, questions in picked:
+            seen.update(question_key(q) for q in questions)
+            if left < self.low_water:
+                self._refill_in_background(bucket, k)
+        if len(picked) == 1:
+            return picked[0][3]
+        return [q for q in chain.from_iterable(zip_longest(*(p[3] for p in picked))) if q is not None]
+
+    def _take_bucket(self, key, amount, seen):
+        bucket = self._bucket(key)
+        with bucket.lock:
+            fresh = bucket.unseen(seen)
+            if len(fresh) < amount:
+                response_code = self._fill(bucket, key, amount)
+                if response_code != 0:
+                    return response_code, []
+                fresh = bucket.unseen(seen)
+                if len(fresh) < amount:
+                    return 4, []
+            questions = random.sample(fresh, amount)
+        seen.update(question_key(q) for q in questions)
+        if len(fresh) - amount < self.low_water:
+            self._refill_in_background(bucket, key)
+        return 0, questions
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
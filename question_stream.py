@@ -0,0 +1,134 @@
+"""Streamed question supply for long rounds and marathon mode.
+
+A ``QuestionStream`` hands out pages of questions for one pool key, keeping
+a small look-ahead buffer that is refilled on a background thread. The
+player is always working from a page that was fetched while they were
+answering the previous one, and a session never holds more than the
+current page plus the buffer, however long the round runs.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+PAGE_SIZE = 10
+LOOKAHEAD_PAGES = 2
+# How long next_page waits for an in-flight fetch when the buffer ran dry
+PAGE_WAIT = 10
+# A failed page fetch is retried this many times, waiting RETRY_BACKOFF seconds
+# before the first retry and twice as long before each one after it
+FETCH_RETRIES = 3
+RETRY_BACKOFF = 0.5
+
+# Shared by every stream in the process
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="stream")
+
+
+class QuestionStream:
+    """Iterator over questions for ``key``, ``total`` of them or endless if None.
+
+    ``pool`` is a ``question_pool.QuestionPool`` and ``seen`` the player's
+    seen set, which the pool keeps up to date. When the player has seen
+    everything for the key the seen set is cleared and the stream carries on.
+    Only "no results" (code 1) ends the stream; other codes and errors are
+    retried, and a page that still failed is fetched again on the next call.
+    """
+
+    def __init__(self, pool, key, seen, total=None, page_size=PAGE_SIZE, lookahead=LOOKAHEAD_PAGES,
+                 retries=FETCH_RETRIES, backoff=RETRY_BACKOFF):
+        self.pool = pool
+        self.key = key
+        self.seen = seen
+        self.page_size = page_size
+        self.lookahead = lookahead
+        self.retries = retries
+        self.backoff = backoff
+        self.remaining = total  # questions not yet requested, None = endless
+        self.response_code = 0  # last failed pool response code, 0 while healthy
+        self.done = False  # the pool has no more questions for the key
+        self._buffer = deque()
+        self._future = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._refill()
+
+    def _refill(self):
+        """Starts a background fetch if the buffer is below the look-ahead and none is running."""
+        with self._lock:
+            if self._closed or self._future is not None or self.done:
+                return
+            if len(self._buffer) >= self.lookahead * self.page_size or self.remaining == 0:
+                return
+            amount = self.page_size if self.remaining is None else min(self.page_size, self.remaining)
+            self._future = _executor.submit(self._fetch, amount)
+
+    def _fetch(self, amount):
+        response_code, questions = None, []
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    response_code, questions = self._take(amount)
+                except Exception:
+                    response_code, questions = None, []
+                if response_code in (0, 1) or attempt == self.retries or self._closed:
+                    break
+                time.sleep(self.backoff * 2 ** attempt)
+        finally:
+            with self._lock:
+                self._future = None
+                if response_code == 0:
+                    self.response_code = 0
+                    self._buffer.extend(questions)
+                    if self.remaining is not None:
+                        self.remaining -= len(questions)
+                else:
+                    self.response_code = response_code
+                    self.done = response_code == 1
+        if response_code == 0:
+            self._refill()
+
+    def _take(self, amount):
+        response_code, questions = self.pool.take(self.key, amount, self.seen)
+        if response_code == 4:
+            # Seen everything for these settings, start over
+            self.seen.clear()
+            response_code, questions = self.pool.take(self.key, amount, self.seen)
+        return response_code, questions
+
+    def next_page(self, timeout=PAGE_WAIT):
+        """Returns the next page of up to ``page_size`` questions; empty when the stream is done.
+
+        Normally the page is already buffered. If not, waits up to ``timeout``
+        seconds for it, fetching it again if an earlier fetch failed.
+        """
+        end = time.monotonic() + timeout
+        while True:
+            self._refill()
+            with self._lock:
+                if self._buffer or self.done or self._closed:
+                    break
+                future = self._future
+            left = end - time.monotonic()
+            if future is None or left <= 0:
+                break
+            try:
+                future.result(timeout=left)
+            except Exception:
+                break
+        with self._lock:
+            page = [self._buffer.popleft() for _ in range(min(self.page_size, len(self._buffer)))]
+        self._refill()
+        return page
+
+    def close(self):
+        """Stops further fetches; a fetch in flight finishes but is not used."""
+        with self._lock:
+            self._closed = True
+            self._buffer.clear()
+
+    def __iter__(self):
+        while True:
+            page = self.next_page()
+            if not page:
+                return
+            yield from page
@@ -0,0 +1,81 @@
+"""Normalized question records.
+
+Questions are converted once, when they enter the question pool, so a
+Streamlit rerun never has to unescape HTML or rebuild option lists again.
+The records are immutable and shared between sessions.
+"""
+import html
+import random
+from dataclasses import astuple, dataclass, fields
+from functools import lru_cache
+
+# Points for a correct answer, by difficulty
+POINTS = {"easy": 10, "medium": 20, "hard": 30}
+
+
+@dataclass(frozen=True, slots=True)
+class Question:
+    question: str
+    category: str
+    difficulty: str
+    type: str
+    correct_answer: str
+    options: tuple
+    correct_index: int
+    points: int
+
+
+QUESTION_FIELDS = [f.name for f in fields(Question)]
+
+
+def question_rows(questions):
+    """Questions as plain field lists, for JSON (saved games, the replay log)."""
+    return [astuple(q) for q in questions]
+
+
+def questions_from_rows(rows):
+    """Inverse of ``question_rows``."""
+    questions = []
+    for row in rows:
+        values = dict(zip(QUESTION_FIELDS, row))
+        values["options"] = tuple(values["options"])
+        questions.append(Question(**values))
+    return questions
+
+
+def normalize_question(raw):
+    """Builds a ``Question`` from a raw Open Trivia DB result dict."""
+    correct_answer = html.unescape(raw["correct_answer"])
+    if raw["type"] == "boolean":
+        options = ("True", "False")
+    else:
+        options = (correct_answer,) + tuple(html.unescape(ans) for ans in raw["incorrect_answers"])
+    return Question(
+        question=html.unescape(raw["question"]),
+        category=html.unescape(raw["category"]),
+        difficulty=raw["difficulty"],
+        type=raw["type"],
+        correct_answer=correct_answer,
+        options=options,
+        correct_index=options.index(correct_answer),
+        points=POINTS.get(raw["difficulty"], 10),
+    )
+
+
+@lru_cache(maxsize=4096)
+def option_order(seed, index, count):
+    """Display order of a question's options, as a tuple of option indices.
+
+    Depends only on the round seed and the question's index in the round, so
+    it is the same on every rerun and can be reproduced for replays.
+    """
+    order = list(range(count))
+    random.Random(f"{seed}:{index}").shuffle(order)
+    return tuple(order)
+
+
+def ordered_options(question, seed, index):
+    """The question's options in display order. True/False always keeps its order."""
+    if question.type == "boolean":
+        return question.options
+    return tuple(question.options[i] for i in option_order(seed, index, len(question.options)))
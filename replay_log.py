@@ -0,0 +1,330 @@
+"""Session replay log: what happened in every round, for reproducing slow or broken ones.
+
+Each game transition appends one compact JSON line, tagged with the player
+id (``s``), the event name (``e``) and the wall clock (``t``):
+
+* ``fetch``: a round's first page from the pool or the prefetch, with the
+  response code and how long the session waited
+* ``round``: the settings, round seed and questions a round started with
+* ``answer``, ``expire``, ``next``, ``finish``, ``reset``: the player's
+  moves, each with the time the handler took; ``answer`` also carries the
+  player's think time, and ``next`` the page the engine streamed in when it
+  crossed a page boundary
+* ``result``: the round's final score
+* ``api``: every outbound Open Trivia DB call (session ``""``, calls are
+  shared between sessions), with latency, rate-limit wait and response code
+
+``event`` only puts the line on a queue, a writer thread appends the queue
+in batches. The file is rotated at ``TRIVIA_REPLAY_LOG_BYTES`` and only
+``TRIVIA_REPLAY_LOG_BACKUPS`` old files are kept, so the log never takes
+more than ``(backups + 1) * max_bytes`` of disk. If the writer falls behind,
+events are dropped rather than held in memory. ``TRIVIA_REPLAY_LOG=""``
+turns the log off.
+
+Replay a session's rounds against the recorded questions, checking that
+every answer scores the same, and see where the time went::
+
+    python replay_log.py sessions
+    python replay_log.py replay <player id>
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+
+from batch_writer import BatchWriter
+from engine import TriviaEngine
+from question_pool import question_key, setting_from_json
+from questions import questions_from_rows
+
+LOG_PATH = os.environ.get("TRIVIA_REPLAY_LOG", "replay.log")
+ENABLED = bool(LOG_PATH)
+MAX_BYTES = int(os.environ.get("TRIVIA_REPLAY_LOG_BYTES", 16 * 1024 * 1024))
+BACKUPS = int(os.environ.get("TRIVIA_REPLAY_LOG_BACKUPS", 3))
+
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 1.0  # seconds the writer waits for more events before writing
+QUEUE_SIZE = 10000  # events waiting for the writer, more are dropped
+
+
+class ReplayLog:
+    """Append-only JSON lines file with a background writer and size-based rotation."""
+
+    def __init__(self, path, max_bytes=MAX_BYTES, backups=BACKUPS, batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL, queue_size=QUEUE_SIZE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._file = None
+        self._size = 0
+        self._writer = BatchWriter(self._append, "replay-log", batch_size, flush_interval, queue_size,
+                                   errors=(OSError, TypeError, ValueError))
+
+    @property
+    def dropped(self):
+        """Events dropped because the writer fell behind."""
+        return self._writer.dropped
+
+    def write(self, session, name, values):
+        """Queues one event. Never blocks; drops the event if the writer is too far behind."""
+        self._writer.put((time.time(), session, name, values))
+
+    def _append(self, batch):
+        if self._file is None:
+            self._file = open(self.path, "ab")
+            self._size = self._file.tell()
+        chunk = []
+        for t, session, name, values in batch:
+            line = (json.dumps({"t": round(t, 3), "s": session, "e": name, **values},
+                               separators=(",", ":"), default=list) + "\n").encode()
+            if self._size and self._size + len(line) > self.max_bytes:
+                self._file.write(b"".join(chunk))
+                chunk = []
+                self._rotate()
+            chunk.append(line)
+            self._size += len(line)
+        self._file.write(b"".join(chunk))
+        self._file.flush()
+
+    def _rotate(self):
+        self._file.close()
+        if self.backups:
+            for i in range(self.backups - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{i}"):
+                    os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        self._file = open(self.path, "wb")
+        self._size = 0
+
+    def flush(self):
+        """Blocks until every queued event is written."""
+        self._writer.flush()
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_log():
+    """The process-wide log, started on first use. None when the log is off."""
+    global _log
+    if not ENABLED:
+        return None
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                _log = ReplayLog(LOG_PATH)
+    return _log
+
+
+def event(session, name, **values):
+    """Appends an event to the replay log (a no-op when it is off)."""
+    log = get_log()
+    if log is not None:
+        log.write(session, name, values)
+
+
+def elapsed_ms(start):
+    """Milliseconds since a ``time.perf_counter()`` reading, as logged."""
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+# --- Reading and replaying ---
+
+def log_files(path=LOG_PATH):
+    """The log and its rotated files that exist, oldest first."""
+    names = [f"{path}.{i}" for i in range(BACKUPS, 0, -1)] + [path]
+    return [name for name in names if os.path.exists(name)]
+
+
+def read_events(paths):
+    """Every event in ``paths``, in order. Skips a line cut short by a crash."""
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+class RecordedPool:
+    """Stands in for the question pool, handing out the pages a round was played with."""
+
+    def __init__(self, pages):
+        self._pages = deque(pages)
+        self._lock = threading.Lock()
+
+    def take(self, key, amount, seen):
+        with self._lock:
+            if not self._pages:
+                return 1, []
+            page = self._pages.popleft()
+        seen.update(question_key(q) for q in page)
+        return 0, page
+
+
+def split_rounds(events):
+    """Groups one session's events into rounds, each with the fetches that led up to it."""
+    rounds, pending, current = [], [], None
+    for e in events:
+        if e["e"] == "fetch":
+            pending.append(e)
+        elif e["e"] == "round":
+            current = {"fetches": pending, "start": e, "steps": []}
+            pending = []
+            rounds.append(current)
+        elif e["e"] == "reset":
+            current = None
+        elif current is not None:
+            current["steps"].append(e)
+    return rounds
+
+
+def replay_round(recorded):
+    """Re-plays one recorded round on a fresh engine and returns the report.
+
+    The engine gets the recorded questions and round seed, so every answer
+    must score exactly as it did; any difference is listed as a divergence.
+    """
+    start = recorded["start"]
+    steps = recorded["steps"]
+    report = {
+        "started_at": start["t"],
+        "key": start["key"],
+        "seed": start["seed"],
+        "fetches": recorded["fetches"],
+        "start_ms": start.get("ms", 0.0),
+        "divergences": [],
+        "timeline": [],
+        "score": None,
+    }
+    if not start.get("questions"):
+        report["divergences"].append(f"the round did not load (code {start.get('code')})")
+        return report
+
+    pages = [questions_from_rows(step["page"]) for step in steps if step["e"] == "next" and step.get("page")]
+    engine = TriviaEngine(RecordedPool(pages), round_size=start["round_size"], question_time=start.get("question_time"))
+    category, difficulty, question_type = start["key"]
+    engine.start(setting_from_json(category), setting_from_json(difficulty), question_type, questions_from_rows(start["questions"]))
+    engine.round_seed = start["seed"]
+
+    last_t = start["t"]
+    for step in steps:
+        name = step["e"]
+        ms = step.get("ms", 0.0)
+        if step.get("think_ms") is not None:
+            think = step["think_ms"] / 1000  # measured by the app, from the question being rendered
+        else:
+            think = max(0.0, step["t"] - ms / 1000 - last_t)
+        last_t = step["t"]
+        if name == "answer":
+            if engine.current_question != step["i"]:
+                report["divergences"].append(f"answer to question {step['i'] + 1} came at question {engine.current_question + 1}")
+                break
+            options = list(engine.options())
+            if step["option"] not in options:
+                report["divergences"].append(f"question {step['i'] + 1}: {step['option']!r} is not an option")
+                break
+            if options.index(step["option"]) != step.get("pos", options.index(step["option"])):
+                report["divergences"].append(f"question {step['i'] + 1}: options shown in a different order")
+            elapsed = step["think_ms"] / 1000 if step.get("think_ms") is not None else None
+            outcome = engine.answer(step["option"], elapsed=elapsed)
+            for field in ("correct", "points", "bonus", "score"):
+                if field in step and outcome[field] != step[field]:
+                    report["divergences"].append(
+                        f"question {step['i'] + 1}: {field} {outcome[field]!r}, recorded {step[field]!r}"
+                    )
+            report["timeline"].append({"step": f"answer Q{step['i'] + 1}", "think_s": think, "ms": ms})
+        elif name == "expire":
+            engine.expire()
+            report["timeline"].append({"step": f"timeout Q{engine.current_question + 1}", "think_s": think, "ms": ms})
+        elif name == "next":
+            more = engine.next()
+            if more == step.get("finished", not more):
+                report["divergences"].append(f"round {'ended' if not more else 'went on'} after question {engine.current_question}")
+            label = f"next Q{engine.current_question + 1}" + (" (new page)" if step.get("page") else "")
+            report["timeline"].append({"step": label, "think_s": think, "ms": ms})
+        elif name == "finish":
+            engine.finish()
+            report["timeline"].append({"step": "end marathon", "think_s": think, "ms": ms})
+        elif name == "result":
+            report["ended_at"] = step["t"]
+            if step.get("score") != engine.score:
+                report["divergences"].append(f"final score {engine.score}, recorded {step.get('score')}")
+    report["score"] = engine.score
+    report.setdefault("ended_at", last_t)
+    return report
+
+
+def calls_between(api_events, begin, end):
+    """Outbound calls made between two wall clock times (by any session)."""
+    return [e for e in api_events if begin <= e["t"] <= end]
+
+
+def print_report(report, api_events):
+    fetch_ms = sum(f.get("ms", 0.0) for f in report["fetches"])
+    begin = report["started_at"] - fetch_ms / 1000 - 1
+    timeline = report["timeline"]
+    print(f"Round at {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(report['started_at']))}"
+          f"  key={report['key']}  seed={report['seed']}  score={report['score']}")
+    for f in report["fetches"]:
+        outcome = f"code {f['code']}, {f.get('n', 0)} questions" if "code" in f else f.get("error", "failed")
+        print(f"  fetch ({f.get('source', 'pool')}): {f.get('ms', 0.0):.0f}ms, {outcome}")
+    print(f"  round start: {report['start_ms']:.0f}ms")
+    handler_ms = sum(step["ms"] for step in timeline)
+    page_ms = sum(step["ms"] for step in timeline if "new page" in step["step"])
+    think_s = sum(step["think_s"] for step in timeline)
+    print(f"  player: {think_s:.1f}s thinking over {len(timeline)} steps")
+    print(f"  server: {handler_ms:.0f}ms in handlers, {page_ms:.0f}ms of it waiting for streamed pages")
+    for step in sorted(timeline, key=lambda s: s["ms"], reverse=True)[:3]:
+        print(f"    slowest: {step['step']} {step['ms']:.0f}ms")
+    calls = calls_between(api_events, begin, report["ended_at"])
+    if calls:
+        codes = Counter(str(c.get("code", c.get("error"))) for c in calls)
+        print(f"  API (whole process): {len(calls)} calls, {sum(c.get('ms', 0.0) for c in calls):.0f}ms,"
+              f" {sum(c.get('wait_ms', 0.0) for c in calls):.0f}ms rate-limited, codes {dict(codes)}")
+        slowest = max(calls, key=lambda c: c.get("ms", 0.0))
+        print(f"    slowest: {slowest['url']} {slowest.get('ms', 0.0):.0f}ms")
+    if report["divergences"]:
+        print("  DIVERGED:")
+        for divergence in report["divergences"]:
+            print(f"    {divergence}")
+    else:
+        print("  replayed identically")
+
+
+def main():
+    logs = argparse.ArgumentParser(add_help=False)
+    logs.add_argument("--log", default=LOG_PATH or "replay.log", help="log file, its rotated files are read too")
+    parser = argparse.ArgumentParser(description="Inspect and replay the session replay log.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("sessions", parents=[logs], help="list the sessions in the log")
+    replay_cmd = commands.add_parser("replay", parents=[logs], help="replay a session's rounds")
+    replay_cmd.add_argument("session", help="player id (the ?player= part of the game URL)")
+    args = parser.parse_args()
+
+    events = list(read_events(log_files(args.log)))
+    if args.command == "sessions":
+        rounds = Counter(e["s"] for e in events if e["e"] == "round")
+        last = {e["s"]: e["t"] for e in events if e["s"]}
+        for session, t in sorted(last.items(), key=lambda item: item[1], reverse=True):
+            print(f"{session}  {rounds[session]} rounds, last seen {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(t))}")
+        return
+
+    api_events = [e for e in events if e["e"] == "api"]
+    rounds = split_rounds(e for e in events if e["s"] == args.session)
+    if not rounds:
+        raise SystemExit(f"No rounds for session {args.session!r} in {args.log}")
+    diverged = False
+    for recorded in rounds:
+        report = replay_round(recorded)
+        print_report(report, api_events)
+        diverged = diverged or bool(report["divergences"])
+    raise SystemExit(1 if diverged else 0)
+
+
+if __name__ == "__main__":
+    main()
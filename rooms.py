@@ -0,0 +1,299 @@
+"""Multiplayer rooms: many players, one shared round.
+
+A ``Room`` owns one question list (fetched once, when the room is created),
+one round seed so every member sees the same option order, and the
+authoritative clock for the round:
+
+    lobby -> question 1 -> reveal 1 -> question 2 -> ... -> reveal N -> finished
+
+A question closes when its time is up or every member has answered; the
+reveal shows the answer for ``reveal_time`` seconds before the next one.
+There is no timer thread: whoever looks at the room first after a deadline
+moves it on, under the room lock.
+
+Each transition bumps ``version`` and builds one immutable snapshot that
+all members read, and ``wait(version)`` blocks until the next transition,
+so a room costs one state update per transition however many people are
+in it. Members are scored by their own ``TriviaEngine`` over the shared
+questions, with the same rules as single player. Engines that fall behind
+catch up when they are next used, so a transition never loops over
+members. The scoreboard is kept sorted and updated one entry per answer.
+
+Rooms live in process memory. With several replicas, route a room's
+players to one of them (sticky sessions).
+"""
+import bisect
+import random
+import secrets
+import threading
+import time
+
+from engine import TriviaEngine
+from questions import ordered_options
+
+QUESTION_TIME = 20  # seconds to answer
+REVEAL_TIME = 5  # seconds the answer stays up before the next question
+ROOM_IDLE = 30 * 60  # rooms nobody touched for this long are dropped
+CODE_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+
+
+class RoomError(Exception):
+    """A room operation that isn't possible right now (unknown code, game already over, ...)."""
+
+
+class _Member:
+    __slots__ = ("player_id", "name", "engine", "joined")
+
+    def __init__(self, player_id, name, engine, joined):
+        self.player_id = player_id
+        self.name = name
+        self.engine = engine
+        self.joined = joined
+
+
+class Room:
+    """One shared round. ``questions`` are ``questions.Question`` records."""
+
+    def __init__(self, code, host_id, category, difficulty, question_type, questions,
+                 question_time=QUESTION_TIME, reveal_time=REVEAL_TIME):
+        if not questions:
+            raise RoomError("A room needs questions")
+        self.code = code
+        self.host_id = host_id
+        self.category = category
+        self.difficulty = difficulty
+        self.question_type = question_type
+        self.questions = tuple(questions)
+        self.round_seed = random.randrange(2**32)
+        self.question_time = question_time
+        self.reveal_time = reveal_time
+        self.phase = "lobby"
+        self.index = 0
+        self.deadline = None  # time.monotonic() when the current phase ends
+        self.version = 0
+        self.touched = time.monotonic()
+        self._members = {}  # player_id -> _Member
+        self._joins = 0  # members ever joined, orders them by arrival
+        self._answered = set()  # player ids that answered the current question
+        self._board = []  # (-score, joined, player_id), best first
+        self._snapshot = None
+        self._cond = threading.Condition()
+
+    # --- Clock ---
+
+    def _transition(self, phase, deadline):
+        self.phase = phase
+        self.deadline = deadline
+        self.version += 1
+        self._snapshot = None
+        self._cond.notify_all()
+
+    def _advance(self, now):
+        """Runs every transition whose deadline has passed. Caller holds the lock."""
+        while self.deadline is not None and now >= self.deadline:
+            if self.phase == "question":
+                self._transition("reveal", self.deadline + self.reveal_time)
+            elif self.index + 1 < len(self.questions):
+                self.index += 1
+                self._answered = set()
+                self._transition("question", self.deadline + self.question_time)
+            else:
+                self._transition("finished", None)
+
+    def start(self, player_id):
+        """Starts the round. Only the host can."""
+        with self._cond:
+            if player_id != self.host_id:
+                raise RoomError("Only the host can start the game")
+            if self.phase != "lobby":
+                raise RoomError("The game has already started")
+            self._transition("question", time.monotonic() + self.question_time)
+
+    # --- Members ---
+
+    def join(self, player_id, name):
+        """Adds a player (or renames one who is already in). Joining mid-round is allowed."""
+        with self._cond:
+            self.touched = time.monotonic()
+            member = self._members.get(player_id)
+            if member is not None:
+                member.name = name
+                self._snapshot = None
+                return
+            if self.phase == "finished":
+                raise RoomError("This game is over")
+            engine = TriviaEngine(round_size=len(self.questions))
+            engine.start(self.category, self.difficulty, self.question_type, self.questions)
+            engine.round_seed = self.round_seed
+            member = _Member(player_id, name, engine, self._joins)
+            self._joins += 1
+            self._members[player_id] = member
+            bisect.insort(self._board, (0, member.joined, player_id))
+            self._snapshot = None
+
+    def leave(self, player_id):
+        """Removes a player. A leaving host hands the room to whoever has been in it longest."""
+        with self._cond:
+            member = self._members.pop(player_id, None)
+            if member is None:
+                return
+            self._board.remove((-member.engine.score, member.joined, player_id))
+            self._answered.discard(player_id)
+            self._snapshot = None
+            if not self._members:
+                return  # Nobody left to play, the registry drops the room once it's idle
+            if self.phase == "question" and len(self._answered) >= len(self._members):
+                # Everybody still here has answered
+                self._transition("reveal", time.monotonic() + self.reveal_time)
+            if player_id == self.host_id:
+                self.host_id = min(self._members.values(), key=lambda m: m.joined).player_id
+                # Same phase, but waiters need to see the new host
+                self._transition(self.phase, self.deadline)
+
+    def _member(self, player_id):
+        member = self._members.get(player_id)
+        if member is None:
+            raise RoomError("You are not in this room")
+        # Catch up on the questions that closed since this member last acted
+        engine = member.engine
+        while engine.current_question < self.index:
+            if not engine.answered:
+                engine.expire()
+            engine.next()
+        return member
+
+    def answer(self, player_id, option):
+        """Scores the member's answer to the open question and returns the engine's outcome.
+
+        Raises ``RoomError`` if no question is open, the member already
+        answered it or ``option`` isn't one of its options.
+        """
+        with self._cond:
+            now = time.monotonic()
+            self._advance(now)
+            self.touched = now
+            if self.phase != "question":
+                raise RoomError("No question is open")
+            member = self._member(player_id)
+            if player_id in self._answered:
+                raise RoomError("You already answered this question")
+            if option not in member.engine.options():
+                raise RoomError(f"{option!r} is not an option")
+            before = (-member.engine.score, member.joined, player_id)
+            outcome = member.engine.answer(option)
+            if outcome["points"]:
+                # Move just this member on the scoreboard
+                del self._board[bisect.bisect_left(self._board, before)]
+                bisect.insort(self._board, (-member.engine.score, member.joined, player_id))
+            self._answered.add(player_id)
+            self._snapshot = None
+            if len(self._answered) >= len(self._members):
+                # Everybody's in, no need to wait for the clock
+                self._transition("reveal", now + self.reveal_time)
+            return outcome
+
+    # --- Views ---
+
+    def snapshot(self):
+        """The room as plain data, shared by every member until it changes."""
+        with self._cond:
+            self.touched = time.monotonic()
+            self._advance(self.touched)
+            if self._snapshot is None:
+                self._snapshot = self._build_snapshot()
+            return self._snapshot
+
+    def _build_snapshot(self):
+        question = None
+        if self.phase in ("question", "reveal"):
+            record = self.questions[self.index]
+            question = {
+                "question": record.question,
+                "category": record.category,
+                "difficulty": record.difficulty,
+                "type": record.type,
+                "points": record.points,
+                "options": list(ordered_options(record, self.round_seed, self.index)),
+                # Only sent once the question has closed
+                "correct_answer": record.correct_answer if self.phase == "reveal" else None,
+            }
+        return {
+            "code": self.code,
+            "version": self.version,
+            "phase": self.phase,
+            "index": self.index,
+            "total": len(self.questions),
+            "deadline": self.deadline,
+            "question": question,
+            "answered": len(self._answered),
+            "members": len(self._members),
+            "host_id": self.host_id,
+            "scoreboard": [
+                {"player_id": player_id, "name": self._members[player_id].name, "score": -score}
+                for score, _, player_id in self._board
+            ],
+        }
+
+    def player_view(self, player_id):
+        """This member's side of the current question: their answer, score and streak."""
+        with self._cond:
+            self._advance(time.monotonic())
+            engine = self._member(player_id).engine
+            return {
+                "answered": player_id in self._answered,
+                "selected_option": engine.selected_option if engine.current_question == self.index else None,
+                "score": engine.score,
+                "streak": engine.current_streak,
+                "correct_answers": engine.correct_answers,
+            }
+
+    def wait(self, version, timeout=None):
+        """Blocks until the room moves past ``version`` (or ``timeout``), returns the snapshot."""
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._advance(now)
+                if self.version != version or (end is not None and now >= end):
+                    break
+                # Wake up for the next deadline too, nobody else may be around to run it
+                waits = [t - now for t in (self.deadline, end) if t is not None]
+                self._cond.wait(min(waits) if waits else None)
+        return self.snapshot()
+
+
+class RoomRegistry:
+    """The rooms of this process, by code."""
+
+    def __init__(self, idle=ROOM_IDLE):
+        self.idle = idle
+        self._rooms = {}
+        self._lock = threading.Lock()
+
+    def create(self, host_id, host_name, category, difficulty, question_type, questions, **kwargs):
+        with self._lock:
+            self._drop_idle()
+            code = "".join(secrets.choice(CODE_ALPHABET) for _ in range(5))
+            while code in self._rooms:
+                code = "".join(secrets.choice(CODE_ALPHABET) for _ in range(5))
+            room = Room(code, host_id, category, difficulty, question_type, questions, **kwargs)
+            self._rooms[code] = room
+        room.join(host_id, host_name)
+        return room
+
+    def get(self, code):
+        """The room for ``code`` (case-insensitive), raises ``RoomError`` if there is none."""
+        with self._lock:
+            room = self._rooms.get(code.strip().upper())
+        if room is None:
+            raise RoomError(f"No room with code {code!r}")
+        return room
+
+    def _drop_idle(self):
+        now = time.monotonic()
+        for code in [c for c, r in self._rooms.items() if now - r.touched > self.idle]:
+            del self._rooms[code]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._rooms)
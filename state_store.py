@@ -0,0 +1,157 @@
+"""Pluggable store for game state, so a game survives a lost process.
+
+Every game transition (start, answer, next, restart, back to settings) writes
+one compact snapshot of the player's game state. With the SQLite or Redis
+backend several Streamlit replicas can share the store, and a player who
+reconnects to a different replica picks up where they left off.
+
+Backends share one small interface: ``load(player_id)``, ``save(player_id,
+state)`` and ``delete(player_id)``.
+"""
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+from questions import question_rows, questions_from_rows
+
+# Drop saved games nobody touched for this long
+SESSION_TTL = 6 * 60 * 60
+# How often a save also sweeps out the expired games (Redis expires its own)
+SWEEP_INTERVAL = 60
+
+
+def dump_snapshot(state):
+    """Serializes a game state dict to compressed JSON bytes.
+
+    Questions are stored as plain field lists and the seen set as a list.
+    """
+    data = dict(state)
+    data["questions"] = question_rows(state.get("questions", []))
+    data["seen_questions"] = list(state.get("seen_questions", ()))
+    return zlib.compress(json.dumps(data, separators=(",", ":")).encode())
+
+
+def load_snapshot(blob):
+    """Inverse of ``dump_snapshot``."""
+    data = json.loads(zlib.decompress(blob))
+    data["questions"] = questions_from_rows(data.get("questions", []))
+    data["seen_questions"] = set(data.get("seen_questions", ()))
+    return data
+
+
+class MemoryStore:
+    """Process-local store, the default. Survives reconnects, not restarts."""
+
+    def __init__(self, ttl=SESSION_TTL, sweep_interval=SWEEP_INTERVAL):
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._data = {}
+        self._next_sweep = 0.0
+        self._lock = threading.Lock()
+
+    def load(self, player_id):
+        with self._lock:
+            entry = self._data.get(player_id)
+        if entry is None or time.time() - entry[1] > self.ttl:
+            return None
+        return load_snapshot(entry[0])
+
+    def save(self, player_id, state):
+        blob = dump_snapshot(state)
+        now = time.time()
+        with self._lock:
+            self._data[player_id] = (blob, now)
+            if now >= self._next_sweep:
+                self._next_sweep = now + self.sweep_interval
+                for expired in [p for p, (_, updated) in self._data.items() if now - updated > self.ttl]:
+                    del self._data[expired]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def delete(self, player_id):
+        with self._lock:
+            self._data.pop(player_id, None)
+
+
+class SQLiteStore:
+    """Store in a SQLite file in WAL mode, shareable by replicas on one host or volume."""
+
+    def __init__(self, path, ttl=SESSION_TTL, sweep_interval=SWEEP_INTERVAL):
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0.0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS game_state ("
+            " player_id TEXT PRIMARY KEY, snapshot BLOB NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS game_state_updated_at ON game_state (updated_at)")
+        self._lock = threading.Lock()
+
+    def load(self, player_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT snapshot FROM game_state WHERE player_id = ? AND updated_at > ?",
+                (player_id, time.time() - self.ttl),
+            ).fetchone()
+        return load_snapshot(row[0]) if row else None
+
+    def save(self, player_id, state):
+        blob = dump_snapshot(state)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO game_state (player_id, snapshot, updated_at) VALUES (?, ?, ?)",
+                (player_id, blob, now),
+            )
+            if now >= self._next_sweep:
+                self._next_sweep = now + self.sweep_interval
+                self._conn.execute("DELETE FROM game_state WHERE updated_at <= ?", (now - self.ttl,))
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM game_state").fetchone()[0]
+
+    def delete(self, player_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM game_state WHERE player_id = ?", (player_id,))
+
+
+class RedisStore:
+    """Store in Redis, or anything with the same ``get``/``set``/``delete`` calls."""
+
+    def __init__(self, client, prefix="trivia:game:", ttl=SESSION_TTL):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        import redis  # optional, only needed for this backend
+
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def load(self, player_id):
+        blob = self.client.get(self.prefix + player_id)
+        return load_snapshot(blob) if blob else None
+
+    def save(self, player_id, state):
+        self.client.set(self.prefix + player_id, dump_snapshot(state), ex=self.ttl)
+
+    def delete(self, player_id):
+        self.client.delete(self.prefix + player_id)
+
+
+def create_store(backend="memory", path="game_state.db", url="redis://localhost:6379/0"):
+    """Builds the store for ``backend``: "memory", "sqlite" or "redis"."""
+    if backend == "sqlite":
+        return SQLiteStore(path)
+    if backend == "redis":
+        return RedisStore.from_url(url)
+    return MemoryStore()
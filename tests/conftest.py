@@ -0,0 +1,79 @@
+import itertools
+import os
+import sys
+import threading
+
+import pytest
+
+# The modules live at the repository root, next to app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep opentdb's calls off the replay log, which would land in the working directory
+os.environ["TRIVIA_REPLAY_LOG"] = ""
+
+from question_bank import insert_questions, open_bank  # noqa: E402
+from questions import normalize_question  # noqa: E402
+
+
+def raw_question(text, category="General Knowledge", difficulty="easy", question_type="multiple"):
+    """A question in the raw Open Trivia DB format; the correct answer is always "a"."""
+    return {
+        "category": category,
+        "type": question_type,
+        "difficulty": difficulty,
+        "question": text,
+        "correct_answer": "a" if question_type == "multiple" else "True",
+        "incorrect_answers": ["b", "c", "d"] if question_type == "multiple" else ["False"],
+    }
+
+
+def make_questions(n, difficulty="easy", prefix="q"):
+    """``n`` normalized questions whose correct answer is "a"."""
+    return [normalize_question(raw_question(f"{prefix}{i}", difficulty=difficulty)) for i in range(n)]
+
+
+class FakeFetcher:
+    """``fetcher(key, amount)`` for a ``QuestionPool``: endless unique questions per key.
+
+    ``limits`` caps how many distinct questions a key has; ``codes`` makes a
+    key fail with that response code.
+    """
+
+    def __init__(self, limits=None, codes=None):
+        self.limits = limits or {}
+        self.codes = codes or {}
+        self.calls = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def __call__(self, key, amount):
+        with self._lock:
+            self.calls.append((key, amount))
+            if key in self.codes:
+                return self.codes[key], []
+            category, difficulty, question_type = key
+            limit = self.limits.get(key)
+            if limit is not None:
+                if amount > limit:
+                    return 1, []
+                numbers = range(amount)
+            else:
+                numbers = [next(self._counter) for _ in range(amount)]
+            return 0, [
+                raw_question(f"{category}-{difficulty}-{n}", category=str(category), difficulty=difficulty or "easy",
+                             question_type=question_type)
+                for n in numbers
+            ]
+
+
+
+@pytest.fixture
+def bank_path(tmp_path):
+    """An offline bank: General Knowledge with 6 easy and 3 hard, Books with 4 medium, all multiple choice."""
+    path = str(tmp_path / "questions.db")
+    conn = open_bank(path)
+    insert_questions(conn, [raw_question(f"gk easy {i}") for i in range(6)]
+                     + [raw_question(f"gk hard {i}", difficulty="hard") for i in range(3)]
+                     + [raw_question(f"book {i}", category="Entertainment: Books", difficulty="medium")
+                        for i in range(4)])
+    conn.close()
+    return path
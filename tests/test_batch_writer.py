@@ -0,0 +1,38 @@
+import threading
+
+from batch_writer import BatchWriter
+
+
+def test_items_are_written_in_batches():
+    batches = []
+    writer = BatchWriter(batches.append, "test", batch_size=4, flush_interval=0.2)
+    for i in range(10):
+        writer.put(i)
+    writer.flush()
+    assert [item for batch in batches for item in batch] == list(range(10))
+    assert all(len(batch) <= 4 for batch in batches)
+
+
+def test_a_full_queue_drops_instead_of_blocking():
+    release = threading.Event()
+    writer = BatchWriter(lambda batch: release.wait(5), "test", batch_size=1, flush_interval=0, queue_size=2)
+    results = [writer.put(i) for i in range(10)]
+    assert results.count(False) == writer.dropped
+    assert writer.dropped >= 7
+    release.set()
+    writer.flush()
+
+
+def test_a_failed_write_drops_the_batch_and_carries_on():
+    written = []
+
+    def write(batch):
+        if batch == ["bad"]:
+            raise OSError("disk full")
+        written.extend(batch)
+
+    writer = BatchWriter(write, "test", batch_size=1, flush_interval=0, errors=(OSError,))
+    for item in ("a", "bad", "b"):
+        writer.put(item)
+    writer.flush()
+    assert written == ["a", "b"]
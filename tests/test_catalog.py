@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+from catalog import CategoryCatalog
+from question_bank import LocalBankFetcher
+
+FALLBACK = {"🧠 General Knowledge": 9, "📚 Books": 10}
+
+
+class FakeSource:
+    """Stands in for the ``opentdb`` module: two categories, fixed counts, counting calls."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = 0
+
+    def fetch_categories(self):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("offline")
+        return [{"id": 9, "name": "General Knowledge"}, {"id": 16, "name": "Entertainment: Board Games"}]
+
+    def fetch_category_count(self, category_id):
+        self.calls += 1
+        return {"": 30, "easy": 10, "medium": 15, "hard": 5} if category_id == 9 else {"": 3, "easy": 3, "medium": 0, "hard": 0}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "catalog.json")
+
+
+def test_fallback_until_the_first_refresh(path):
+    source = FakeSource()
+    c = CategoryCatalog(path, fallback=FALLBACK, source=source)
+    c._refreshing = True  # no background refresh
+    assert c.categories() == FALLBACK
+    assert c.count(9) is None
+    assert c.available((9, "easy", "multiple")) is None
+
+
+def test_refresh_labels_and_counts(path):
+    c = CategoryCatalog(path, fallback=FALLBACK, source=FakeSource())
+    c._refresh()
+    # Known ids keep their built-in label
+    assert c.categories() == {"🧠 General Knowledge": 9, "❔ Board Games": 16}
+    assert c.category_id("📚 Books") == 10
+    assert c.count(9, "medium") == 15
+    assert c.count(9) == 30
+    assert c.count("") is None
+    assert c.available(((9, 16), "easy", "multiple")) == 13
+    assert c.capacity((16, "hard", "multiple")) == 0
+
+
+def test_disk_cache_is_used_by_the_next_process(path):
+    source = FakeSource()
+    CategoryCatalog(path, fallback=FALLBACK, source=source)._refresh()
+    calls = source.calls
+    c = CategoryCatalog(path, fallback=FALLBACK, source=source)
+    c.refresh()  # fresh from disk, nothing to do
+    assert source.calls == calls
+    assert c.count(16, "easy") == 3
+    with open(path) as f:
+        assert set(json.load(f)) == {"categories", "counts"}
+
+
+def test_stale_entries_are_refetched(path):
+    source = FakeSource()
+    c = CategoryCatalog(path, ttl=100, fallback=FALLBACK, source=source)
+    c._refresh()
+    calls = source.calls
+    c._counts[16]["fetched_at"] -= 101
+    c._fresh_until = 0
+    c._refresh()
+    assert source.calls == calls + 1
+
+
+def test_failed_refresh_keeps_what_it_had_and_waits(path):
+    source = FakeSource(fail=True)
+    c = CategoryCatalog(path, fallback=FALLBACK, source=source)
+    c._refresh()
+    assert c.categories() == FALLBACK
+    assert c._retry_at > 0
+    c.refresh()  # within RETRY_DELAY, no new attempt
+    assert not c._refreshing
+    assert source.calls == 1
+
+
+def test_offline_bank_is_its_own_catalog(bank_path):
+    c = CategoryCatalog(None, source=LocalBankFetcher(bank_path))
+    c._refresh()
+    assert set(c.categories().values()) == {9, 10}
+    assert c.count(9) == 9
+    assert c.count(9, "easy") == 6
+    assert c.count(10, "hard") == 0
+    assert c.available(((9, 10), "medium", "multiple")) == 4
@@ -0,0 +1,185 @@
+import pytest
+
+from conftest import FakeFetcher, make_questions
+from engine import TIME_BONUS, TriviaEngine, time_bonus
+from question_pool import QuestionPool
+from question_stream import PAGE_SIZE
+from replay_log import RecordedPool
+
+
+def play(engine, answers):
+    """Answers the next questions right (True) or wrong (False) and moves on after each."""
+    outcomes = []
+    for right in answers:
+        outcomes.append(engine.answer("a" if right else "b"))
+        engine.next()
+    return outcomes
+
+
+def test_scoring_by_difficulty_and_streaks():
+    engine = TriviaEngine(round_size=4)
+    questions = make_questions(2, "easy") + make_questions(1, "hard", prefix="h") + make_questions(1, "medium", prefix="m")
+    assert engine.start(9, "Easy", "Multiple", questions) == 0
+    assert (engine.difficulty, engine.question_type) == ("easy", "multiple")
+
+    first, second, third, fourth = play(engine, [True, True, False, True])
+
+    assert (first["points"], second["points"], third["points"], fourth["points"]) == (10, 10, 0, 20)
+    assert (second["streak"], third["streak"], fourth["streak"]) == (2, 0, 1)
+    assert engine.finished
+    results = engine.results()
+    assert results["score"] == 40
+    assert results["correct_answers"] == 3
+    assert results["max_streak"] == 2
+    assert results["total_questions"] == 4
+    assert results["duration"] is not None
+
+
+def test_answer_rules():
+    engine = TriviaEngine()
+    engine.start(9, "easy", "multiple", make_questions(10))
+    with pytest.raises(RuntimeError):
+        engine.next()
+    with pytest.raises(ValueError):
+        engine.answer("not an option")
+    engine.answer("a")
+    with pytest.raises(RuntimeError):
+        engine.answer("a")
+
+
+def test_expire_counts_as_wrong():
+    engine = TriviaEngine()
+    engine.start(9, "easy", "multiple", make_questions(10))
+    play(engine, [True])
+    outcome = engine.expire()
+    assert outcome["correct"] is False
+    assert engine.current_streak == 0
+    assert engine.selected_option is None
+    assert engine.score == 10
+
+
+def test_empty_round_does_not_load():
+    engine = TriviaEngine()
+    assert engine.start(9, "easy", "multiple", []) == 1
+    assert not engine.loaded
+
+
+def test_option_order_follows_the_round_seed():
+    questions = make_questions(10)
+    first = TriviaEngine(seed=1)
+    second = TriviaEngine(seed=1)
+    first.start(9, "easy", "multiple", questions)
+    second.start(9, "easy", "multiple", questions)
+    assert first.round_seed == second.round_seed
+    for _ in range(5):
+        assert first.options() == second.options()
+        play(first, [True])
+        play(second, [True])
+
+
+def test_long_round_streams_pages():
+    engine = TriviaEngine(QuestionPool(FakeFetcher()), round_size=25)
+    assert engine.start(9, "easy", "multiple") == 0
+    seen = []
+    while not engine.finished:
+        assert len(engine.questions) <= PAGE_SIZE
+        seen.append(engine.current_question_record().question)
+        engine.answer("a")
+        engine.next()
+    assert len(seen) == 25
+    assert len(set(seen)) == 25
+    assert engine.results()["total_questions"] == 25
+    assert engine.score == 250
+
+
+def test_page_boundary_does_not_stamp_finished_at():
+    engine = TriviaEngine(QuestionPool(FakeFetcher()), round_size=25)
+    engine.start(9, "easy", "multiple")
+    play(engine, [True] * (PAGE_SIZE + 1))
+    assert engine.offset == PAGE_SIZE
+    assert engine.finished_at is None
+    assert engine.results()["duration"] is None
+
+
+def test_round_ends_when_the_stream_runs_dry():
+    # The pool has 13 questions in two pages, then answers "no results"
+    engine = TriviaEngine(RecordedPool([make_questions(10), make_questions(3, prefix="x")]), round_size=25)
+    engine.start(9, "easy", "multiple")
+    count = 0
+    while not engine.finished:
+        engine.answer("a")
+        engine.next()
+        count += 1
+    assert count == 13
+    assert engine.total_questions == 13
+    assert engine.results()["duration"] is not None
+
+
+def test_stream_starts_over_once_everything_was_seen():
+    # Only 12 questions exist for the key, the round asks for 25
+    fetcher = FakeFetcher(limits={(9, "easy", "multiple"): 12})
+    engine = TriviaEngine(QuestionPool(fetcher, batch_size=12), round_size=25)
+    engine.start(9, "easy", "multiple")
+    played = []
+    while not engine.finished:
+        played.append(engine.current_question_record().question)
+        engine.answer("a")
+        engine.next()
+    assert len(played) == 25
+    assert len(set(played[:10])) == 10
+    assert len(set(played)) <= 12
+
+
+def test_marathon_until_finish():
+    engine = TriviaEngine(QuestionPool(FakeFetcher()), round_size=None)
+    engine.start(9, "easy", "multiple")
+    play(engine, [True] * 15)
+    assert engine.total_questions is None
+    assert not engine.finished
+    engine.answer("a")
+    engine.finish()
+    assert engine.finished
+    assert engine.total_questions == 16
+    assert engine.correct_answers == 16
+    assert engine.results()["round_size"] is None
+    assert engine.results()["duration"] is not None
+
+
+def test_finish_before_answering_skips_the_open_question():
+    engine = TriviaEngine(QuestionPool(FakeFetcher()), round_size=None)
+    engine.start(9, "easy", "multiple")
+    play(engine, [True] * 3)
+    engine.finish()
+    assert engine.total_questions == 3
+
+
+def test_time_bonus():
+    assert time_bonus(10, 0, 20) == round(10 * TIME_BONUS)
+    assert time_bonus(10, 10, 20) == round(10 * TIME_BONUS / 2)
+    assert time_bonus(10, 20, 20) == 0
+    assert time_bonus(10, 1, None) == 0
+    assert time_bonus(10, None, 20) == 0
+
+
+def test_timed_answers_earn_a_bonus_only_when_correct():
+    engine = TriviaEngine(question_time=20)
+    engine.start(9, "easy", "multiple", make_questions(10))
+    outcome = engine.answer("a", elapsed=0)
+    assert outcome["bonus"] == 5
+    assert outcome["points"] == 15
+    engine.next()
+    outcome = engine.answer("b", elapsed=0)
+    assert (outcome["bonus"], outcome["points"]) == (0, 0)
+    assert engine.results()["question_time"] == 20
+
+
+def test_state_round_trip():
+    engine = TriviaEngine(round_size=10)
+    engine.start((9, 10), ("easy", "hard"), "multiple", make_questions(10))
+    play(engine, [True, False])
+    restored = TriviaEngine.from_state(engine.to_state())
+    assert restored.category == (9, 10)
+    assert restored.difficulty == ("easy", "hard")
+    assert restored.current_question == 2
+    assert restored.score == engine.score
+    assert restored.options() == engine.options()
@@ -0,0 +1,143 @@
+import threading
+
+import pytest
+
+from leaderboard import Leaderboard, board_key
+
+
+def results(score, category=9, difficulty="easy", question_type="multiple", round_size=10, question_time=None):
+    return {
+        "category": category, "difficulty": difficulty, "type": question_type, "round_size": round_size,
+        "question_time": question_time, "score": score, "correct_answers": score // 10,
+        "total_questions": round_size, "max_streak": 1, "duration": 30.0,
+    }
+
+
+@pytest.fixture
+def board(tmp_path):
+    return Leaderboard(str(tmp_path / "leaderboard.db"), top_n=3, flush_interval=0.01)
+
+
+def scores(entries):
+    return [entry["score"] for entry in entries]
+
+
+def test_board_key():
+    assert board_key(9, "easy", "multiple", 10) == "9|easy|multiple|10"
+    assert board_key((9, 10), ("easy", "hard"), "boolean", None, timed=True) == "9,10|easy,hard|boolean|marathon|timed"
+
+
+def test_rounds_only_compare_within_their_board(board):
+    board.record("p1", "P1", results(50))
+    board.record("p2", "P2", results(90, round_size=50))
+    board.record("p3", "P3", results(70, question_time=20))
+    board.record("p4", "P4", results(60, question_type="boolean"))
+    board.flush()
+    assert scores(board.top(9, "easy", "multiple", 10)) == [50]
+    assert scores(board.top(9, "easy", "multiple", 50)) == [90]
+    assert scores(board.top(9, "easy", "multiple", 10, timed=True)) == [70]
+    assert scores(board.top(9, "easy", "boolean", 10)) == [60]
+
+
+def test_top_is_best_first_and_earliest_first_on_ties(board):
+    for player, score in (("a", 30), ("b", 80), ("c", 30), ("d", 10)):
+        board.record(player, player.upper(), results(score))
+    board.flush()
+    top = board.top(9, "easy", "multiple", 10)
+    assert [(e["player_id"], e["score"]) for e in top] == [("b", 80), ("a", 30), ("c", 30)]
+    assert scores(board.top(9, "easy", "multiple", 10, n=10)) == [80, 30, 30, 10]
+
+
+class CountingBoard(Leaderboard):
+    def __init__(self, *args, **kwargs):
+        self.batches = []
+        super().__init__(*args, **kwargs)
+
+    def _insert(self, batch):
+        self.batches.append(len(batch))
+        super()._insert(batch)
+
+
+class HeldBoard(Leaderboard):
+    """Its writer waits for ``release`` before committing anything."""
+
+    def __init__(self, *args, **kwargs):
+        self.release = threading.Event()
+        super().__init__(*args, **kwargs)
+
+    def _insert(self, batch):
+        self.release.wait(5)
+        super()._insert(batch)
+
+
+def test_writes_are_batched(tmp_path):
+    board = CountingBoard(str(tmp_path / "leaderboard.db"), batch_size=50, flush_interval=0.5)
+    for i in range(120):
+        board.record(f"p{i}", "P", results(i))
+    board.flush()
+    assert sum(board.batches) == 120
+    assert len(board.batches) <= 4
+    assert len(board.top(9, "easy", "multiple", 10, n=200)) == 120
+
+
+def test_new_results_merge_into_the_cached_list(board):
+    board.record("a", "A", results(40))
+    board.flush()
+    assert scores(board.top(9, "easy", "multiple", 10)) == [40]
+    board.record("b", "B", results(60))
+    # Served from the cache, before the writer got to it
+    assert scores(board.top(9, "easy", "multiple", 10)) == [60, 40]
+
+
+def test_a_loaded_list_includes_results_still_queued(tmp_path):
+    board = HeldBoard(str(tmp_path / "leaderboard.db"), top_n=3, flush_interval=0.01)
+    board.record("a", "A", results(40))
+    assert scores(board.top(9, "easy", "multiple", 10)) == [40]
+    board.release.set()
+    board.flush()
+    assert scores(board.top(9, "easy", "multiple", 10)) == [40]
+
+
+class RecordDuringQuery:
+    """Wraps the connection and records a result while the first SELECT runs."""
+
+    def __init__(self, board, conn):
+        self.board = board
+        self.conn = conn
+        self.done = False
+
+    def execute(self, sql, *args):
+        if sql.startswith("SELECT") and not self.done:
+            self.done = True
+            self.board.record("late", "Late", results(70))
+        return self.conn.execute(sql, *args)
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+def test_a_result_recorded_during_the_query_is_kept(board):
+    board.record("a", "A", results(40))
+    board.flush()
+    board._conn = RecordDuringQuery(board, board._conn)
+    assert scores(board.top(9, "easy", "multiple", 10)) == [70, 40]
+    board.flush()
+    assert scores(board.top(9, "easy", "multiple", 10)) == [70, 40]
+
+
+def test_player_best(board):
+    assert board.player_best("a") is None
+    board.record("a", "A", results(40))
+    board.record("a", "A", results(20, round_size=50))
+    assert board.player_best("a")["score"] == 40
+    board.flush()
+    assert board.player_best("b") is None
+
+
+def test_player_best_cache_is_bounded(tmp_path):
+    board = Leaderboard(str(tmp_path / "leaderboard.db"), max_players=3)
+    for player in ("a", "b", "c"):
+        board.player_best(player)
+    board.player_best("a")  # the least recently read is now "b"
+    board.player_best("d")
+    assert list(board._best) == ["c", "a", "d"]
@@ -0,0 +1,31 @@
+import metrics
+from metrics import LatencyHistogram
+
+
+def test_histogram_percentiles_are_bucket_bounds():
+    histogram = LatencyHistogram(buckets=(10, 100, float("inf")))
+    for ms in (1, 2, 3, 50, 500):
+        histogram.observe(ms)
+    assert histogram.percentile(50) == 10
+    assert histogram.percentile(80) == 100
+    assert histogram.percentile(100) == float("inf")
+    assert LatencyHistogram().percentile(50) is None
+
+
+def test_prometheus_types(monkeypatch):
+    monkeypatch.setattr(metrics, "_counters", metrics.Counter())
+    monkeypatch.setattr(metrics, "_counter_sources", {})
+    monkeypatch.setattr(metrics, "_gauges", {})
+    metrics._inc("trivia_games_started_total")
+    metrics._inc("opentdb_responses_total", code=0)
+    metrics._inc("opentdb_responses_total", 2, code=5)
+    metrics.counter("opentdb_scheduler_retried_total", lambda: 7)
+    metrics.gauge("opentdb_scheduler_in_flight", lambda: 2)
+    text = metrics.render_prometheus()
+    assert "# TYPE opentdb_responses_total counter" in text
+    assert 'opentdb_responses_total{code="5"} 2' in text
+    assert "# TYPE opentdb_scheduler_retried_total counter\nopentdb_scheduler_retried_total 7" in text
+    assert "# TYPE opentdb_scheduler_in_flight gauge\nopentdb_scheduler_in_flight 2" in text
+    counters = {c["name"]: c["value"] for c in metrics.snapshot()["counters"] if not c["labels"]}
+    assert counters == {"trivia_games_started_total": 1, "opentdb_scheduler_retried_total": 7}
+
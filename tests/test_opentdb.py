@@ -0,0 +1,247 @@
+import threading
+import time
+
+import pytest
+import requests
+
+import metrics
+import opentdb
+from opentdb import OpenTDBFetcher, RequestScheduler, TokenBucket, TokenManager
+
+
+class FakeClient:
+    """``get_json`` answers from ``replies`` in order (an exception instance is raised), then code 0."""
+
+    def __init__(self, replies=(), gate=None):
+        self.replies = list(replies)
+        self.gate = gate
+        self.urls = []
+        self._lock = threading.Lock()
+
+    def get_json(self, url):
+        if self.gate is not None:
+            self.gate.wait(5)
+        with self._lock:
+            self.urls.append(url)
+            reply = self.replies.pop(0) if self.replies else {"response_code": 0, "results": []}
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+def scheduler(client, **kwargs):
+    return RequestScheduler(client, rate=1000, capacity=1000, backoff=0, **kwargs)
+
+
+def test_identical_calls_in_flight_share_one_request():
+    gate = threading.Event()
+    client = FakeClient(gate=gate)
+    s = scheduler(client)
+    first = s.submit("https://x/api.php?amount=10")
+    second = s.submit("https://x/api.php?amount=10")
+    other = s.submit("https://x/api.php?amount=20")
+    gate.set()
+    assert first is second
+    assert first.result(5) == other.result(5) == {"response_code": 0, "results": []}
+    assert len(client.urls) == 2
+    assert s.stats()["coalesced"] == 1
+    assert s.stats()["queued"] == 2
+
+
+def test_uncoalesced_calls_each_go_out():
+    gate = threading.Event()
+    client = FakeClient(gate=gate)
+    s = scheduler(client)
+    futures = [s.submit("https://x/api_token.php?command=request", coalesce=False) for _ in range(3)]
+    gate.set()
+    for future in futures:
+        future.result(5)
+    assert len(client.urls) == 3
+    assert s.stats()["coalesced"] == 0
+
+
+def test_a_finished_call_is_not_coalesced_with_a_later_one():
+    client = FakeClient()
+    s = scheduler(client)
+    s.get("https://x/api.php", timeout=5)
+    s.get("https://x/api.php", timeout=5)
+    assert len(client.urls) == 2
+    assert s.stats()["in_flight"] == 0
+
+
+def test_rate_limited_calls_are_retried():
+    client = FakeClient([{"response_code": 5}, {"response_code": 5}])
+    s = scheduler(client)
+    assert s.get("https://x/api.php", timeout=5)["response_code"] == 0
+    assert s.stats()["retried"] == 2
+
+
+def test_rate_limited_calls_give_up_with_the_last_answer():
+    client = FakeClient([{"response_code": 5}] * 3)
+    s = scheduler(client, max_retries=2)
+    assert s.get("https://x/api.php", timeout=5) == {"response_code": 5}
+    assert len(client.urls) == 3
+
+
+def test_failed_calls_are_retried_then_raised():
+    error = requests.exceptions.ConnectionError("down")
+    s = scheduler(FakeClient([error, {"response_code": 0}]))
+    assert s.get("https://x/api.php", timeout=5) == {"response_code": 0}
+
+    s = scheduler(FakeClient([error] * 3), max_retries=2)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        s.get("https://x/api.php", timeout=5)
+    assert s.stats()["failed"] == 1
+    assert s.stats()["in_flight"] == 0
+
+
+def test_backoff_doubles_with_jitter_up_to_the_cap(monkeypatch):
+    delays = []
+    monkeypatch.setattr(opentdb.time, "sleep", delays.append)
+    s = RequestScheduler(FakeClient(), backoff=1.0, max_backoff=5.0)
+    for attempt in range(5):
+        s._sleep_backoff(attempt)
+    for delay, cap in zip(delays, (1, 2, 4, 5, 5)):
+        assert cap / 2 <= delay <= cap
+
+
+def test_token_bucket_spaces_out_calls_past_its_capacity(monkeypatch):
+    waits = []
+    monkeypatch.setattr(opentdb.time, "sleep", waits.append)
+    bucket = TokenBucket(rate=2, capacity=2)
+    assert [bucket.acquire() for _ in range(2)] == [0.0, 0.0]
+    assert bucket.acquire() == pytest.approx(0.5, abs=0.05)
+    assert bucket.acquire() == pytest.approx(1.0, abs=0.05)
+    assert len(waits) == 2
+
+
+def test_only_bodies_with_a_response_code_are_counted(monkeypatch):
+    counted = []
+    monkeypatch.setattr(opentdb.metrics, "inc", lambda name, **labels: counted.append((name, labels)))
+    s = scheduler(FakeClient([{"trivia_categories": []}, {"response_code": 1, "results": []}]))
+    s.get("https://x/api_category.php", limited=False, timeout=5)
+    s.get("https://x/api.php", timeout=5)
+    assert counted == [("opentdb_responses_total", {"code": 1})]
+
+
+def test_scheduler_totals_are_exported_as_counters():
+    text = metrics.render_prometheus()
+    for name in ("queued", "coalesced", "throttled", "retried", "failed"):
+        assert f"# TYPE opentdb_scheduler_{name}_total counter" in text
+    assert "# TYPE opentdb_scheduler_in_flight gauge" in text
+
+
+@pytest.fixture
+def token_calls(monkeypatch):
+    """Fake token endpoints: new tokens are t1, t2, ...; resets are recorded."""
+    calls = {"requested": 0, "reset": []}
+
+    def request_token():
+        calls["requested"] += 1
+        return f"t{calls['requested']}"
+
+    def reset_token(token):
+        calls["reset"].append(token)
+        return token
+
+    monkeypatch.setattr(opentdb, "request_token", request_token)
+    monkeypatch.setattr(opentdb, "reset_token", reset_token)
+    return calls
+
+
+def settle(tokens):
+    """Waits for the manager's background token calls."""
+    tokens._executor.submit(lambda: None).result(5)
+    tokens._executor.submit(lambda: None).result(5)
+    assert tokens.stats()["pending"] == 0
+
+
+def test_warm_fills_the_pool_once(token_calls):
+    tokens = TokenManager(size=3)
+    tokens.warm()
+    tokens.warm()
+    settle(tokens)
+    assert tokens.stats() == {"idle": 3, "leased": 0, "pending": 0}
+    assert token_calls["requested"] == 3
+
+
+def test_leases_are_per_key_and_oldest_first(token_calls):
+    tokens = TokenManager(size=2)
+    tokens.warm()
+    settle(tokens)
+    idle = [token for token, _ in tokens._idle]
+    first = tokens.acquire("a")
+    assert first == idle[0]
+    assert tokens.acquire("a") == first
+    assert tokens.acquire("b") == idle[1]
+    settle(tokens)
+    # Leasing topped the pool back up
+    assert tokens.stats()["idle"] == 2
+
+
+def test_cold_start_requests_a_token_right_away(token_calls):
+    tokens = TokenManager(size=0)
+    assert tokens.acquire("a") == "t1"
+    assert tokens.stats()["leased"] == 1
+
+
+def test_exhausted_token_is_reset_and_returned_to_the_pool(token_calls):
+    tokens = TokenManager(size=1)
+    tokens.warm()
+    settle(tokens)
+    used = tokens.acquire("a")
+    settle(tokens)
+    tokens.exhausted("a")
+    settle(tokens)
+    assert token_calls["reset"] == [used]
+    assert used in [token for token, _ in tokens._idle]
+    assert tokens.acquire("a") != used  # the older warm token goes first
+
+
+def test_record_rotates_before_the_token_runs_dry(token_calls):
+    tokens = TokenManager(size=1, capacity=lambda key: 60)
+    used = tokens.acquire("a")
+    tokens.record("a", 50, next_amount=5)
+    assert tokens.stats()["leased"] == 1
+    tokens.record("a", 5, next_amount=50)
+    settle(tokens)
+    assert token_calls["reset"] == [used]
+    assert tokens.stats()["leased"] == 0
+
+
+def test_invalid_tokens_are_dropped(token_calls):
+    tokens = TokenManager(size=0)
+    tokens.acquire("a")
+    tokens.discard("a")
+    assert tokens.stats() == {"idle": 0, "leased": 0, "pending": 0}
+
+
+def test_idle_leases_come_back_and_old_tokens_expire(token_calls):
+    tokens = TokenManager(size=0, lease_idle=60)
+    tokens.acquire("a")
+    tokens._leases["a"].last_used -= 61
+    tokens._idle.append(("ancient", time.monotonic() - TokenManager.TOKEN_IDLE_LIMIT - 1))
+    # "a" went quiet: its token is reclaimed and is the one "b" gets
+    assert tokens.acquire("b") == "t1"
+    assert tokens.stats() == {"idle": 0, "leased": 1, "pending": 0}
+
+
+def test_fetcher_handles_dead_and_empty_tokens(token_calls, monkeypatch):
+    replies = [{"response_code": 3, "results": []}, {"response_code": 4, "results": []}]
+    sent = []
+
+    def fetch_batch(category_id, difficulty, question_type, amount, token=None):
+        sent.append(token)
+        return replies.pop(0) if replies else {"response_code": 0, "results": [{}] * amount}
+
+    monkeypatch.setattr(opentdb, "fetch_batch", fetch_batch)
+    tokens = TokenManager(size=0)
+    fetcher = OpenTDBFetcher(tokens)
+    key = (9, "easy", "multiple")
+    # Code 3: the token is dropped and the call retried once with a new one
+    assert fetcher(key, 10) == (4, [])
+    assert sent == ["t1", "t2"]
+    settle(tokens)
+    assert token_calls["reset"] == ["t2"]
+    code, results = fetcher(key, 10)
+    assert code == 0 and len(results) == 10
@@ -0,0 +1,61 @@
+import json
+
+from conftest import raw_question
+from question_bank import LocalBankFetcher, import_dump, insert_questions, open_bank
+from question_pool import QuestionPool
+
+GK_EASY = (9, "easy", "multiple")
+
+
+def test_insert_skips_duplicates_and_unknown_categories(tmp_path):
+    conn = open_bank(str(tmp_path / "questions.db"))
+    questions = [raw_question("q1"), raw_question("q2"), raw_question("q3", category="Not A Category")]
+    assert insert_questions(conn, questions) == 2
+    assert insert_questions(conn, questions) == 0
+    assert insert_questions(conn, [dict(raw_question("q4", category="Whatever"), category_id=12)]) == 1
+
+
+def test_import_dump_formats(tmp_path):
+    conn = open_bank(str(tmp_path / "questions.db"))
+    path = tmp_path / "dump.json"
+    path.write_text(json.dumps([{"response_code": 0, "results": [raw_question("q1")]}, raw_question("q2")]))
+    assert import_dump(conn, str(path)) == 2
+    path.write_text(json.dumps({"response_code": 0, "results": [raw_question("q3")]}))
+    assert import_dump(conn, str(path)) == 1
+
+
+def test_fetcher_serves_a_bucket_without_repeats(bank_path):
+    fetcher = LocalBankFetcher(bank_path)
+    code, first = fetcher(GK_EASY, 3)
+    assert code == 0
+    code, second = fetcher(GK_EASY, 3)
+    assert code == 0
+    questions = [q["question"] for q in first + second]
+    assert sorted(questions) == [f"gk easy {i}" for i in range(6)]
+    assert first[0]["incorrect_answers"] == ["b", "c", "d"]
+
+
+def test_fetcher_starts_over_once_everything_was_served(bank_path):
+    fetcher = LocalBankFetcher(bank_path)
+    fetcher(GK_EASY, 5)
+    code, questions = fetcher(GK_EASY, 5)
+    assert code == 0
+    assert len({q["question"] for q in questions}) == 5
+
+
+def test_fetcher_codes(bank_path):
+    fetcher = LocalBankFetcher(bank_path)
+    # More than the bank holds for the key
+    assert fetcher(GK_EASY, 7) == (1, [])
+    assert fetcher((9, "easy", "boolean"), 1) == (1, [])
+    # "" is any difficulty or type, like the API
+    code, questions = fetcher((9, "", ""), 9)
+    assert code == 0
+    assert {q["difficulty"] for q in questions} == {"easy", "hard"}
+
+
+def test_fetcher_feeds_the_question_pool(bank_path):
+    pool = QuestionPool(LocalBankFetcher(bank_path), batch_size=50)
+    seen = set()
+    assert pool.take(GK_EASY, 4, seen)[0] == 0
+    assert pool.take(GK_EASY, 4, seen) == (4, [])
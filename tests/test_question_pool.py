@@ -0,0 +1,120 @@
+from conftest import FakeFetcher
+from question_pool import QuestionPool, bucket_keys, question_key
+
+KEY = (9, "easy", "multiple")
+MIXED = ((9, 10), "easy", "multiple")
+
+
+def test_take_marks_questions_seen_and_never_repeats():
+    pool = QuestionPool(FakeFetcher())
+    seen = set()
+    code, first = pool.take(KEY, 10, seen)
+    assert code == 0
+    assert len(first) == 10
+    assert seen == {question_key(q) for q in first}
+    code, second = pool.take(KEY, 10, seen)
+    assert code == 0
+    assert not {question_key(q) for q in first} & {question_key(q) for q in second}
+
+
+def test_sessions_share_one_fill():
+    fetcher = FakeFetcher()
+    pool = QuestionPool(fetcher, batch_size=50, low_water=0)
+    for _ in range(4):
+        assert pool.take(KEY, 10, set())[0] == 0
+    assert len(fetcher.calls) == 1
+
+
+def test_code_4_once_the_session_has_seen_everything():
+    pool = QuestionPool(FakeFetcher(limits={KEY: 12}), batch_size=12)
+    seen = set()
+    assert pool.take(KEY, 10, seen)[0] == 0
+    assert pool.take(KEY, 10, seen) == (4, [])
+    # Another session still gets a round
+    assert pool.take(KEY, 10, set())[0] == 0
+
+
+def test_upstream_errors_are_passed_on():
+    pool = QuestionPool(FakeFetcher(codes={KEY: 2}))
+    assert pool.take(KEY, 10, set()) == (2, [])
+
+
+def test_bucket_keys():
+    assert bucket_keys(KEY) == [KEY]
+    assert bucket_keys(((9, 10), ("easy", "hard"), "boolean")) == [
+        (9, "easy", "boolean"), (9, "hard", "boolean"), (10, "easy", "boolean"), (10, "hard", "boolean"),
+    ]
+
+
+def test_mixed_round_interleaves_its_buckets():
+    pool = QuestionPool(FakeFetcher())
+    seen = set()
+    code, questions = pool.take(MIXED, 10, seen)
+    assert code == 0
+    assert len(questions) == 10
+    categories = [q.category for q in questions]
+    assert sorted(categories) == ["10"] * 5 + ["9"] * 5
+    assert all(a != b for a, b in zip(categories, categories[1:]))
+    assert len(seen) == 10
+
+
+def test_mixed_round_tops_up_from_the_buckets_that_delivered():
+    pool = QuestionPool(FakeFetcher(limits={(10, "easy", "multiple"): 2}))
+    code, questions = pool.take(MIXED, 10, set())
+    assert code == 0
+    assert len(questions) == 10
+    assert sum(q.category == "9" for q in questions) >= 8
+
+
+def test_failed_mixed_round_hands_out_nothing():
+    fetcher = FakeFetcher(codes={(9, "easy", "multiple"): 1, (10, "easy", "multiple"): 1})
+    pool = QuestionPool(fetcher)
+    seen = set()
+    assert pool.take(MIXED, 10, seen) == (1, [])
+    assert seen == set()
+
+
+def test_mixed_round_code_4_forgets_the_partial_round():
+    limits = {(9, "easy", "multiple"): 6, (10, "easy", "multiple"): 6}
+    pool = QuestionPool(FakeFetcher(limits=limits), batch_size=6)
+    seen = set()
+    assert pool.take(MIXED, 10, seen)[0] == 0
+    first_round = set(seen)
+    assert pool.take(MIXED, 10, seen) == (4, [])
+    assert seen == first_round
+
+
+def test_take_ready_serves_warm_buckets_only():
+    pool = QuestionPool(FakeFetcher())
+    seen = set()
+    assert pool.take_ready(KEY, 10, seen) is None
+    pool.take(KEY, 10, seen)
+    questions = pool.take_ready(KEY, 10, seen)
+    assert len(questions) == 10
+    assert len(seen) == 20
+
+
+def test_take_ready_never_waits_for_a_fill():
+    pool = QuestionPool(FakeFetcher())
+    pool.take(KEY, 10, set())
+    bucket = pool._buckets[KEY]
+    with bucket.lock:
+        assert pool.take_ready(KEY, 10, set()) is None
+
+
+def test_take_ready_mixed():
+    pool = QuestionPool(FakeFetcher())
+    pool.take(MIXED, 10, set())
+    questions = pool.take_ready(MIXED, 10, set())
+    assert sorted(q.category for q in questions) == ["10"] * 5 + ["9"] * 5
+
+
+def test_take_ready_keeps_served_buckets_from_eviction():
+    pool = QuestionPool(FakeFetcher(), max_buckets=2)
+    hot, other, new = KEY, (10, "easy", "multiple"), (11, "easy", "multiple")
+    pool.take(hot, 10, set())
+    pool.take(other, 10, set())
+    assert pool.take_ready(hot, 10, set()) is not None
+    pool.take(new, 10, set())
+    assert pool.take_ready(hot, 10, set()) is not None
+    assert pool.take_ready(other, 10, set()) is None
@@ -0,0 +1,73 @@
+import threading
+
+from conftest import FakeFetcher, make_questions
+from engine import TriviaEngine
+from question_pool import QuestionPool
+from question_stream import QuestionStream
+
+KEY = (9, "easy", "multiple")
+
+
+class FlakyPool:
+    """A pool whose takes numbered in ``failing`` raise or answer ``code``; the others deal fresh pages."""
+
+    def __init__(self, failing, code=None):
+        self.failing = set(failing)
+        self.code = code
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def take(self, key, amount, seen):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        if call in self.failing:
+            if self.code is None:
+                raise ConnectionError("upstream went away")
+            return self.code, []
+        return 0, make_questions(amount, prefix=f"c{call}-")
+
+
+def test_stream_deals_the_whole_round():
+    stream = QuestionStream(QuestionPool(FakeFetcher()), KEY, set(), total=25)
+    assert [len(page) for page in iter(stream.next_page, [])] == [10, 10, 5]
+
+
+def test_a_failed_fetch_is_retried():
+    pool = FlakyPool({1, 2})
+    stream = QuestionStream(pool, KEY, set(), total=30, backoff=0)
+    assert sum(1 for _ in stream) == 30
+    assert stream.response_code == 0
+
+
+def test_rate_limited_fetches_are_retried():
+    stream = QuestionStream(FlakyPool({1, 2}, code=5), KEY, set(), total=20, backoff=0)
+    assert sum(1 for _ in stream) == 20
+
+
+def test_a_page_that_kept_failing_is_fetched_again():
+    # More failures than one fetch retries: the next page call starts over
+    pool = FlakyPool({1, 2, 3})
+    stream = QuestionStream(pool, KEY, set(), total=20, retries=1, backoff=0)
+    assert len(stream.next_page()) == 10
+    assert not stream.done
+
+
+def test_only_no_results_ends_the_stream():
+    stream = QuestionStream(FlakyPool({1}, code=1), KEY, set(), total=20, backoff=0)
+    assert stream.next_page() == []
+    assert stream.done
+    assert stream.response_code == 1
+
+
+def test_a_transient_error_does_not_cut_the_round_short():
+    # Take 1 is the round's first page, take 2 the stream's first fetch
+    engine = TriviaEngine(FlakyPool({2}), round_size=40)
+    engine.start(9, "easy", "multiple")
+    played = 0
+    while not engine.finished:
+        engine.answer("a")
+        engine.next()
+        played += 1
+    assert played == 40
+    assert engine.results()["total_questions"] == 40
@@ -0,0 +1,91 @@
+import os
+
+from conftest import FakeFetcher, make_questions
+from engine import TriviaEngine
+from question_pool import QuestionPool
+from questions import question_rows
+from replay_log import ReplayLog, read_events, replay_round, split_rounds
+
+
+def record_game(log, session, engine, answers):
+    """Plays a round the way app.py does, logging the same events."""
+    log.write(session, "round", {
+        "key": [engine.category, engine.difficulty, engine.question_type], "round_size": engine.round_size,
+        "question_time": engine.question_time, "seed": engine.round_seed,
+        "questions": question_rows(engine.questions), "code": 0,
+    })
+    for option in answers:
+        position = engine.options().index(option)
+        outcome = engine.answer(option, elapsed=1.5)
+        log.write(session, "answer", {
+            "i": engine.current_question, "option": option, "pos": position, "correct": outcome["correct"],
+            "points": outcome["points"], "bonus": outcome["bonus"], "score": outcome["score"], "think_ms": 1500.0,
+        })
+        offset = engine.offset
+        more = engine.next()
+        values = {"i": engine.current_question, "finished": not more}
+        if engine.offset != offset and engine.questions:
+            values["page"] = question_rows(engine.questions)
+        log.write(session, "next", values)
+    log.write(session, "result", {"score": engine.score})
+
+
+def test_events_round_trip_through_the_file(tmp_path):
+    log = ReplayLog(str(tmp_path / "replay.log"), flush_interval=0.01)
+    log.write("p1", "fetch", {"key": [9, "easy", "multiple"], "code": 0, "n": 10})
+    log.write("", "api", {"url": "https://opentdb.com/api.php", "ms": 12.5})
+    log.flush()
+    events = list(read_events([log.path]))
+    assert [(e["s"], e["e"]) for e in events] == [("p1", "fetch"), ("", "api")]
+    assert events[0]["key"] == [9, "easy", "multiple"]
+    assert events[1]["ms"] == 12.5
+
+
+def test_rotation_keeps_the_log_bounded(tmp_path):
+    path = str(tmp_path / "replay.log")
+    log = ReplayLog(path, max_bytes=2000, backups=2, flush_interval=0.01)
+    for i in range(500):
+        log.write("p1", "answer", {"i": i, "option": "a" * 20})
+    log.flush()
+    assert sorted(os.listdir(tmp_path)) == ["replay.log", "replay.log.1", "replay.log.2"]
+    assert all(os.path.getsize(os.path.join(tmp_path, name)) <= 2000 for name in os.listdir(tmp_path))
+    events = list(read_events([f"{path}.2", f"{path}.1", path]))
+    assert events[-1]["i"] == 499
+    assert [e["i"] for e in events] == list(range(events[0]["i"], 500))
+
+
+def test_a_recorded_round_replays_identically(tmp_path):
+    log = ReplayLog(str(tmp_path / "replay.log"), flush_interval=0.01)
+    engine = TriviaEngine(QuestionPool(FakeFetcher()), round_size=25, question_time=20)
+    engine.start(9, "easy", "multiple")
+    # Two pages of 10 are streamed in while the round runs
+    record_game(log, "p1", engine, ["a", "b"] * 12 + ["a"])
+    scores = {"p1": engine.score}
+    engine = TriviaEngine(round_size=10)
+    engine.start((9, 10), ("easy", "hard"), "multiple", make_questions(10))
+    record_game(log, "p2", engine, ["a"] * 10)
+    scores["p2"] = engine.score
+    log.flush()
+
+    events = list(read_events([log.path]))
+    assert sum("page" in e for e in events if e["e"] == "next") == 2
+    for session, score in scores.items():
+        rounds = split_rounds(e for e in events if e["s"] == session)
+        assert len(rounds) == 1
+        report = replay_round(rounds[0])
+        assert report["divergences"] == []
+        assert report["score"] == score
+
+
+def test_a_different_outcome_is_reported(tmp_path):
+    log = ReplayLog(str(tmp_path / "replay.log"), flush_interval=0.01)
+    engine = TriviaEngine(round_size=10)
+    engine.start(9, "easy", "multiple", make_questions(10))
+    record_game(log, "p1", engine, ["a"] * 10)
+    log.flush()
+
+    events = list(read_events([log.path]))
+    events[1]["score"] = 99
+    events[-1]["score"] = 1
+    report = replay_round(split_rounds(events)[0])
+    assert report["divergences"] == ["question 1: score 10, recorded 99", "final score 100, recorded 1"]
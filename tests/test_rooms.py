@@ -0,0 +1,181 @@
+import pytest
+
+import rooms
+from conftest import make_questions
+from rooms import Room, RoomError, RoomRegistry
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rooms.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def room(clock):
+    room = Room("ABCDE", "host", 9, "easy", "multiple", make_questions(3), question_time=20, reveal_time=5)
+    room.join("host", "Host")
+    room.join("p1", "P1")
+    return room
+
+
+def test_only_the_host_starts(room):
+    with pytest.raises(RoomError):
+        room.start("p1")
+    room.start("host")
+    with pytest.raises(RoomError):
+        room.start("host")
+    assert room.snapshot()["phase"] == "question"
+
+
+def test_the_clock_runs_the_round(room, clock):
+    room.start("host")
+    phases = []
+    for _ in range(6):
+        snapshot = room.snapshot()
+        phases.append((snapshot["phase"], snapshot["index"]))
+        clock.now = snapshot["deadline"]
+    phases.append((room.snapshot()["phase"], room.snapshot()["index"]))
+    assert phases == [
+        ("question", 0), ("reveal", 0), ("question", 1), ("reveal", 1), ("question", 2), ("reveal", 2),
+        ("finished", 2),
+    ]
+
+
+def test_a_late_look_catches_up_on_every_missed_transition(room, clock):
+    room.start("host")
+    clock.now += 3 * (20 + 5)
+    assert room.snapshot()["phase"] == "finished"
+    assert room.player_view("p1")["correct_answers"] == 0
+
+
+def test_everybody_answered_opens_the_reveal(room):
+    room.start("host")
+    room.answer("host", "a")
+    assert room.snapshot()["phase"] == "question"
+    with pytest.raises(RoomError):
+        room.answer("stranger", "a")
+    room.answer("p1", "b")
+    snapshot = room.snapshot()
+    assert snapshot["phase"] == "reveal"
+    assert snapshot["answered"] == 2
+    with pytest.raises(RoomError):
+        room.answer("p1", "a")
+
+
+def test_correct_answer_is_hidden_until_the_reveal(room, clock):
+    room.start("host")
+    question = room.snapshot()["question"]
+    assert question["correct_answer"] is None
+    assert sorted(question["options"]) == ["a", "b", "c", "d"]
+    clock.now = room.snapshot()["deadline"]
+    assert room.snapshot()["question"]["correct_answer"] == "a"
+
+
+def test_scoreboard_is_best_first_then_by_arrival(room, clock):
+    room.join("p2", "P2")
+    room.start("host")
+    room.answer("p2", "a")
+    room.answer("host", "b")
+    room.answer("p1", "a")
+    board = [(entry["player_id"], entry["score"]) for entry in room.snapshot()["scoreboard"]]
+    assert board == [("p1", 10), ("p2", 10), ("host", 0)]
+
+
+def test_a_member_who_skipped_questions_catches_up(room, clock):
+    room.start("host")
+    room.answer("host", "a")
+    clock.now = room.snapshot()["deadline"]  # question 1 closes without p1
+    clock.now = room.snapshot()["deadline"]  # question 2 opens
+    assert room.snapshot()["index"] == 1
+    view = room.player_view("p1")
+    assert view == {"answered": False, "selected_option": None, "score": 0, "streak": 0, "correct_answers": 0}
+    assert room.answer("p1", "a")["points"] == 10
+
+
+def test_late_joiner_plays_the_open_question(room, clock):
+    room.start("host")
+    clock.now = room.snapshot()["deadline"]
+    clock.now = room.snapshot()["deadline"]
+    room.join("p2", "P2")
+    assert room.answer("p2", "a")["points"] == 10
+
+
+def test_snapshot_is_shared_until_the_room_changes(room):
+    first = room.snapshot()
+    assert room.snapshot() is first
+    room.start("host")
+    assert room.snapshot() is not first
+    assert room.snapshot()["version"] == first["version"] + 1
+
+
+def test_wait_returns_on_the_next_transition(room):
+    version = room.snapshot()["version"]
+    assert room.wait(version, timeout=0)["version"] == version
+    room.start("host")
+    assert room.wait(version, timeout=0)["phase"] == "question"
+
+
+def test_host_leaving_hands_the_room_on(room):
+    room.join("p2", "P2")
+    version = room.snapshot()["version"]
+    room.leave("host")
+    snapshot = room.snapshot()
+    assert snapshot["host_id"] == "p1"
+    assert snapshot["version"] > version
+    assert [entry["player_id"] for entry in snapshot["scoreboard"]] == ["p1", "p2"]
+    room.start("p1")
+
+
+def test_leaving_closes_a_question_everyone_else_answered(room):
+    room.start("host")
+    room.answer("host", "a")
+    room.leave("p1")
+    assert room.snapshot()["phase"] == "reveal"
+
+
+def test_finished_rooms_take_no_new_members(room, clock):
+    room.start("host")
+    clock.now += 3 * (20 + 5)
+    room.snapshot()
+    with pytest.raises(RoomError):
+        room.join("p2", "P2")
+
+
+def test_registry(clock):
+    registry = RoomRegistry(idle=60)
+    room = registry.create("host", "Host", 9, "easy", "multiple", make_questions(3))
+    assert registry.get(f" {room.code.lower()} ") is room
+    assert room.snapshot()["members"] == 1
+    with pytest.raises(RoomError):
+        registry.get("nope")
+    with pytest.raises(RoomError):
+        registry.create("host", "Host", 9, "easy", "multiple", [])
+    clock.now += 61
+    registry.create("other", "Other", 9, "easy", "multiple", make_questions(3))
+    assert len(registry) == 1
+
+
+def test_a_second_answer_is_a_room_error(room):
+    room.join("p2", "P2")
+    room.start("host")
+    room.answer("host", "a")
+    with pytest.raises(RoomError):
+        room.answer("host", "b")
+    assert room.player_view("host")["score"] == 10
+
+
+def test_an_unknown_option_is_a_room_error(room):
+    room.start("host")
+    with pytest.raises(RoomError):
+        room.answer("host", "not an option")
+    assert room.snapshot()["answered"] == 0
@@ -0,0 +1,113 @@
+import pytest
+
+import state_store
+from conftest import make_questions
+from engine import TriviaEngine
+from state_store import MemoryStore, RedisStore, SQLiteStore, dump_snapshot, load_snapshot
+
+
+class FakeRedis:
+    """In-process stand-in for the ``redis.Redis`` calls ``RedisStore`` makes, with ``ex`` expiry."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self._data = {}
+
+    def get(self, name):
+        value, expires = self._data.get(name, (None, None))
+        if expires is not None and self.clock() >= expires:
+            del self._data[name]
+            return None
+        return value
+
+    def set(self, name, value, ex=None):
+        self._data[name] = (value, None if ex is None else self.clock() + ex)
+
+    def delete(self, name):
+        self._data.pop(name, None)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(state_store.time, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def store(request, tmp_path, clock):
+    if request.param == "sqlite":
+        return SQLiteStore(str(tmp_path / "state.db"), ttl=100)
+    if request.param == "redis":
+        return RedisStore(FakeRedis(clock), ttl=100)
+    return MemoryStore(ttl=100)
+
+
+def game_state():
+    engine = TriviaEngine(round_size=10)
+    engine.start((9, 10), "easy", "multiple", make_questions(10))
+    engine.answer("a")
+    engine.next()
+    return engine.to_state()
+
+
+def test_snapshot_round_trip():
+    state = game_state()
+    restored = load_snapshot(dump_snapshot(state))
+    assert restored["questions"] == state["questions"]
+    assert restored["seen_questions"] == state["seen_questions"]
+    assert restored["score"] == state["score"]
+    engine = TriviaEngine.from_state(restored)
+    assert engine.category == (9, 10)
+    assert engine.current_question == 1
+
+
+def test_save_load_delete(store):
+    assert store.load("p1") is None
+    state = game_state()
+    store.save("p1", state)
+    assert store.load("p1")["questions"] == state["questions"]
+    store.save("p1", dict(state, score=99))
+    assert store.load("p1")["score"] == 99
+    store.delete("p1")
+    assert store.load("p1") is None
+
+
+def test_saved_games_expire(store, clock):
+    store.save("p1", game_state())
+    clock.now += 99
+    assert store.load("p1") is not None
+    clock.now += 2
+    assert store.load("p1") is None
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_saving_sweeps_out_expired_games(backend, tmp_path, clock):
+    if backend == "sqlite":
+        store = SQLiteStore(str(tmp_path / "state.db"), ttl=100, sweep_interval=60)
+    else:
+        store = MemoryStore(ttl=100, sweep_interval=60)
+    state = game_state()
+    for i in range(50):
+        store.save(f"old{i}", state)
+    clock.now += 50
+    store.save("mid", state)
+    clock.now += 51
+    store.save("new", state)
+    assert len(store) == 2
+    # Sweeps run once a minute, not on every save: "mid" expires but stays until the next one
+    clock.now += 51
+    store.save("x", state)
+    assert len(store) == 3
+    clock.now += 9
+    store.save("y", state)
+    assert len(store) == 3
+    assert store.load("mid") is None